@@ -2,20 +2,10 @@ import pandas as pd
 import numpy as np
 
 import logging
-import os 
 import sys
 
-log_file_name = "./log/account.log"
-if not os.path.exists('log'):
-	os.mkdir('log')
-
-logging.basicConfig(level=logging.INFO, #设置日志输出格式
-                    filename=log_file_name, #log日志输出的文件位置和文件名
-                    filemode="w", #文件的写入格式，w为重新写入文件，默认是追加
-                    format="%(asctime)s - %(name)s - %(levelname)-9s - %(filename)-8s : %(lineno)s line - %(message)s", 
-                    # 日志输出的格式,-8表示占位符，让输出左对齐，输出长度都为8位
-                    datefmt="%Y-%m-%d %H:%M:%S", #时间输出的格式
-                    )
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler()) # 没有配置日志时不输出, 见 Context.configure_logging
 
 class Account():
 	def __init__(self, cash=1e8):
@@ -23,15 +13,21 @@ class Account():
 		self.init_cash = cash
 		self.stock_positions = {} # key: stock 名字, value: 持有标的总股数
 		self.price_table = None # 标的价格表, series
+		self.ledger = None # 交易流水, Ledger, 为 None 时不记录
+		self.profiler = None # 调用计数, Profiler, 为 None 时不记录
+		self.logger = logger # 日志, 由 BackTest 按 Context 设置
 
 	def set_price_table(self, prices):
 		if not isinstance(prices, pd.Series):
 			raise NameError('input prices error, please input price cross section series')
+		if self.profiler is not None:
+			self.profiler.count('set_price_table')
+			self.profiler.count('loc', len(self.stock_positions))
 		for stock_name in self.stock_positions:
 			try:
 				p = prices.loc[stock_name]
 			except KeyError:
-				logging.error(f'stock {stock_name} price not exsist')
+				self.logger.error('stock %s price not exsist', stock_name)
 				sys.exit()
 		self.price_table = prices
 
@@ -40,11 +36,20 @@ class Account():
 			if pos == 0:
 				continue
 			else:
-				logging.info(f'hold stock {stock_name} position {pos}')
+				self.logger.info('hold stock %s position %s', stock_name, pos)
 
 	def get_stock_position(self):
 		return self.stock_positions
 
+	def set_ledger(self, ledger):
+		self.ledger = ledger
+
+	def set_profiler(self, profiler):
+		self.profiler = profiler
+
+	def set_logger(self, logger):
+		self.logger = logger
+
 	def refresh_account(self):
 		self.cash = self.init_cash
 		self.stock_positions = {}
@@ -55,10 +60,15 @@ class Account():
 
 	def get_total_asset(self):
 		money = self.cash
+		lookups = 0
 		for stock_name, pos in self.stock_positions.items():
 			if pos != 0:
 				p = self.price_table.loc[stock_name]
 				money += pos * p
+				lookups += 1
+		if self.profiler is not None:
+			self.profiler.count('get_total_asset')
+			self.profiler.count('loc', lookups)
 		return money
 
 	def get_cash(self):
@@ -72,6 +82,9 @@ class Account():
 		按照指定的总价格买入，注意此处的总价格包含了已持有的标的价值
 		'''
 		assert money >= 0
+		if self.profiler is not None:
+			self.profiler.count('buy_stock_by_money')
+			self.profiler.count('loc')
 		buy_money = money
 		stock_price = self.price_table.loc[stock_name]
 		hold_pos = self.stock_positions.get(stock_name)
@@ -83,7 +96,7 @@ class Account():
 			if buy_money < hold_money:
 				# 买入总价格比当前持有的标的总价值小
 				if buy_money != 0:
-					logging.warning('buy warning, target buy money smaller than the hold value, sell the stock actually')
+					self.logger.warning('buy warning, target buy money smaller than the hold value, sell the stock actually')
 				self.sell_stock_by_money(stock_name=stock_name, money=hold_money-buy_money)
 				buy_money = 0
 			else:
@@ -91,7 +104,7 @@ class Account():
 				buy_money -= hold_money
 		if buy_money > self.cash:
 			# 需要额外买入的总价格大于当前持有的现金
-			logging.warning('buy warning, target buy money larger than the cash')
+			self.logger.warning('buy warning, target buy money larger than the cash')
 			buy_money = self.cash
 
 		if hold_pos != None:
@@ -100,7 +113,9 @@ class Account():
 			self.stock_positions[stock_name] = buy_money / stock_price
 		self.cash -= buy_money
 		if buy_money != 0:
-			logging.info(f'buy stock {stock_name}, buy money {buy_money}, after buy cash {self.cash}')
+			if self.ledger is not None:
+				self.ledger.record_fill(stock_name, buy_money / stock_price, stock_price, buy_money, self.cash)
+			self.logger.debug('buy stock %s, buy money %s, after buy cash %s', stock_name, buy_money, self.cash)
 
 
 	def sell_stock_by_money(self, stock_name='STOCK', money=1e3):
@@ -108,6 +123,9 @@ class Account():
 		按照指定的总价格卖出
 		'''
 		assert money > 0 
+		if self.profiler is not None:
+			self.profiler.count('sell_stock_by_money')
+			self.profiler.count('loc')
 		hold_pos = self.stock_positions.get(stock_name)
 		stock_price = self.price_table.loc[stock_name]
 		sell_money = money
@@ -116,11 +134,13 @@ class Account():
 			raise NameError(f'sell error, stock {stock_name} not hold')
 		hold_money = hold_pos * stock_price
 		if sell_money - hold_money > 0:
-			logging.warning('sell warning, target money larger than the hold value')
+			self.logger.warning('sell warning, target money larger than the hold value')
 			sell_money = hold_money
 		self.stock_positions[stock_name] -= sell_money / stock_price
 		self.cash += sell_money
-		logging.info(f'sell stock {stock_name}, sell money {sell_money}, after sell cash {self.cash}')
+		if self.ledger is not None:
+			self.ledger.record_fill(stock_name, -sell_money / stock_price, stock_price, -sell_money, self.cash)
+		self.logger.debug('sell stock %s, sell money %s, after sell cash %s', stock_name, sell_money, self.cash)
 
 	def order_stock_by_percent(self, stock_name='STOCK', percent=1):
 		'''
@@ -132,17 +152,261 @@ class Account():
 		self.buy_stock_by_money(stock_name=stock_name, money=money)
 
 
-	def buy_stock_by_volumns(self):
+	def buy_stock_by_volumns(self, stock_name='STOCK', volumns=1, lot_size=1):
+		'''
+		按照指定的手数买入, 每手 lot_size 股; 现金不足时只买入能负担的整手数
+		'''
+		assert volumns >= 0 and lot_size > 0
+		stock_price = self._price(stock_name)
+		shares = volumns * lot_size
+		if shares * stock_price > self.cash:
+			self.logger.warning('buy warning, target buy money larger than the cash')
+			shares = np.floor(self.cash / stock_price / lot_size) * lot_size
+		if shares == 0:
+			return
+		self._trade(stock_name, shares, stock_price)
+		self.logger.debug('buy stock %s, buy shares %s, after buy cash %s', stock_name, shares, self.cash)
+
+	def sell_stock_by_volumns(self, stock_name='STOCK', volumns=1, lot_size=1):
+		'''
+		按照指定的手数卖出, 每手 lot_size 股; 超过持有股数时全部卖出
+		'''
+		assert volumns > 0 and lot_size > 0
+		hold_pos = self._position(stock_name)
+		if hold_pos == 0:
+			raise NameError(f'sell error, stock {stock_name} not hold')
+		shares = volumns * lot_size
+		if shares > hold_pos:
+			self.logger.warning('sell warning, target volumns larger than the hold position')
+			shares = hold_pos
+		self._trade(stock_name, -shares, self._price(stock_name))
+		self.logger.debug('sell stock %s, sell shares %s, after sell cash %s', stock_name, shares, self.cash)
+
+	def rebalance(self, position, rebalancer):
+		'''
+		position: dict, 标的 -> 目标资金, 不在其中的持仓全部卖出
+		rebalancer: Rebalancer, 按目标与当前持仓的差额一次算出所有标的的交易, 跳过不交易区间内的标的, 取整到整手并计算成本
+		只对需要交易的标的更新持仓, 没有变化的交易日不产生交易
+		return: pd.Series, 每个标的的交易股数, 正数为买入, 负数为卖出
+		'''
+		if self.profiler is not None:
+			self.profiler.count('rebalance')
+		held = [s for s, pos in self.get_stock_position().items() if pos != 0 and s not in position]
+		# 按价格表中标的的顺序, 现金不足时的买入顺序与 fast 引擎相同
+		names = pd.Index(held + list(position), dtype=object)
+		names = names[np.argsort(self._asset_order(names), kind='stable')]
+		prices = self._prices(names)
+		shares = np.array([self._position(s) for s in names], dtype=float)
+		total_asset = self.get_total_asset()
+		money = np.array([position.get(s, 0.) for s in names], dtype=float)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			weights = money / total_asset if total_asset > 0 else np.zeros(len(names))
+		delta, cost = rebalancer.orders(shares[None], prices, weights[None], np.array([self.cash]))
+		delta, cost = delta[0], cost[0]
+		for j in np.flatnonzero(delta):
+			self._trade(names[j], delta[j], prices[j], cost[j])
+		self.logger.debug('rebalance %s stocks, after rebalance cash %s', np.count_nonzero(delta), self.cash)
+		return pd.Series(delta, index=names)
+
+	def _price(self, stock_name):
+		if self.profiler is not None:
+			self.profiler.count('loc')
+		return self.price_table.loc[stock_name]
+
+	def _prices(self, names):
+		if self.profiler is not None:
+			self.profiler.count('loc')
+		return self.price_table.reindex(names).to_numpy(dtype=float)
+
+	def _position(self, stock_name):
+		return self.stock_positions.get(stock_name, 0)
+
+	def _asset_order(self, names):
+		return self.price_table.index.get_indexer(names)
+
+	def _trade(self, stock_name, shares, stock_price, cost=0.):
+		'''
+		按股数成交, 现金减去成交金额和成本
+		'''
+		money = shares * stock_price
+		self.stock_positions[stock_name] = self.stock_positions.get(stock_name, 0) + shares
+		self.cash -= money + cost
+		if self.ledger is not None:
+			self.ledger.record_fill(stock_name, shares, stock_price, money, self.cash, cost)
+
+
+
+
+class ArrayAccount(Account):
+	'''
+	紧凑模式的账户: 持仓和价格按固定的标的顺序存放在 numpy 数组中,
+	单个标的的买卖与 Account 相同, 另外支持按权重向量一次性调仓
+	'''
+	def __init__(self, assets, cash=1e8):
+		super().__init__(cash=cash)
+		self.assets = pd.Index(assets)
+		self.positions = np.zeros(len(self.assets)) # 与 assets 对齐的持有股数
+		self.prices = np.full(len(self.assets), np.nan) # 与 assets 对齐的价格
+
+	def set_price_table(self, prices):
+		'''
+		prices: 价格横截面 Series, 或与 assets 对齐的 ndarray
+		'''
+		if isinstance(prices, pd.Series):
+			if not prices.index.equals(self.assets):
+				prices = prices.reindex(self.assets)
+			values = prices.to_numpy(dtype=float)
+		elif isinstance(prices, np.ndarray) and prices.shape == self.positions.shape:
+			values = prices.astype(float)
+		else:
+			raise NameError('input prices error, please input price cross section series')
+		if self.profiler is not None:
+			self.profiler.count('set_price_table')
+		missing = (self.positions != 0) & np.isnan(values)
+		if missing.any():
+			self.logger.error('stock %s price not exsist', list(self.assets[missing]))
+			sys.exit()
+		self.prices = values
+		self.price_table = prices
+
+	def show_asset(self):
+		for i in np.flatnonzero(self.positions):
+			self.logger.info('hold stock %s position %s', self.assets[i], self.positions[i])
+
+	def get_stock_position(self):
+		return {self.assets[i]: self.positions[i] for i in np.flatnonzero(self.positions)}
+
+	def _price(self, stock_name):
+		return self.prices[self.assets.get_loc(stock_name)]
+
+	def _prices(self, names):
+		index = self.assets.get_indexer(names)
+		return np.where(index >= 0, self.prices[index], np.nan)
+
+	def _position(self, stock_name):
+		return self.positions[self.assets.get_loc(stock_name)]
+
+	def _asset_order(self, names):
+		return self.assets.get_indexer(names)
+
+	def _trade(self, stock_name, shares, stock_price, cost=0.):
+		i = self.assets.get_loc(stock_name)
+		money = shares * stock_price
+		self.positions[i] += shares
+		self.cash -= money + cost
+		if self.ledger is not None:
+			self.ledger.record_fill(stock_name, shares, stock_price, money, self.cash, cost)
+
+	def refresh_account(self):
+		self.cash = self.init_cash
+		self.positions = np.zeros(len(self.assets))
+
+	def get_total_asset(self):
+		if self.profiler is not None:
+			self.profiler.count('get_total_asset')
+		held = self.positions != 0
+		return self.cash + np.dot(self.positions[held], self.prices[held])
+
+	def buy_stock_by_money(self, stock_name='STOCK', money=1e3):
 		'''
-		按照指定的手数买入
+		与 Account.buy_stock_by_money 相同, 总价格包含已持有的标的价值
 		'''
-		raise NotImplementedError
+		assert money >= 0
+		if self.profiler is not None:
+			self.profiler.count('buy_stock_by_money')
+		i = self.assets.get_loc(stock_name)
+		stock_price = self.prices[i]
+		hold_money = self.positions[i] * stock_price
+		buy_money = money
+		if self.positions[i] > 0:
+			if buy_money < hold_money:
+				if buy_money != 0:
+					self.logger.warning('buy warning, target buy money smaller than the hold value, sell the stock actually')
+				self.sell_stock_by_money(stock_name=stock_name, money=hold_money-buy_money)
+				buy_money = 0
+			else:
+				buy_money -= hold_money
+		if buy_money > self.cash:
+			self.logger.warning('buy warning, target buy money larger than the cash')
+			buy_money = self.cash
+		self.positions[i] += buy_money / stock_price
+		self.cash -= buy_money
+		if buy_money != 0:
+			if self.ledger is not None:
+				self.ledger.record_fill(stock_name, buy_money / stock_price, stock_price, buy_money, self.cash)
+			self.logger.debug('buy stock %s, buy money %s, after buy cash %s', stock_name, buy_money, self.cash)
 
-	def sell_stock_by_volumns(self):
+	def sell_stock_by_money(self, stock_name='STOCK', money=1e3):
+		assert money > 0
+		if self.profiler is not None:
+			self.profiler.count('sell_stock_by_money')
+		i = self.assets.get_loc(stock_name)
+		if self.positions[i] == 0:
+			raise NameError(f'sell error, stock {stock_name} not hold')
+		stock_price = self.prices[i]
+		hold_money = self.positions[i] * stock_price
+		sell_money = money
+		if sell_money - hold_money > 0:
+			self.logger.warning('sell warning, target money larger than the hold value')
+			sell_money = hold_money
+		self.positions[i] -= sell_money / stock_price
+		self.cash += sell_money
+		if self.ledger is not None:
+			self.ledger.record_fill(stock_name, -sell_money / stock_price, stock_price, -sell_money, self.cash)
+		self.logger.debug('sell stock %s, sell money %s, after sell cash %s', stock_name, sell_money, self.cash)
+
+	def rebalance_to_weights(self, weights, order=None):
 		'''
-		按照指定的手数卖出
+		weights: 与 assets 对齐的目标权重向量(ndarray), 或以标的名称为索引的 Series, 权重之和不超过1
+		order: 目标标的的调仓顺序(列位置), 默认按 assets 的顺序
+		按当前总资产一次性调仓到目标权重: 先卖出不在目标中的标的, 再按顺序调整目标标的,
+		资金不足时买入被截断, 与依次调用 buy_stock_by_money 的结果一致
+		return: ndarray, 每个标的的交易金额, 正数为买入, 负数为卖出
 		'''
-		raise NotImplementedError
+		if isinstance(weights, pd.Series):
+			weights = weights.reindex(self.assets, fill_value=0).to_numpy(dtype=float)
+		weights = np.asarray(weights, dtype=float)
+		if weights.shape != self.positions.shape:
+			raise NameError('input weights error, please input weights aligned to assets')
+		if self.profiler is not None:
+			self.profiler.count('rebalance_to_weights')
+		assert (weights >= 0).all() and weights.sum() <= 1 + 1e-9
 
+		total_asset = self.get_total_asset()
+		target = weights > 0
+		trade = np.zeros(len(self.assets))
+		held = self.positions != 0
+		trade[target | held] = weights[target | held] * total_asset - self.positions[target | held] * self.prices[target | held]
 
+		# ----- 卖出不在目标中的标的 -----
+		exit_stock = np.flatnonzero(held & ~target)
+		self.positions[exit_stock] += trade[exit_stock] / self.prices[exit_stock]
+		exit_cash = self.cash - np.cumsum(trade[exit_stock])
+		self.cash -= trade[exit_stock].sum()
 
+		# ----- 按顺序调整目标标的, 现金不能为负 -----
+		if order is None:
+			order = np.flatnonzero(target)
+		else:
+			order = np.asarray(order, dtype=np.int64)
+			order = order[target[order]]
+		if len(order) > 0:
+			level = self.cash - np.cumsum(trade[order])
+			cash_after = level - np.minimum(np.minimum.accumulate(level), 0)
+			cash_before = np.concatenate([[self.cash], cash_after[:-1]])
+			done = cash_before - cash_after
+			if (trade[order] - done > 1e-9 * abs(total_asset)).any():
+				self.logger.warning('buy warning, target buy money larger than the cash')
+			trade[order] = done
+			self.positions[order] += done / self.prices[order]
+			self.cash = cash_after[-1]
+		else:
+			cash_after = np.zeros(0)
+		if self.ledger is not None:
+			stocks = np.concatenate([exit_stock, order])
+			cash = np.concatenate([exit_cash, cash_after])
+			traded = trade[stocks] != 0
+			stocks = stocks[traded]
+			self.ledger.record_fills(self.assets[stocks], trade[stocks] / self.prices[stocks], self.prices[stocks], trade[stocks], cash[traded])
+		self.logger.debug('rebalance %s stocks, after rebalance cash %s', np.count_nonzero(trade), self.cash)
+		return trade
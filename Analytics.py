@@ -0,0 +1,166 @@
+import pandas as pd
+import numpy as np
+
+
+class Analytics():
+	'''
+	多个策略净值(日期 x 策略)的绩效指标, 所有策略在同一次向量化计算中完成.
+	年化因子由日期序列推断: 每年的平均观测个数, 周频约 52, 日频约 250.
+	'''
+	DAYS_PER_YEAR = 365. # 按自然日年化时每年的天数, 与原来的 strategy_info 相同
+
+	@staticmethod
+	def periods_per_year(index):
+		index = pd.DatetimeIndex(index)
+		if len(index) < 2:
+			return np.nan
+		days = (index[-1] - index[0]) / pd.Timedelta(days=1)
+		return (len(index) - 1) / days * Analytics.DAYS_PER_YEAR if days > 0 else np.nan
+
+	@staticmethod
+	def returns(values):
+		'''
+		return: DataFrame, 每期收益率, 去掉第一期
+		'''
+		values = Analytics._as_frame(values)
+		arr = values.to_numpy(dtype=float)
+		return pd.DataFrame(arr[1:] / arr[:-1] - 1, index=values.index[1:], columns=values.columns)
+
+	@staticmethod
+	def annual_returns(values):
+		'''
+		return: DataFrame(年份 x 策略), 每年第一个和最后一个净值之间的收益
+		'''
+		values = Analytics._as_frame(values)
+		grouped = values.groupby(values.index.year)
+		return grouped.last() / grouped.first() - 1
+
+	@staticmethod
+	def drawdown(values):
+		'''
+		return: DataFrame(日期 x 策略), 相对历史最高净值的回撤, 正数
+		'''
+		values = Analytics._as_frame(values)
+		arr = values.to_numpy(dtype=float)
+		return pd.DataFrame(1 - arr / np.fmax.accumulate(arr, axis=0), index=values.index, columns=values.columns)
+
+	@staticmethod
+	def max_drawdown(values):
+		'''
+		return: DataFrame(策略 x 指标), 最大回撤及其开始(前高)、最低点和恢复日期, 未恢复时为 NaT
+		'''
+		values = Analytics._as_frame(values)
+		arr = values.to_numpy(dtype=float)
+		n, k = arr.shape
+		cols = np.arange(k)
+		position = np.arange(n)[:, None]
+		peak = np.fmax.accumulate(arr, axis=0)
+		dd = 1 - arr / peak
+		trough = np.nanargmax(np.where(np.isnan(dd), -np.inf, dd), axis=0)
+		# 最低点之前最近一次创新高的位置
+		peak_position = np.maximum.accumulate(np.where(arr == peak, position, 0), axis=0)[trough, cols]
+		recovered = (position > trough) & (arr >= arr[peak_position, cols])
+		recovery = recovered.argmax(axis=0)
+		dates = values.index
+		return pd.DataFrame({
+			'max_drawdown': dd[trough, cols],
+			'drawdown_start': dates[peak_position],
+			'drawdown_trough': dates[trough],
+			'drawdown_recovery': pd.DatetimeIndex(np.where(recovered.any(axis=0), dates[recovery].to_numpy(), np.datetime64('NaT'))),
+		}, index=values.columns)
+
+	@staticmethod
+	def turnover(weights):
+		'''
+		weights: dict, 策略名称 -> 目标权重(日期 x 标的, ndarray 或 DataFrame)
+		return: Series, 每次调仓的平均单边换手率, 0.5 * sum|w[t] - w[t-1]|, 不含建仓
+		'''
+		result = {}
+		for leg, w in weights.items():
+			w = np.asarray(w, dtype=float)
+			result[leg] = 0.5 * np.abs(np.diff(w, axis=0)).sum(axis=1).mean() if len(w) > 1 else np.nan
+		return pd.Series(result, dtype=float)
+
+	@staticmethod
+	def summary(values, weights=None, periods_per_year=None):
+		'''
+		values: DataFrame(日期 x 策略) 净值或总资产
+		weights: 可选, 计算换手率用的目标权重, 见 turnover
+		periods_per_year: 年化因子, 默认由日期推断
+		return: DataFrame(策略 x 指标)
+		'''
+		values = Analytics._as_frame(values)
+		ppy = Analytics.periods_per_year(values.index) if periods_per_year is None else periods_per_year
+		arr = values.to_numpy(dtype=float)
+		days = (values.index[-1] - values.index[0]) / pd.Timedelta(days=1)
+		total = arr[-1] / arr[0] - 1
+		years = days / Analytics.DAYS_PER_YEAR
+		ret = arr[1:] / arr[:-1] - 1
+		with np.errstate(divide='ignore', invalid='ignore'):
+			annual = total / years # 与 strategy_info 相同的单利年化
+			cagr = (1 + total) ** (1 / years) - 1
+			volatility = np.std(ret, axis=0, ddof=1) * np.sqrt(ppy) if len(ret) > 1 else np.full(arr.shape[1], np.nan)
+			result = pd.DataFrame({
+				'total_return': total,
+				'annual_return': annual,
+				'cagr': cagr,
+				'volatility': volatility,
+				'sharpe': annual / volatility,
+				'max_value': np.nanmax(arr, axis=0),
+			}, index=values.columns)
+		result = result.join(Analytics.max_drawdown(values))
+		with np.errstate(divide='ignore', invalid='ignore'):
+			result['calmar'] = result['annual_return'] / result['max_drawdown']
+		if weights is not None:
+			per_period = Analytics.turnover(weights)
+			result['turnover'] = per_period.reindex(result.index)
+			result['annual_turnover'] = result['turnover'] * ppy
+		result.attrs['periods_per_year'] = ppy
+		return result
+
+	@staticmethod
+	def rolling(values, window, periods_per_year=None, weights=None):
+		'''
+		window: 窗口内的观测个数
+		weights: 可选, 与 values 的日期对齐的目标权重, 见 turnover, 给出时另外计算窗口内的平均换手率
+		return: DataFrame, 列为 (指标, 策略), 指标包括 return, volatility, sharpe, max_drawdown, calmar, 以及 turnover
+		'''
+		values = Analytics._as_frame(values)
+		ppy = Analytics.periods_per_year(values.index) if periods_per_year is None else periods_per_year
+		arr = values.to_numpy(dtype=float)
+		n, k = arr.shape
+		names = ['return', 'volatility', 'sharpe', 'max_drawdown', 'calmar'] + (['turnover'] if weights is not None else [])
+		out = {name: np.full((n, k), np.nan) for name in names}
+		if n >= window > 1:
+			# 窗口内的净值, (窗口个数, 策略, window)
+			view = np.lib.stride_tricks.sliding_window_view(arr, window, axis=0)
+			ret = view[..., 1:] / view[..., :-1] - 1
+			total = view[..., -1] / view[..., 0] - 1
+			with np.errstate(divide='ignore', invalid='ignore'):
+				volatility = ret.std(axis=-1, ddof=1) * np.sqrt(ppy)
+				annual = total * ppy / (window - 1)
+				max_drawdown = (1 - view / np.maximum.accumulate(view, axis=-1)).max(axis=-1)
+				out['return'][window - 1:] = total
+				out['volatility'][window - 1:] = volatility
+				out['sharpe'][window - 1:] = annual / volatility
+				out['max_drawdown'][window - 1:] = max_drawdown
+				out['calmar'][window - 1:] = annual / max_drawdown
+		if weights is not None and n >= window > 1:
+			for j, leg in enumerate(values.columns):
+				if leg not in weights:
+					continue
+				w = np.asarray(weights[leg], dtype=float)
+				if len(w) != n:
+					raise NameError(f'weights of {leg} do not match the dates of values')
+				# 窗口内 window - 1 次调仓的平均单边换手率
+				change = 0.5 * np.abs(np.diff(w, axis=0)).sum(axis=1)
+				out['turnover'][window - 1:, j] = np.lib.stride_tricks.sliding_window_view(change, window - 1).mean(axis=-1)
+		return pd.concat({name: pd.DataFrame(v, index=values.index, columns=values.columns) for name, v in out.items()}, axis=1)
+
+	@staticmethod
+	def _as_frame(values):
+		if isinstance(values, pd.Series):
+			return values.to_frame()
+		if not isinstance(values, pd.DataFrame):
+			raise NameError('input error, please load strategy values [DataFrame]')
+		return values.astype(float)
@@ -1,25 +1,25 @@
 import pandas as pd
+import numpy as np
 from Account import Account
+from Analytics import Analytics
+from Selector import Selector
+from Ledger import Ledger
+from Panel import Panel
+from Profiler import Profiler, NULL_STAGE
+from ResultCache import ResultCache
+from Rolling import RollingZScore
 import copy
 
 import logging
-import os 
 
-log_file_name = "./log/backtest.log"
-if not os.path.exists('log'):
-	os.mkdir('log')
-
-
-logging.basicConfig(level=logging.INFO, #设置日志输出格式
-                    filename=log_file_name, #log日志输出的文件位置和文件名
-                    filemode="w", #文件的写入格式，w为重新写入文件，默认是追加
-                    format="%(asctime)s - %(name)s - %(levelname)-9s - %(filename)-8s : %(lineno)s line - %(message)s", 
-                    # 日志输出的格式,-8表示占位符，让输出左对齐，输出长度都为8位
-                    datefmt="%Y-%m-%d %H:%M:%S", #时间输出的格式
-                    )
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler()) # 没有配置日志时不输出, 见 Context.configure_logging
 
 class BackTest():
-	def __init__(self, init_cash=1e8, number_of_longs=1):
+	ENGINE_VERSION = 1 # 打分和收益计算的版本, 计算方式变化时使 ResultCache 中的旧结果失效
+
+	def __init__(self, init_cash=1e8, number_of_longs=1, number_of_groups=None, engine='event', ledger=False, profile=False,
+				 cache=None, context=None, rebalance=None):
 		self.account = Account(cash=init_cash)
 		self._underlying = None # 标的资产价格
 		self._trade_date = [] # 交易日
@@ -30,10 +30,141 @@ class BackTest():
 		self._df_factors = None # 多因子的时间序列
 		self._df_long = None # 空头标的 时间序列
 		self._df_short = None # 多头标的 时间序列
+		self._long_index = None # 多头标的的列位置, 交易日 x number_of_longs
+		self._short_index = None # 空头标的的列位置, 交易日 x number_of_longs
+		self._number_of_groups = number_of_groups # 按打分分组的个数, 例如 10 为十分位
+		self._df_group = None # 每个交易日各标的所在的组, 0 为打分最低的一组
+		self._engine = engine # 收益计算方式, 'event' (默认) 逐日调用 Account, 'fast' 向量化, LONG / SHORT 的结果与 event 相同
+		self._ledger = Ledger() if ledger else None # 成交流水和每日快照, 默认不记录
+		self._z_score = None # 打分前对因子做滚动 Zscore 的 (window, n), 默认不做
+		self._live = None # 增量模式(append_bar)的状态, runTest 之后第一次 append_bar 时建立
+		self._shared_score = False # 由 subset 得到的一段, 打分和选股来自完整的回测, runTest 只计算收益
+		self._rebalancer = rebalance # Rebalancer, 按差额调仓并计算不交易区间、整手和交易成本; 为 None 时每次完全调仓到目标
+		self.account.set_ledger(self._ledger)
+		# 分阶段计时和调用计数, 默认不记录; 可以传入 Profiler(memory=True) 同时记录内存峰值
+		self._profiler = profile if isinstance(profile, Profiler) else (Profiler() if profile else None)
+		self.account.set_profiler(self._profiler)
+		# 输入不变时直接读取上一次 runTest 的结果, 默认不使用; True 为默认目录, 也可以传入 ResultCache
+		self._cache = cache if isinstance(cache, ResultCache) else (ResultCache() if cache else None)
+		# 日志写到 Context 的 logger, 多个投资范围在不同线程中运行时互不影响; 为 None 时使用模块的 logger
+		self._context = context
+		self._logger = logger if context is None else context.get_logger('BackTest')
+		if context is not None:
+			self.account.set_logger(context.get_logger('Account'))
 
 	def runTest(self):
-		self._calculate_score()
-		self._calculate_profit()
+		self._live = None
+		if self._profiler is not None:
+			self._profiler.start(loggers=[self._logger, self.account.logger])
+		try:
+			with self._stage('runTest'):
+				# 记录成交流水时需要实际计算, 不使用缓存
+				key = None
+				if self._cache is not None and not self._shared_score and self._ledger is None:
+					with self._stage('cache.load'):
+						key = self._cache_key()
+						if self._restore(self._cache.load(key)):
+							return
+				if not self._shared_score:
+					with self._stage('score'):
+						self._calculate_score()
+				with self._stage('profit'):
+					self._calculate_profit()
+				if key is not None:
+					with self._stage('cache.store'):
+						self._cache.store(key, self._result_frames())
+		finally:
+			if self._profiler is not None:
+				self._profiler.stop()
+
+	def _cache_key(self):
+		'''
+		return: 价格、因子、交易日和参数的内容哈希
+		'''
+		if self._underlying is None or self._df_factors is None or len(self._trade_date) == 0:
+			raise NameError('input error, please load underlying price, factors and trade date first')
+		return self._cache.key(self._underlying, self._df_factors, pd.DatetimeIndex(self._trade_date),
+							   engine=self._engine, engine_version=self.ENGINE_VERSION, init_cash=self.account.init_cash,
+							   number_of_longs=self._number_of_longs, number_of_groups=self._number_of_groups,
+							   z_score=self._z_score, rebalance=self._rebalancer)
+
+	def _result_frames(self):
+		'''
+		return: dict, runTest 的结果: 总资产、打分、多空标的及其列位置、分组和每日仓位(日期, 标的, 资金)
+		'''
+		positions = [(day, stock, money) for day, pos in self._df_position.items() for stock, money in pos.items()]
+		frames = {
+			'asset_values': self._asset_values.astype(float),
+			'score': self._df_score,
+			'long': self._df_long,
+			'short': self._df_short,
+			'long_index': pd.DataFrame(self._long_index),
+			'short_index': pd.DataFrame(self._short_index),
+			'position': pd.DataFrame(positions, columns=['date', 'stock', 'money']),
+		}
+		if self._df_group is not None:
+			frames['group'] = self._df_group
+		return frames
+
+	def _restore(self, frames):
+		'''
+		frames: ResultCache.load 的结果, 为 None 时不恢复
+		return: 是否恢复
+		'''
+		if frames is None:
+			return False
+		self._asset_values = frames['asset_values']
+		self._df_score = frames['score']
+		self._df_long = frames['long']
+		self._df_short = frames['short']
+		self._long_index = frames['long_index'].to_numpy()
+		self._short_index = frames['short_index'].to_numpy()
+		self._df_group = frames.get('group')
+		position = frames['position']
+		self._df_position = {day: {} for day in self._trade_date}
+		for day, stock, money in zip(pd.DatetimeIndex(position['date']), position['stock'], position['money']):
+			self._df_position[day][stock] = money
+		return True
+
+	@property
+	def profile(self):
+		'''
+		return: 最近一次 runTest 的分阶段耗时、调用计数和内存峰值, 见 Profiler.report; 未启用 profile 时为 None
+		'''
+		return None if self._profiler is None else self._profiler.report()
+
+	def _stage(self, name):
+		return NULL_STAGE if self._profiler is None else self._profiler.stage(name)
+
+	def subset(self, start, stop, number_of_longs=None, number_of_groups=None):
+		'''
+		start, stop: 交易日的位置, 取 [start, stop) 一段
+		number_of_longs, number_of_groups: 默认与本对象相同, 不同时在这一段的打分上重新选股
+		return: BackTest, 与本对象共用价格、因子和打分(切片视图, 不复制), 调用 runTest 只计算这一段的收益
+		本对象还没有打分时先计算一次完整区间的打分
+		'''
+		if self._df_score is None:
+			self._calculate_score()
+		number_of_longs = self._number_of_longs if number_of_longs is None else number_of_longs
+		number_of_groups = self._number_of_groups if number_of_groups is None else number_of_groups
+		fold = BackTest(init_cash=self.account.init_cash, number_of_longs=number_of_longs,
+						number_of_groups=number_of_groups, engine=self._engine, context=self._context,
+						rebalance=self._rebalancer)
+		fold._underlying = self._underlying
+		fold._df_factors = self._df_factors
+		fold._z_score = self._z_score
+		fold._trade_date = self._trade_date[start:stop]
+		fold._df_score = self._df_score.iloc[start:stop]
+		if number_of_longs == self._number_of_longs and number_of_groups == self._number_of_groups:
+			fold._long_index = self._long_index[start:stop]
+			fold._short_index = self._short_index[start:stop]
+			fold._df_long = self._df_long.iloc[start:stop]
+			fold._df_short = self._df_short.iloc[start:stop]
+			fold._df_group = None if self._df_group is None else self._df_group.iloc[start:stop]
+		else:
+			fold._select()
+		fold._shared_score = True
+		return fold
 
 	@property
 	def df_score(self):
@@ -41,6 +172,11 @@ class BackTest():
 
 	@property
 	def asset_values(self):
+		if self._live is not None and len(self._live['values']) > 0:
+			# 增量模式新增的行在读取时一次性合并
+			rows = pd.DataFrame(self._live['values'], index=self._live['dates'], columns=self._asset_values.columns)
+			self._asset_values = pd.concat([self._asset_values, rows])
+			self._live['values'], self._live['dates'] = [], []
 		return self._asset_values
 
 	def set_init_cash(self, money):
@@ -60,6 +196,10 @@ class BackTest():
 
 	@underlying.setter
 	def underlying(self, df):
+		# Panel 为内存映射面板, 直接引用不复制
+		if isinstance(df, Panel):
+			self._underlying = df.to_frame()
+			return
 		if not isinstance(df, pd.DataFrame):
 			raise NameError('input error, please load underlying price [DataFrame]')
 		self._underlying = df.copy()
@@ -72,18 +212,53 @@ class BackTest():
 	def df_short(self):
 		return self._df_short
 
+	@property
+	def ledger(self):
+		return self._ledger
+
+	@property
+	def engine(self):
+		return self._engine
+
+	@engine.setter
+	def engine(self, name):
+		if name not in ['fast', 'event']:
+			raise NameError(f'engine {name} error, please use fast or event')
+		self._engine = name
+
+	@property
+	def number_of_groups(self):
+		return self._number_of_groups
+
+	@number_of_groups.setter
+	def number_of_groups(self, n):
+		self._number_of_groups = n
+
+	@property
+	def df_group(self):
+		return self._df_group
+
 	@property
 	def df_factors(self):
 		return self._df_factors
 
+	def set_factor_z_score(self, window=100, n=5.2):
+		'''
+		打分前对每个因子做滚动 Zscore (RollingZScore(window, n)), window 为 None 时使用原始因子
+		'''
+		self._z_score = None if window is None else (window, n)
+
 	@df_factors.setter
 	def df_factors(self, df):
+		panel = isinstance(df, Panel)
+		if panel:
+			df = df.to_frame()
 		if not isinstance(df, pd.DataFrame):
 			raise NameError('input error, please load factors [DataFrame]')
 		if df.index[0] >= self._trade_date[0]:
 			raise NameError('input factor date do not cover the trading date')
-		self._df_factors = df.copy()
-		print(f'df factors shape {df.shape}')
+		self._df_factors = df if panel else df.copy()
+		self._logger.debug('df factors shape %s', df.shape)
 
 	@property
 	def trade_date(self):
@@ -104,65 +279,83 @@ class BackTest():
 			raise NameError('input error, please load underlying price [DataFrame] first')
 		if len(self._trade_date) == 0:
 			raise NameError('input error, please set trade date [list] first')
-		self._df_score = pd.DataFrame(index=self._trade_date, columns=self._underlying.columns)
+		if self._df_factors is None:
+			raise NameError('load the factor [DataFrame] first')
 		'''
 		# implement score calculation here
 		# 因子显示，标的越优秀，打分越低，比如国开1分，信用2分，应当买入国开
 		'''
+		# 找到交易日前一个日期的因子
+		with self._stage('score.align'):
+			factors = self._align_factors()
+		with self._stage('score.factors'):
+			self._df_score = self._score_factors(factors)
+		with self._stage('score.select'):
+			self._select()
+
+	def _select(self):
 		'''
-		temp_list = []
-		for i,day in enumerate(self._trade_date):
-			if i % 2 == 0:
-				s = [n for n in range(len(self._underlying.columns))]
-			else:
-				s = [n for n in range(len(self._underlying.columns))][::-1]
-			temp_list.append(s)
-		self._df_score[self._underlying.columns] = temp_list
+		按因子打分选出预测表现最好和最差的标的, 以及分组
 		'''
-		temp_list = []
-		if self._df_factors is None:
-			raise NameError('load the factor [DataFrame] first')
-		factor_date = self._df_factors.index.to_list()
-
-		# 带记忆的查找
-		previous_day_idx = 0
-		for i,day in enumerate(self._trade_date):
-			for j,factor_day in enumerate(factor_date[previous_day_idx:]):
-				if factor_day >= day:
-					assert j>=1
-					previous_day_idx = j-1
-					break
-			# 找到交易日前一个日期的因子
-			previous_day = factor_date[previous_day_idx]
-			factors = self._df_factors.loc[previous_day]
-			# 找到交易日当日的因子
-			# factores = self._df_factors.loc[day]
-
-			# 根据因子值，判断应该交易的标的打分情况
-			# 1.一或多个共有因子判断多个标的分数，非横截面
-			profit = factors.values[0]
-			if profit>=0:
-				# 国开
-				s = [1,2]
-			else:
-				# 信用
-				s = [2,1]
-			# 2.每个标的一个因子，横截面因子
-			# s = factors.rank().values 
-
-			temp_list.append(s)
-
-		self._df_score[self._underlying.columns] = temp_list
-		self._df_long = pd.DataFrame(columns=self._trade_date)
-		self._df_short = pd.DataFrame(columns=self._trade_date)
-
-		# 按因子打分选出预测表现最好和最差的标的
-		for i, day in enumerate(self._trade_date):
-		    self._df_long[day] = self._df_score.loc[day].sort_values().head(self._number_of_longs).index.to_list()
-		    self._df_short[day] = self._df_score.loc[day].sort_values().tail(self._number_of_longs).index.to_list()
+		scores = self._df_score.to_numpy(dtype=float)
+		self._long_index = Selector.top_n(scores, self._number_of_longs)
+		self._short_index = Selector.bottom_n(scores, self._number_of_longs)
+		self._df_long = Selector.to_labels(self._long_index, self._df_score.columns, self._trade_date)
+		self._df_short = Selector.to_labels(self._short_index, self._df_score.columns, self._trade_date)
+		if self._number_of_groups is not None:
+			group = Selector.quantile_groups(scores, self._number_of_groups)
+			self._df_group = pd.DataFrame(group, index=self._trade_date, columns=self._df_score.columns)
+		else:
+			self._df_group = None
+
+	@staticmethod
+	def asof_index(factor_date, trade_date):
+		'''
+		factor_date: 因子日期, 升序
+		trade_date: 交易日
+		return: ndarray, 每个交易日之前(不含当天)最近一个因子日期的位置, 没有则为 -1
+		'''
+		factor_date = pd.DatetimeIndex(factor_date).to_numpy()
+		trade_date = pd.DatetimeIndex(trade_date).to_numpy()
+		return np.searchsorted(factor_date, trade_date, side='left') - 1
+
+	def _align_factors(self):
+		'''
+		return: DataFrame, 交易日 x 因子, 每个交易日取前一个因子日期的因子值
+		因为涉及未来数据原因, 不使用交易日当天的因子值
+		'''
+		df_factors = self._factor_frame()
+		idx = self.asof_index(df_factors.index, self._trade_date)
+		if len(idx) > 0 and idx.min() < 0:
+			raise NameError('input factor date do not cover the trading date')
+		return pd.DataFrame(df_factors.to_numpy()[idx], index=self._trade_date, columns=df_factors.columns)
 
-		self._df_long = self._df_long.T
-		self._df_short = self._df_short.T
+	def _factor_frame(self):
+		'''
+		return: DataFrame, 按日期排序的因子, 设置了 set_factor_z_score 时为滚动 Zscore
+		'''
+		df_factors = self._df_factors
+		if not df_factors.index.is_monotonic_increasing:
+			df_factors = df_factors.sort_index()
+		if self._z_score is not None:
+			df_factors = RollingZScore(window=self._z_score[0], n=self._z_score[1]).transform(df_factors.astype(float))
+		return df_factors
+
+	def _score_factors(self, factors):
+		'''
+		factors: DataFrame, 交易日 x 因子
+		return: DataFrame, 交易日 x 标的 的打分表, 打分越低越优秀
+		'''
+		columns = self._underlying.columns
+		if columns.isin(factors.columns).all():
+			# 2.每个标的一个因子，横截面因子, 因子值即打分
+			return factors[columns].astype(float)
+		# 1.一或多个共有因子判断多个标的分数，非横截面
+		# 以两个标的为例, 利差为正时 国开1分 信用2分, 否则 国开2分 信用1分
+		profit = factors.iloc[:, 0].to_numpy()
+		ascending = np.arange(1, len(columns) + 1)
+		score = np.where((profit >= 0)[:, None], ascending, ascending[::-1])
+		return pd.DataFrame(score, index=factors.index, columns=columns)
 
 	def _set_stock_position(self, stocks, date):
 		'''
@@ -182,10 +375,14 @@ class BackTest():
 	def _handle_bar(self, position):
 		'''
 		position: 当日的标的和其资金仓位
+		设置 rebalance 时一次算出所有标的的差额交易, 只对需要交易的标的调用 Account
 		'''
+		if self._rebalancer is not None:
+			self.account.rebalance(position, self._rebalancer)
+			return
 		before_positions = self.account.get_stock_position()
 
-		for stock_name, pos in before_positions.items():
+		for stock_name, pos in list(before_positions.items()):
 			# 持仓为零的标的
 			if pos == 0:
 				continue
@@ -193,93 +390,350 @@ class BackTest():
 				# 已持有的标的不存在于新的持仓列表中，全部卖出
 				self.account.order_stock_by_percent(stock_name=stock_name, percent=0)
 
+		# 先减仓再加仓, 避免减仓释放的资金晚于加仓使用
+		prices = self.account.price_table
+		if self._profiler is not None:
+			self._profiler.count('loc', len(position))
+		reduce = [s for s, money in position.items() if before_positions.get(s, 0) * prices.loc[s] > money]
+		for stock_name in reduce:
+			self.account.buy_stock_by_money(stock_name=stock_name, money=position[stock_name])
 		for stock_name, money in position.items():
-			self.account.buy_stock_by_money(stock_name=stock_name, money=money)
+			if stock_name not in reduce:
+				self.account.buy_stock_by_money(stock_name=stock_name, money=money)
 
+	def _target_weights(self):
+		'''
+		return: dict, 策略名称 -> ndarray(交易日 x 标的) 的目标权重, 组内均分资金
+		LONG / SHORT 为打分最低 / 最高的 number_of_longs 个标的, 设置 number_of_groups 时
+		另有 G1..GN 按打分从低到高分组
+		'''
+		group = None if self._df_group is None else self._df_group.to_numpy()
+		return self._selection_weights(self._long_index, self._short_index, group, len(self._df_score.columns))
 
+	def _selection_weights(self, long_index, short_index, group, n_assets):
+		'''
+		long_index, short_index: 每行选中标的的列位置; group: 每个标的所在的组, 可以为 None
+		return: dict, 策略名称 -> ndarray(行 x 标的) 的目标权重
+		'''
+		shape = (len(long_index), n_assets)
+		rows = np.arange(shape[0])[:, None]
+		weights = {}
+		for leg, index in [('LONG', long_index), ('SHORT', short_index)]:
+			w = np.zeros(shape)
+			w[rows, index] = 1. / self._number_of_longs
+			weights[leg] = w
+		if group is not None:
+			for g in range(self._number_of_groups):
+				member = group == g
+				count = member.sum(axis=1, keepdims=True)
+				weights[f'G{g+1}'] = np.where(member, 1. / np.maximum(count, 1), 0.)
+		return weights
+
+	def append_bar(self, date, prices, factor_row=None, factor_date=None):
+		'''
+		增量模式: runTest 之后, 每个新的交易日调用一次, 只用新的一行数据更新状态, 不重算历史
+		date: 新的交易日, 晚于已有的交易日
+		prices: Series, 当日各标的的价格
+		factor_row: Series, 新的一行因子值(与 df_factors 同列), 日期为 factor_date, 默认为 factor_row.name;
+			或 DataFrame, 上一次调用之后的多行因子, 索引为日期. 与 runTest 相同, 只有日期早于交易日的因子才用于打分
+		return: (orders, asset_value)
+			orders: DataFrame(策略 x 标的), 当日调仓的股数, 买入为正, 卖出为负
+			asset_value: Series, 各策略当日交易前的总资产
+		结果与把新数据加入 underlying、df_factors、trade_date 后重新 runTest 的最后一个交易日相同;
+		只按 engine='fast' 的方式计算. 新的交易日只记录在增量状态和 asset_values 中,
+		underlying、df_factors、trade_date 和 df_score 等历史表格不会扩展, 之后再调用 runTest 会丢弃增量结果
+		'''
+		if self._asset_values is None:
+			raise NameError('please runTest first')
+		if self._engine != 'fast':
+			raise NameError(f'append_bar only supports engine fast, not {self._engine}')
+		if self._rebalancer is not None:
+			raise NameError('append_bar does not support rebalance, please runTest again')
+		if self._live is None:
+			self._start_live()
+		live = self._live
+		date = pd.Timestamp(date)
+		if date <= live['date']:
+			raise NameError('new bar date must be later than the last trade date')
+		if isinstance(factor_row, pd.DataFrame):
+			# 上一个交易日之后的多行因子, 按日期依次加入
+			rows = [(day, row) for day, row in factor_row.sort_index().iterrows()]
+		elif factor_row is not None:
+			rows = [(factor_row.name if factor_date is None else factor_date, factor_row)]
+		else:
+			rows = []
+		for factor_date, row in rows:
+			factor_date = pd.Timestamp(factor_date)
+			if factor_date <= live['factor_date']:
+				raise NameError('new factor date must be later than the last factor date')
+			row = row.reindex(live['factor_columns']).to_numpy(dtype=float)
+			if live['stream'] is not None:
+				row = live['stream'].update(row)
+			live['pending'].append((factor_date, row))
+			live['factor_date'] = factor_date
+		# 交易日之前最近的一行因子
+		while len(live['pending']) > 0 and live['pending'][0][0] < date:
+			live['factor'] = live['pending'].pop(0)[1]
+
+		# ----- 上一个交易日的目标仓位按当日价格估值 -----
+		price = prices.reindex(self._underlying.columns).to_numpy(dtype=float)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			period_return = price / live['price'] - 1
+		contribution = np.where(live['weights'] > 0, live['weights'] * period_return, 0.)
+		live['growth'] = live['growth'] * (1 + contribution.sum(axis=1))
+		value = self.account.init_cash * live['growth']
+
+		# ----- 打分, 选股, 调仓 -----
+		factors = pd.DataFrame([live['factor']], index=[date], columns=live['factor_columns'])
+		scores = self._score_factors(factors).to_numpy(dtype=float)
+		long_index = Selector.top_n(scores, self._number_of_longs)
+		short_index = Selector.bottom_n(scores, self._number_of_longs)
+		group = Selector.quantile_groups(scores, self._number_of_groups) if self._number_of_groups is not None else None
+		weights = self._selection_weights(long_index, short_index, group, scores.shape[1])
+		legs = live['legs']
+		w = np.stack([weights[leg][0] for leg in legs])
+		with np.errstate(divide='ignore', invalid='ignore'):
+			shares = np.where(w > 0, w * value[:, None] / price, 0.)
+		orders = pd.DataFrame(shares - live['shares'], index=legs, columns=self._underlying.columns)
+		live.update(weights=w, price=price, shares=shares, date=date)
+
+		live['dates'].append(date)
+		live['values'].append(value)
+		if 'LONG' in legs:
+			names = self._underlying.columns
+			money = value[legs.index('LONG')] / self._number_of_longs
+			self._df_position[date] = {names[j]: money for j in long_index[0]}
+		return orders, pd.Series(value, index=legs, name=date)
+
+	def _start_live(self):
+		'''
+		由 runTest 的结果建立增量模式的状态: 最后一个交易日的目标权重、持股数、价格、累计净值和因子
+		'''
+		legs = list(self._asset_values.columns)
+		weights = self._target_weights()
+		w = np.stack([weights[leg][-1] for leg in legs])
+		value = self._asset_values.iloc[-1].to_numpy(dtype=float)
+		price = self._underlying.loc[self._trade_date[-1]].to_numpy(dtype=float)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			shares = np.where(w > 0, w * value[:, None] / price, 0.)
+
+		df_factors = self._factor_frame()
+		last = self.asof_index(df_factors.index, self._trade_date[-1:])[0]
+		values = df_factors.to_numpy(dtype=float)
+		stream = None
+		if self._z_score is not None:
+			raw = self._df_factors.sort_index().to_numpy(dtype=float)
+			stream = RollingZScore(window=self._z_score[0], n=self._z_score[1]).stream(raw)
+		self._live = {
+			'legs': legs,
+			'weights': w,
+			'shares': shares,
+			'price': price,
+			'growth': value / self.account.init_cash,
+			'factor_columns': df_factors.columns,
+			'factor': values[last],
+			'factor_date': df_factors.index[-1],
+			# 晚于最后一个交易日的因子, 等待之后的交易日使用
+			'pending': [(df_factors.index[i], values[i]) for i in range(last + 1, len(df_factors))],
+			'stream': stream,
+			# 最后一个交易日, 包括增量加入的
+			'date': self._trade_date[-1],
+			'dates': [],
+			'values': [],
+		}
 
 	def _calculate_profit(self):
 		'''
 		根据每日仓位，计算每日收益
+		engine 为 'fast' 时按调仓区间收益率的累乘向量化计算, 为 'event' 时逐日调用 Account 交易
+		'''
+		if self._engine == 'fast' and self._rebalancer is not None:
+			self._calculate_profit_rebalance()
+		elif self._engine == 'fast':
+			self._calculate_profit_fast()
+		elif self._engine == 'event':
+			self._calculate_profit_event()
+		else:
+			raise NameError(f'engine {self._engine} error, please use fast or event')
+
+	def _calculate_profit_fast(self):
+		'''
+		每个交易日按交易前的总资产调仓到目标权重, 下一个交易日的总资产为
+		V[i+1] = V[i] * (1 + sum_j w[i, j] * r[i+1, j]), 所有策略作为列一次计算
+		'''
+		with self._stage('profit.prices'):
+			prices = self._underlying.loc[self._trade_date].to_numpy(dtype=float)
+		with self._stage('profit.weights'):
+			weights = self._target_weights()
+			legs = list(weights.keys())
+			w = np.stack([weights[leg] for leg in legs]) # 策略 x 交易日 x 标的
+		with self._stage('profit.values'):
+			with np.errstate(divide='ignore', invalid='ignore'):
+				period_return = prices[1:] / prices[:-1] - 1
+			contribution = np.where(w[:, :-1] > 0, w[:, :-1] * period_return, 0.)
+			growth = 1 + contribution.sum(axis=2)
+			init_cash = self.account.init_cash
+			values = init_cash * np.concatenate([np.ones((len(legs), 1)), np.cumprod(growth, axis=1)], axis=1)
+			self._asset_values = pd.DataFrame(values.T, index=self._trade_date, columns=legs)
+		if self._profiler is not None:
+			self._profiler.count('loc')
+		if self._ledger is not None:
+			# 交易前的现金为上一次调仓后未投资的部分
+			invested = w.sum(axis=2)
+			cash = np.concatenate([np.full((len(legs), 1), init_cash), values[:, :-1] * (1 - invested[:, :-1])], axis=1)
+			for k, leg in enumerate(legs):
+				self._ledger.record_snapshots(self._trade_date, leg, cash[k], values[k])
+			# 成交为目标持股数与上一次调仓后持股数之差
+			with np.errstate(divide='ignore', invalid='ignore'):
+				shares = np.where(w > 0, w * values[:, :, None] / prices, 0.)
+			delta = shares - np.concatenate([np.zeros_like(shares[:, :1]), shares[:, :-1]], axis=1)
+			self._record_fills(legs, delta, prices, cash)
+		self._set_fast_positions()
+
+	def _calculate_profit_rebalance(self):
+		'''
+		设置 rebalance 时的 fast 引擎: 逐个交易日对所有策略同时按 Rebalancer 差额调仓, 两次调仓之间持股数不变;
+		总资产为每日交易前的总资产, 与 event 引擎相同. 价格缺失的持仓不交易, 按最新的有效价格计算市值,
+		与完全调仓的引擎(估值为 NaN)不同, 见 Rebalancer
+		'''
+		with self._stage('profit.prices'):
+			prices = self._underlying.loc[self._trade_date].to_numpy(dtype=float)
+		with self._stage('profit.weights'):
+			weights = self._target_weights()
+			legs = list(weights.keys())
+			w = np.stack([weights[leg] for leg in legs]) # 策略 x 交易日 x 标的
+		with self._stage('profit.values'):
+			n_legs, n_days = w.shape[:2]
+			shares = np.zeros((n_legs, prices.shape[1]))
+			cash = np.full(n_legs, float(self.account.init_cash))
+			last = np.full(prices.shape[1], np.nan) # 每个标的最新的价格
+			values = np.empty((n_legs, n_days))
+			cash_before = np.empty((n_legs, n_days))
+			if self._ledger is not None:
+				deltas, costs = np.zeros(w.shape), np.zeros(w.shape)
+			for i in range(n_days):
+				last = np.where(np.isnan(prices[i]), last, prices[i])
+				values[:, i] = cash + np.where(shares != 0, shares * last, 0.).sum(axis=1)
+				cash_before[:, i] = cash
+				delta, cost = self._rebalancer.orders(shares, prices[i], w[:, i], cash, valuation=last)
+				shares += delta
+				cash = cash - np.where(delta != 0, delta * prices[i], 0.).sum(axis=1) - cost.sum(axis=1)
+				if self._ledger is not None:
+					deltas[:, i], costs[:, i] = delta, cost
+			self._asset_values = pd.DataFrame(values.T, index=self._trade_date, columns=legs)
+		if self._profiler is not None:
+			self._profiler.count('loc')
+		if self._ledger is not None:
+			for k, leg in enumerate(legs):
+				self._ledger.record_snapshots(self._trade_date, leg, cash_before[k], values[k])
+			self._record_fills(legs, deltas, prices, cash_before, costs)
+		self._set_fast_positions()
+
+	def _record_fills(self, legs, delta, prices, cash, cost=None):
+		'''
+		fast 引擎的成交流水, 每个交易日先卖后买
+		delta, cost: ndarray (策略 x 交易日 x 标的), 成交股数和交易成本; prices: (交易日 x 标的); cash: (策略 x 交易日), 交易前的现金
+		'''
+		names = self._underlying.columns
+		for k, leg in enumerate(legs):
+			self._ledger.set_leg(leg)
+			for i, day in enumerate(self._trade_date):
+				d = delta[k, i]
+				with np.errstate(invalid='ignore'):
+					traded = np.flatnonzero((d != 0) & np.isfinite(d * prices[i]))
+				if len(traded) == 0:
+					continue
+				traded = traded[np.argsort(d[traded] > 0, kind='stable')]
+				money = d[traded] * prices[i, traded]
+				c = np.zeros(len(traded)) if cost is None else cost[k, i, traded]
+				self._ledger.set_date(day)
+				self._ledger.record_fills(names[traded], d[traded], prices[i, traded], money,
+										  cash[k, i] - np.cumsum(money + c), cost=c)
+
+	def _set_fast_positions(self):
+		'''
+		每日的预设仓位: 多头标的均分交易前的总资产
+		'''
+		long_value = self._asset_values['LONG'].to_numpy()
+		names = np.asarray(self._df_score.columns, dtype=object)
+		money = long_value / self._number_of_longs
+		self._df_position = {day: {names[j]: money[i] for j in self._long_index[i]} for i, day in enumerate(self._trade_date)}
+
+	def _calculate_profit_event(self):
+		'''
+		逐日调用 Account 交易的参考实现
 		'''
 		self._asset_values = pd.DataFrame(columns=['LONG', 'SHORT'], index=self._trade_date)
+		self._df_position, self._asset_values['LONG'] = self._replay(self._df_long, 'long')
+		_, self._asset_values['SHORT'] = self._replay(self._df_short, 'short')
 
-		# long
+	def _replay(self, df_stocks, name):
+		'''
+		df_stocks: 每个交易日持有的标的
+		return: 每日的预设仓位, 每日交易前的总资产
+		'''
 		dict_position = {} # 预设的仓位，实际上未必能完全复刻
 		self.account.refresh_account()
-		total_asset_long = []
+		total_asset = []
 
 		# ----- initial state ------
-		logging.info(f'long initial state')
+		self._logger.info('%s initial state', name)
+		if self._ledger is not None:
+			self._ledger.set_leg(name.upper())
+		debug = self._logger.isEnabledFor(logging.DEBUG)
 
 		for i, day in enumerate(self._trade_date):
 		    # ----- before trade -------
-		    self.account.set_price_table(prices=self._underlying.loc[day])
+		    with self._stage('profit.set_price_table'):
+		        self.account.set_price_table(prices=self._underlying.loc[day])
 
-		    logging.info(f'date: {day}, before trade, cash {self.account.get_cash()}, total asset {self.account.get_total_asset()}')
 		    # 每日交易前的资产总和
-		    total_asset_long.append(self.account.get_total_asset())
-		    stocks = self._df_long.loc[day].values
-
-		    # -------- trade ----------
-		    dict_position[day] = self._set_stock_position(stocks=stocks, date=day)
-		    self._handle_bar(position=dict_position[day])
-
-		    # ----- after trade -------
-		    # logging.info(f'date: {day}, after trade, cash {self.account.get_cash()}, total asset {self.account.get_total_asset()}')
-		self._df_position = dict_position.copy()
-		self._asset_values['LONG'] = total_asset_long
-
-		# short
-		dict_position = {}
-		self.account.refresh_account()
-		total_asset_short = []
-
-		# ----- initial state ------
-		logging.info(f'short initial state')
-
-		for i, day in enumerate(self._trade_date):
-		    # ----- before trade -------
-		    self.account.set_price_table(prices=self._underlying.loc[day])
-		    
-		    logging.info(f'date: {day}, before trade, cash {self.account.get_cash()}, total asset {self.account.get_total_asset()}')
-		    total_asset_short.append(self.account.get_total_asset())
-		    stocks = self._df_short.loc[day].values
+		    with self._stage('profit.snapshot'):
+		        cash, total = self.account.get_cash(), self.account.get_total_asset()
+		        total_asset.append(total)
+		        if self._ledger is not None:
+		            self._ledger.set_date(day)
+		            self._ledger.record_snapshot(cash, total)
+		        if debug:
+		            self._logger.debug('date: %s, before trade, cash %s, total asset %s', day, cash, total)
+		    stocks = df_stocks.loc[day].values
+		    if self._profiler is not None:
+		        self._profiler.count('loc', 2) # 价格和持仓标的两次 .loc 查找
 
 		    # -------- trade ----------
-		    dict_position[day] = self._set_stock_position(stocks=stocks, date=day)
-		    self._handle_bar(position=dict_position[day])
+		    with self._stage('profit.set_stock_position'):
+		        dict_position[day] = self._set_stock_position(stocks=stocks, date=day)
+		    with self._stage('profit.handle_bar'):
+		        self._handle_bar(position=dict_position[day])
 
-		    # ----- after trade -------
-		    # logging.info(f'date: {day}, after trade, cash {self.account.get_cash()}, total asset {self.account.get_total_asset()}')
+		return dict_position, total_asset
 
-		self._asset_values['SHORT'] = total_asset_short
+	def performance(self):
+		'''
+		return: DataFrame, 各策略的绩效指标, 见 Analytics.summary, 换手率按目标权重计算
+		'''
+		if self._asset_values is None:
+			raise NameError('please runTest first')
+		weights = self._target_weights()
+		values = self.asset_values
+		return Analytics.summary(values, weights={leg: w for leg, w in weights.items() if leg in values.columns})
 
 	@staticmethod
-	def strategy_info(df: pd.DataFrame(), group: str):
-	    """
-	    df: 策略净值
-	    gourp: 'LONG' , 策略名称
-	    最大回撤 最大亏损 按年来算，收益也按年算
-	    """
-	    
-	    def get_return_by_year(arr):
-	        return arr[-1] / arr[0] - 1
-
-	    print(group,'策略 各年度收益',df.resample('1Y').apply(get_return_by_year))
-
-	    print(group,'策略 最大回撤',1 - (df / df.expanding().max()).sort_values(by=group).iloc[0,0], 
-	          ' 日期 ', (df / df.expanding().max()).sort_values(by=group).index[0])
-	    print(group,'策略 最大净值', df.max())
-	    first_day = df.index[0]
-	    last_day = df.index[-1]
-	    ir_yearly = (df.loc[last_day] - df.loc[first_day])/ df.loc[first_day] / ((last_day.date() - first_day.date())/datetime.timedelta(days=1)) * 365
-	    print(group,'策略 {sy}年至{ey}年间 年化收益率'.format(sy=first_day,ey=last_day), ir_yearly[0])
-
-	    df_ir = df / df.shift(1) - 1
-	    df_ir.iloc[0] = 0
-	    print(group,'策略 年化波动率', (df_ir.std()[0] * np.sqrt(52)))
-	    print(group,'策略 夏普比率(忽略无风险收益率)', (ir_yearly[0]) / (df_ir.std()[0] * np.sqrt(52)))
-	    print('-'*20)
-	    print()
-	    return ir_yearly[0], (ir_yearly[0]) / (df_ir.std()[0] * np.sqrt(52))
+	def strategy_info(df: pd.DataFrame, group: str):
+		"""
+		df: 策略净值
+		gourp: 'LONG' , 策略名称
+		最大回撤 最大亏损 按年来算，收益也按年算
+		return: 年化收益率, 夏普比率; 完整的指标见 Analytics.summary
+		"""
+		values = df[[group]] if isinstance(df, pd.DataFrame) else df.rename(group).to_frame()
+		info = Analytics.summary(values).loc[group]
+		print(group,'策略 各年度收益',Analytics.annual_returns(values)[group])
+		print(group,'策略 最大回撤',info['max_drawdown'],' 日期 ',info['drawdown_trough'])
+		print(group,'策略 最大净值',info['max_value'])
+		print(group,'策略 {sy}年至{ey}年间 年化收益率'.format(sy=values.index[0],ey=values.index[-1]),info['annual_return'])
+		print(group,'策略 年化波动率',info['volatility'])
+		print(group,'策略 夏普比率(忽略无风险收益率)',info['sharpe'])
+		print('-'*20)
+		print()
+		return info['annual_return'], info['sharpe']
@@ -0,0 +1,185 @@
+import pandas as pd
+import numpy as np
+
+from Factor import Factor, CrossSectionFactor
+from Panel import Panel
+from Rolling import RollingZScore
+
+
+class ChunkedPipeline():
+	'''
+	按日期分块的因子处理, 用于放不进内存的长历史面板(日期 x 序列).
+	与 Factor / CrossSectionFactor 的各项操作结果相同, 但每次只读入 chunk 个元素左右的一块日期,
+	每块只带上后续步骤需要的历史行(滚动窗口 window - 1 行, 延迟 window 行)以及 ffill 需要的每列最后一个有效值,
+	内存占用由块的大小决定, 与历史长度无关; 结果逐块写入 Panel (内存映射面板), 可以直接交给 BackTest.
+
+		pipe = ChunkedPipeline(Panel.open('data/factor')).rolling_z_score(100).align(trade_days)
+		panel = pipe.run('data/factor_z')
+
+	align 之前的步骤在因子自身的日期上计算, 之后的步骤在对齐后的日期上计算, 与 Factor.get_factor 的对齐方式相同:
+	日期为因子日期与 dates 的并集, 向前填充, 最前面缺失的部分用第一个有效值填充.
+	'''
+	def __init__(self, source, chunk=1 << 22):
+		'''
+		source: Panel 或 DataFrame (日期 x 序列), 日期升序且不重复
+		chunk: 每块的元素个数上限(至少一行)
+		'''
+		if isinstance(source, Panel):
+			self._values = source.values
+			self.source_index = pd.DatetimeIndex(source.dates)
+			self.columns = source.assets
+		elif isinstance(source, pd.DataFrame):
+			self._values = source
+			self.source_index = pd.DatetimeIndex(source.index)
+			self.columns = source.columns
+		else:
+			raise NameError('input error, please load factor panel [DataFrame or Panel]')
+		if len(self.source_index) == 0:
+			raise NameError('input error, factor panel is empty')
+		if not (self.source_index.is_monotonic_increasing and self.source_index.is_unique):
+			raise NameError('input dates must be ascending and unique')
+		self.rows = max(1, int(chunk) // max(len(self.columns), 1))
+		self.dates = None # align 的目标日期
+		self._steps = [] # (名称, 需要的历史行数, 函数: 2-D ndarray -> 同形状的 2-D ndarray)
+		self._align_at = None # align 在 _steps 中的位置
+
+	def align(self, dates):
+		if self._align_at is not None:
+			raise NameError('pipeline already aligned')
+		self.dates = pd.DatetimeIndex(dates)
+		self._align_at = len(self._steps)
+		return self
+
+	# 延迟 window 行, 避免使用未来数据, 同 Factor.set_delay
+	def shift(self, window=1):
+		window = int(window)
+		if window < 0:
+			raise NameError('shift window must not be negative')
+
+		def shift(arr):
+			out = np.full(arr.shape, np.nan)
+			out[window:] = arr[:len(arr) - window]
+			return out
+		self._steps.append(('shift', window, shift))
+		return self
+
+	# 按列(时间序列)的滚动 Zscore, 同 Factor.calculate_rolling_z_score
+	def rolling_z_score(self, window=100, n=5.2):
+		rolling = RollingZScore(window=window, n=n)
+		self._steps.append(('rolling_z_score', rolling.window - 1, rolling.transform_array))
+		return self
+
+	# 按行(横截面)去极值, 同 CrossSectionFactor.extreme_MAD
+	def extreme_MAD(self, n=5.2):
+		self._steps.append(('extreme_MAD', 0, lambda arr: Factor._extreme_MAD_array(arr, n=n)))
+		return self
+
+	# 按行(横截面)标准化, 同 CrossSectionFactor.standardize_z
+	def standardize_z(self):
+		self._steps.append(('standardize_z', 0, CrossSectionFactor.standardize_array))
+		return self
+
+	@property
+	def index(self):
+		'''
+		return: DatetimeIndex, 结果的日期
+		'''
+		if self.dates is None:
+			return self.source_index
+		return self.source_index.union(self.dates)
+
+	def blocks(self):
+		'''
+		return: generator of (起始行号, 2-D ndarray), 按日期顺序逐块给出结果
+		'''
+		if self._align_at is None:
+			return self._process(self._source_blocks(), self._steps)
+		before, after = self._steps[:self._align_at], self._steps[self._align_at:]
+		first = self._first_valid(self._process(self._source_blocks(), before))
+		aligned = self._align(self._process(self._source_blocks(), before), first)
+		return self._process(aligned, after)
+
+	def run(self, path=None):
+		'''
+		path: 结果 Panel 的目录, 逐块写入; 为 None 时返回内存中的 DataFrame
+		return: Panel 或 DataFrame
+		'''
+		index = self.index
+		if path is None:
+			out = np.empty((len(index), len(self.columns)))
+			for start, block in self.blocks():
+				out[start:start + len(block)] = block
+			return pd.DataFrame(out, index=index, columns=self.columns)
+		panel = Panel.create(path, dates=index, assets=self.columns)
+		for start, block in self.blocks():
+			panel.write_rows(start, block)
+		panel.flush()
+		return panel
+
+	def _read(self, lo, hi):
+		if isinstance(self._values, pd.DataFrame):
+			return self._values.iloc[lo:hi].to_numpy(dtype=float)
+		return np.array(self._values[lo:hi], dtype=float)
+
+	def _source_blocks(self):
+		for lo in range(0, len(self.source_index), self.rows):
+			yield lo, self._read(lo, min(lo + self.rows, len(self.source_index)))
+
+	@staticmethod
+	def _process(blocks, steps):
+		'''
+		blocks: 按顺序的 (起始行号, 块)
+		每块前面接上上一块末尾 overlap 行的输入再依次计算各步骤, 只保留本块的结果.
+		第 i 步在第 r 行的结果只依赖输入的第 r - overlap_i .. r 行, 接上 sum(overlap_i) 行后本块的结果与一次计算全部历史相同
+		'''
+		overlap = sum(step[1] for step in steps)
+		tail = None
+		for start, block in blocks:
+			extended = block if tail is None else np.concatenate([tail, block])
+			out = extended
+			for _, _, func in steps:
+				out = func(out)
+			yield start, out[len(extended) - len(block):]
+			tail = extended[max(len(extended) - overlap, 0):] if overlap > 0 else None
+
+	def _align(self, blocks, first):
+		'''
+		blocks: 因子日期上按顺序的 (起始行号, 块)
+		first: 每列第一个有效值, 用于填充最前面的缺失
+		return: generator, 对齐后的日期上按顺序的 (起始行号, 块)
+		'''
+		index = self.index
+		source = index.get_indexer(self.source_index) # 因子日期在结果日期中的位置
+		carry = np.full(len(self.columns), np.nan) # 每列到上一块为止最后一个有效值
+		n = len(self.source_index)
+		for lo, block in blocks:
+			hi = lo + len(block)
+			u_lo = 0 if lo == 0 else source[lo]
+			u_hi = len(index) if hi >= n else source[hi]
+			for a in range(u_lo, u_hi, self.rows):
+				b = min(a + self.rows, u_hi)
+				inside = (source[lo:hi] >= a) & (source[lo:hi] < b)
+				out = np.full((b - a + 1, len(self.columns)), np.nan)
+				out[0] = carry
+				out[1 + source[lo:hi][inside] - a] = block[inside]
+				# 向前填充: 每列取到当前行为止最后一个有效值的位置
+				position = np.where(~np.isnan(out), np.arange(len(out))[:, None], 0)
+				out = np.take_along_axis(out, np.maximum.accumulate(position, axis=0), axis=0)
+				carry = out[-1]
+				out = out[1:]
+				yield a, np.where(np.isnan(out), first, out)
+
+	def _first_valid(self, blocks):
+		'''
+		return: 每列第一个有效值, 全部找到后不再读后面的块
+		'''
+		first = np.full(len(self.columns), np.nan)
+		missing = np.ones(len(self.columns), dtype=bool)
+		for _, block in blocks:
+			valid = ~np.isnan(block) & missing
+			found = valid.any(axis=0)
+			first[found] = block[valid.argmax(axis=0)[found], np.flatnonzero(found)]
+			missing &= ~found
+			if not missing.any():
+				break
+		return first
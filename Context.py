@@ -0,0 +1,139 @@
+import pandas as pd
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+logging.getLogger('context').addHandler(logging.NullHandler()) # 各 Context 的 logger 的上层, 没有配置日志时不输出
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)-9s - %(filename)-8s : %(lineno)s line - %(message)s" # -8表示占位符，让输出左对齐
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def configure_logging(log_dir='./log', filename='backtest.log', level=logging.INFO):
+	'''
+	单个脚本使用时的日志配置: 所有模块的日志写到 log_dir/filename, 每次运行重新写入.
+	导入模块时不再配置日志, 需要写日志文件的脚本自己调用一次.
+	'''
+	os.makedirs(log_dir, exist_ok=True)
+	logging.basicConfig(level=level, filename=os.path.join(log_dir, filename), filemode="w",
+						format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+
+class Context():
+	'''
+	一组回测(一个投资范围, 例如利率债、信用债)的运行上下文: 标的的日期序列和日志.
+	传给 Factor / BackTest 后, 因子按这里的日期对齐, 日志写到这个上下文自己的 logger, 不同上下文之间互不影响,
+	多个投资范围可以在同一进程的多个线程中同时计算. 没有传入 Context 时使用 Factor.set_date_format 的全局日期和模块的 logger.
+
+	logger 的名称为 context.<name>.<模块>, 设置 log_dir 时写到 log_dir/<name>.log, 否则交给上层的 logging 配置.
+	'''
+	def __init__(self, name='default', calendar=None, log_dir=None, level=logging.INFO):
+		self.name = name
+		self.calendar = None # 标的的日期序列, DatetimeIndex
+		if calendar is not None:
+			self.set_calendar(calendar)
+		self.logger = logging.getLogger(f'context.{name}')
+		self._handler = None
+		if log_dir is not None:
+			os.makedirs(log_dir, exist_ok=True)
+			self._handler = logging.FileHandler(os.path.join(log_dir, f'{name}.log'), mode='w', encoding='utf-8')
+			self._handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+			self.logger.addHandler(self._handler)
+			self.logger.setLevel(level)
+			self.logger.propagate = False
+
+	def set_calendar(self, li):
+		if not isinstance(li, (list, pd.DatetimeIndex)):
+			raise NameError('input date series is not list')
+		self.calendar = pd.DatetimeIndex(li)
+
+	def get_logger(self, module):
+		return self.logger.getChild(module)
+
+	def close(self):
+		if self._handler is not None:
+			self.logger.removeHandler(self._handler)
+			self._handler.close()
+			self._handler = None
+			self.logger.propagate = True # 之后的日志交给上层的 logging 配置
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class UniverseRunner():
+	'''
+	在线程池中同时回测多个投资范围, 每个投资范围有自己的 Context.
+	fast 引擎的收益计算、打分和选股都是 NumPy 的向量化计算, 计算时释放 GIL, 多个线程可以同时运行,
+	也不需要像多进程那样复制价格和因子数据; event 引擎逐日调用 Account, 主要是 Python 代码, 多线程的收益有限.
+
+		runner = UniverseRunner(log_dir='./log')
+		tests = runner.run({
+			'rates': {'underlying': df_rates, 'trade_date': weekly, 'df_factors': df_rate_sub},
+			'credit': {'underlying': df_credit, 'trade_date': weekly, 'calendar': credit_days,
+					   'df_factors': lambda context: build_credit_factors(context), 'number_of_longs': 2},
+		})
+	'''
+	# BackTest 构造函数的参数, 其余的键为数据
+	OPTIONS = ['init_cash', 'number_of_longs', 'number_of_groups', 'engine', 'ledger', 'profile', 'cache', 'rebalance']
+
+	def __init__(self, threads=None, log_dir=None):
+		'''
+		threads: 线程数, 默认为 CPU 个数
+		log_dir: 每个投资范围的日志写到 log_dir/<名称>.log, 为 None 时交给上层的 logging 配置
+		'''
+		self.threads = threads
+		self.log_dir = log_dir
+		self.errors = {} # 名称 -> 异常, 出错的投资范围不影响其他投资范围
+
+	def run(self, universes):
+		'''
+		universes: dict, 名称 -> dict
+			underlying, trade_date: BackTest 的价格和交易日
+			df_factors: 因子 DataFrame, 或者接收 Context 返回因子的函数(在各自的线程中用 Factor(..., context=context) 处理因子)
+			calendar: 标的的日期序列, 默认为 underlying 的日期
+			z_score: (window, n), 见 BackTest.set_factor_z_score
+			其他键为 BackTest 的参数, 见 OPTIONS
+		return: dict, 名称 -> 运行过 runTest 的 BackTest, 出错的投资范围不在其中, 异常见 errors
+		'''
+		self.errors = {}
+		lock = threading.Lock()
+
+		def task(item):
+			name, spec = item
+			try:
+				return name, self._run_one(name, spec)
+			except Exception as e:
+				logger.exception('universe %s failed', name)
+				with lock:
+					self.errors[name] = e
+				return name, None
+		with ThreadPoolExecutor(max_workers=self.threads or os.cpu_count()) as pool:
+			results = list(pool.map(task, universes.items()))
+		return {name: tester for name, tester in results if tester is not None}
+
+	def _run_one(self, name, spec):
+		# 只在运行时导入, 导入 Context (例如只用 configure_logging) 时不加载回测模块
+		from BackTest import BackTest
+
+		unknown = set(spec) - set(self.OPTIONS) - {'underlying', 'trade_date', 'df_factors', 'calendar', 'z_score'}
+		if len(unknown) > 0:
+			raise NameError(f'input error, unknown universe settings {sorted(unknown)}')
+		calendar = spec.get('calendar', spec['underlying'].index)
+		with Context(name, calendar=pd.DatetimeIndex(calendar), log_dir=self.log_dir) as context:
+			tester = BackTest(context=context, **{k: spec[k] for k in self.OPTIONS if k in spec})
+			if spec.get('z_score') is not None:
+				tester.set_factor_z_score(*spec['z_score'])
+			tester.underlying = spec['underlying']
+			tester.trade_date = list(spec['trade_date'])
+			df_factors = spec['df_factors']
+			tester.df_factors = df_factors(context) if callable(df_factors) else df_factors
+			tester.runTest()
+		return tester
@@ -0,0 +1,168 @@
+import pandas as pd
+import numpy as np
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+class DataStore():
+	'''
+	Wind 导出的 CSV / XLSX 数据的列式缓存.
+	源文件第一次读取后转成按列存放的 .npy 文件(加一个索引文件和 meta.json), 字符串等对象列存为 .json, 读取时不使用 pickle,
+	缓存键由源文件路径、修改时间、大小和读取参数决定, 源文件变化后自动重新生成.
+	之后的读取直接映射 .npy 文件, 只加载需要的列和日期区间.
+	'''
+	VERSION = 2 # 缓存格式版本, 格式变化时使旧缓存失效
+
+	def __init__(self, cache_dir='./cache'):
+		self.cache_dir = cache_dir
+
+	def read_csv(self, path, columns=None, start=None, end=None, date_index=False, **kwargs):
+		'''
+		path: csv 文件路径
+		columns: 需要读取的列, 默认全部
+		start, end: 日期区间(包含两端), 索引为日期时有效
+		date_index: 是否把索引转换成 datetime64[ns]
+		kwargs: 传给 pd.read_csv 的参数, 例如 index_col
+		'''
+		return self._load('csv', path, kwargs, date_index, columns, start, end)
+
+	def read_excel(self, path, sheet_name=0, columns=None, start=None, end=None, date_index=False, **kwargs):
+		'''
+		path: xlsx 文件路径, 多个 sheet 的文件每个 sheet 单独缓存
+		其余参数同 read_csv, kwargs 传给 pd.read_excel
+		'''
+		kwargs['sheet_name'] = sheet_name
+		return self._load('excel', path, kwargs, date_index, columns, start, end)
+
+	def cache_key(self, reader, path, kwargs, date_index):
+		stat = os.stat(path)
+		source = {'version': self.VERSION, 'reader': reader, 'path': os.path.abspath(path),
+				  'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'date_index': date_index,
+				  'kwargs': {k: repr(v) for k, v in sorted(kwargs.items())}}
+		return hashlib.sha1(json.dumps(source, sort_keys=True).encode('utf-8')).hexdigest()
+
+	def clear(self):
+		if os.path.exists(self.cache_dir):
+			shutil.rmtree(self.cache_dir)
+
+	def _load(self, reader, path, kwargs, date_index, columns, start, end):
+		if not os.path.exists(path):
+			raise NameError(f'input error, file {path} not exsist')
+		directory = os.path.join(self.cache_dir, self.cache_key(reader, path, kwargs, date_index))
+		if not os.path.exists(os.path.join(directory, 'meta.json')):
+			if reader == 'csv':
+				df = pd.read_csv(path, **kwargs)
+			else:
+				df = pd.read_excel(path, **kwargs)
+			if date_index:
+				df.index = pd.to_datetime(df.index).astype('datetime64[ns]')
+			self.write(directory, df)
+		return self.read(directory, columns=columns, start=start, end=end)
+
+	@staticmethod
+	def write(directory, df):
+		'''
+		把 DataFrame 按列写入 directory, 先写临时目录再改名, 并发写入时不会读到不完整的缓存
+		'''
+		parent = os.path.dirname(os.path.abspath(directory))
+		os.makedirs(parent, exist_ok=True)
+		tmp = tempfile.mkdtemp(dir=parent)
+		meta = {'index_name': df.index.name, 'index_dtype': str(df.index.dtype), 'columns': [], 'dtypes': []}
+		DataStore._save(tmp, 'index', df.index.to_numpy())
+		for i, name in enumerate(df.columns):
+			DataStore._save(tmp, f'c{i}', df.iloc[:, i].to_numpy())
+			meta['columns'].append(name)
+			meta['dtypes'].append(str(df.dtypes.iloc[i]))
+		with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+			json.dump(meta, f, ensure_ascii=False)
+		try:
+			os.rename(tmp, directory)
+		except OSError:
+			# 其他进程已经写好了同一份缓存
+			shutil.rmtree(tmp, ignore_errors=True)
+
+	@staticmethod
+	def read(directory, columns=None, start=None, end=None):
+		'''
+		从 directory 读取缓存, 只加载 columns 中的列和 [start, end] 区间的行
+		'''
+		with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+			meta = json.load(f)
+		index = DataStore._open(directory, 'index')
+		rows = slice(None)
+		if start is not None or end is not None:
+			if not np.issubdtype(index.dtype, np.datetime64):
+				raise NameError('date range read requires a date index, load with date_index=True')
+			lo = np.datetime64('NaT') if start is None else np.datetime64(pd.Timestamp(start), 'ns')
+			hi = np.datetime64('NaT') if end is None else np.datetime64(pd.Timestamp(end), 'ns')
+			if len(index) < 2 or (index[1:] >= index[:-1]).all():
+				# 有序的日期索引按二分查找切片
+				rows = slice(0 if start is None else np.searchsorted(index, lo, side='left'),
+							 len(index) if end is None else np.searchsorted(index, hi, side='right'))
+			else:
+				rows = np.ones(len(index), dtype=bool)
+				if start is not None:
+					rows &= index >= lo
+				if end is not None:
+					rows &= index <= hi
+
+		names = meta['columns']
+		if columns is None:
+			columns = names
+		missing = [c for c in columns if c not in names]
+		if len(missing) > 0:
+			raise KeyError(f'columns {missing} not in cache')
+		data = {}
+		for c in columns:
+			data[c] = np.array(DataStore._open(directory, f'c{names.index(c)}')[rows])
+		index = pd.Index(np.array(index[rows]), dtype=meta['index_dtype'], name=meta['index_name'])
+		df = pd.DataFrame(data, index=index, columns=list(columns))
+		# 字符串、带时区的日期等列还原写入时的类型
+		return df.astype({c: meta['dtypes'][names.index(c)] for c in columns})
+
+	@staticmethod
+	def _save(directory, name, values):
+		'''
+		数值和日期数组存为 .npy, 字符串等对象数组按元素存为 .json, 读取时不使用 pickle
+		'''
+		values = np.asarray(values)
+		if values.dtype.kind in 'biufcmM':
+			np.save(os.path.join(directory, f'{name}.npy'), values, allow_pickle=False)
+		else:
+			with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+				json.dump([DataStore._encode(v) for v in values], f, ensure_ascii=False)
+
+	@staticmethod
+	def _open(directory, name):
+		# 数值和日期列直接映射, 对象列从 json 还原
+		path = os.path.join(directory, f'{name}.npy')
+		if os.path.exists(path):
+			return np.load(path, mmap_mode='r', allow_pickle=False)
+		with open(os.path.join(directory, f'{name}.json'), encoding='utf-8') as f:
+			data = json.load(f)
+		values = np.empty(len(data), dtype=object)
+		values[:] = [DataStore._decode(v) for v in data]
+		return values
+
+	@staticmethod
+	def _encode(value):
+		'''
+		对象数组的元素: 字符串、数值、None 原样保存, 日期存为 {"timestamp": ISO 字符串}; 其他对象不能保存
+		'''
+		if isinstance(value, (pd.Timestamp, np.datetime64)) or value is pd.NaT:
+			return {'timestamp': None if pd.isna(value) else pd.Timestamp(value).isoformat()}
+		if isinstance(value, np.generic):
+			value = value.item()
+		if value is None or isinstance(value, (str, bool, int, float)):
+			return value
+		raise TypeError(f'cannot cache object of type {type(value).__name__}')
+
+	@staticmethod
+	def _decode(value):
+		if isinstance(value, dict):
+			return pd.NaT if value['timestamp'] is None else pd.Timestamp(value['timestamp'])
+		return value
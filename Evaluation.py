@@ -0,0 +1,247 @@
+import pandas as pd
+import numpy as np
+
+import warnings
+
+from Factor import Factor
+
+
+class Evaluation():
+	'''
+	批量的因子检验, 不做逐笔回测: 多个横截面因子(日期 x 标的)与标的价格一起,
+	在一次向量化计算中得到各持有期的 IC、Rank IC、IC 衰减和分组收益, 用于在完整的 BackTest 之前筛选大量候选因子.
+	所有 (因子, 日期) 的横截面按行堆叠成二维数组, 排名、相关系数和分组收益都按行批量计算, 不逐日调用 pandas;
+	因子按块处理, 每块的元素个数不超过 chunk, 控制内存.
+
+	持有期 h 以 underlying 的行数计: 日期 t 的远期收益为 价格[t + h] / 价格[t] - 1.
+	分组按因子升序, 第 1 组因子值最低; 与 BackTest 的约定一致(打分越低越好), long_short 为 第 1 组 - 第 quantiles 组.
+	'''
+	def __init__(self, underlying, factors, horizons=(1, 5, 20), quantiles=5, dates=None, min_assets=3, chunk=1 << 24):
+		'''
+		underlying: DataFrame (日期 x 标的) 或 Panel, 标的价格
+		factors: dict, 因子名称 -> DataFrame (日期 x 标的) 或 Panel; 也可以是列为 (因子, 标的) 的 DataFrame, 或单个因子的 DataFrame
+		horizons: 持有期
+		dates: 检验日期(例如调仓日), 默认为 underlying 的所有日期; 因子按日期和标的对齐, 不做填充
+		min_assets: 横截面有效标的少于该值的日期不计算
+		'''
+		underlying = Evaluation._as_frame(underlying)
+		if not isinstance(underlying, pd.DataFrame):
+			raise NameError('input error, please load underlying price [DataFrame or Panel]')
+		horizons = [int(h) for h in horizons]
+		if len(horizons) == 0 or min(horizons) < 1:
+			raise NameError('input error, horizons must be positive')
+		if quantiles < 2:
+			raise NameError('input error, quantiles must be at least 2')
+		self.underlying = underlying
+		self.factors = Evaluation._factor_dict(factors)
+		self.horizons = horizons
+		self.quantiles = int(quantiles)
+		self.min_assets = int(min_assets)
+		self.chunk = chunk
+		self.dates = underlying.index if dates is None else pd.DatetimeIndex(dates)
+		self._position = underlying.index.get_indexer(self.dates)
+		if (self._position < 0).any():
+			raise NameError('input error, evaluation dates must be in underlying dates')
+		self.ic = None # DataFrame, 日期 x (因子, 持有期)
+		self.rank_ic = None
+		self.quantile_returns = None # DataFrame, (因子, 持有期) x 分组, 各日期分组等权收益的平均
+
+	def forward_returns(self, horizon, lag=0):
+		'''
+		return: ndarray (检验日期 x 标的), 从检验日期后 lag 行开始持有 horizon 行的收益, 超出数据范围为 NaN
+		'''
+		prices = self.underlying.to_numpy(dtype=float)
+		start = self._position + lag
+		stop = start + horizon
+		out = np.full((len(self.dates), prices.shape[1]), np.nan)
+		inside = stop < len(prices)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			out[inside] = prices[stop[inside]] / prices[start[inside]] - 1
+		return out
+
+	def run(self):
+		'''
+		计算所有因子在各持有期的 IC、Rank IC 和分组收益
+		return: self
+		'''
+		names = list(self.factors)
+		returns = {h: self.forward_returns(h) for h in self.horizons}
+		ic, rank_ic, groups = {}, {}, {}
+		# 收益的排名与因子无关, 每个持有期只排一次
+		return_ranks = {h: Factor._rank_average(returns[h]) for h in self.horizons}
+		for block in self._blocks():
+			x = self._stack(block)
+			flat = x.reshape(-1, x.shape[-1])
+			rank_x = Factor._rank_average(flat) # 因子的排名与持有期无关, 每块只排一次
+			for h in self.horizons:
+				result = Evaluation.evaluate_array(flat, np.tile(returns[h], (len(block), 1)), self.quantiles, self.min_assets,
+												   rank_x=rank_x, rank_y=np.tile(return_ranks[h], (len(block), 1)))
+				for k, name in enumerate(block):
+					rows = slice(k*len(self.dates), (k + 1)*len(self.dates))
+					ic[(name, h)] = result['ic'][rows]
+					rank_ic[(name, h)] = result['rank_ic'][rows]
+					with warnings.catch_warnings():
+						warnings.simplefilter('ignore', category=RuntimeWarning) # 某一组在所有日期都没有标的
+						groups[(name, h)] = np.nanmean(result['quantile'][rows], axis=0)
+		columns = pd.MultiIndex.from_tuples([(name, h) for name in names for h in self.horizons], names=['factor', 'horizon'])
+		self.ic = pd.DataFrame({c: ic[c] for c in columns}, index=self.dates, columns=columns)
+		self.rank_ic = pd.DataFrame({c: rank_ic[c] for c in columns}, index=self.dates, columns=columns)
+		self.quantile_returns = pd.DataFrame([groups[c] for c in columns], index=columns,
+											 columns=pd.RangeIndex(1, self.quantiles + 1, name='quantile'))
+		self.quantile_returns['long_short'] = self.quantile_returns[1] - self.quantile_returns[self.quantiles]
+		return self
+
+	def summary(self):
+		'''
+		return: DataFrame, (因子, 持有期) x 指标
+			ic_mean, ic_std, icir (均值 / 标准差), ic_t (t 统计量), ic_positive (IC > 0 的比例), 以及同样的 rank_ic_* 指标,
+			long_short: 第 1 组与最后一组的平均收益差, dates: 有 IC 的日期个数
+		'''
+		if self.ic is None:
+			self.run()
+		result = {}
+		for prefix, ic in [('ic', self.ic), ('rank_ic', self.rank_ic)]:
+			arr = ic.to_numpy()
+			count = (~np.isnan(arr)).sum(axis=0)
+			with warnings.catch_warnings():
+				warnings.simplefilter('ignore', category=RuntimeWarning) # 没有 IC 的因子
+				mean = np.nanmean(arr, axis=0)
+				std = np.nanstd(arr, axis=0, ddof=1)
+				positive = np.nansum(arr > 0, axis=0) / count
+			with np.errstate(divide='ignore', invalid='ignore'):
+				result[f'{prefix}_mean'] = mean
+				result[f'{prefix}_std'] = std
+				result[f'{prefix}_ir'] = mean / std
+				result[f'{prefix}_t'] = mean / std * np.sqrt(count)
+				result[f'{prefix}_positive'] = positive
+			if prefix == 'ic':
+				result['dates'] = count
+		result = pd.DataFrame(result, index=self.ic.columns).rename(columns={'ic_ir': 'icir', 'rank_ic_ir': 'rank_icir'})
+		result['long_short'] = self.quantile_returns['long_short']
+		return result
+
+	def decay(self, lags=10, method='rank'):
+		'''
+		lags: 滞后期数
+		method: 'rank' 或 'pearson'
+		return: DataFrame (因子 x 滞后期), 因子与滞后 lag 行之后的单期收益的平均 IC, 反映因子预测能力随时间的衰减
+		'''
+		if method not in ('rank', 'pearson'):
+			raise NameError(f'method {method} error, please use rank or pearson')
+		key = 'rank_ic' if method == 'rank' else 'ic'
+		returns = [self.forward_returns(1, lag=lag) for lag in range(int(lags))]
+		return_ranks = [Factor._rank_average(r) for r in returns]
+		rows = {}
+		for block in self._blocks():
+			x = self._stack(block)
+			flat = x.reshape(-1, x.shape[-1])
+			rank_x = Factor._rank_average(flat)
+			means = np.empty((len(block), len(returns)))
+			for lag, r in enumerate(returns):
+				ic = Evaluation.evaluate_array(flat, np.tile(r, (len(block), 1)), min_assets=self.min_assets,
+											   rank_x=rank_x, rank_y=np.tile(return_ranks[lag], (len(block), 1)))[key]
+				with warnings.catch_warnings():
+					warnings.simplefilter('ignore', category=RuntimeWarning)
+					means[:, lag] = np.nanmean(ic.reshape(len(block), -1), axis=1)
+			rows.update(zip(block, means))
+		return pd.DataFrame([rows[name] for name in self.factors], index=pd.Index(list(self.factors), name='factor'),
+							columns=pd.RangeIndex(int(lags), name='lag'))
+
+	@staticmethod
+	def evaluate_array(x, y, quantiles=None, min_assets=3, rank_x=None, rank_y=None):
+		'''
+		x: 2-D ndarray, 每行一个横截面的因子值
+		y: 2-D ndarray, 同形状的远期收益
+		quantiles: 分组个数, 为 None 时不计算分组收益
+		rank_x, rank_y: 可选, x 和 y 各自按行的排名(Factor._rank_average), 用于多次调用时复用;
+			只有对方缺失而自身有值的行需要在共同的有效标的上重新排名
+		return: dict
+			ic, rank_ic: 每行的 Pearson 和 Spearman 相关系数, 两者都有效的标的少于 min_assets 个或方差为 0 时为 NaN
+			quantile: (行 x 分组) 每组远期收益的等权平均, 组内没有标的时为 NaN
+		'''
+		x = np.asarray(x, dtype=float)
+		y = np.asarray(y, dtype=float)
+		valid = ~np.isnan(x) & ~np.isnan(y)
+		n = valid.sum(axis=1)
+		rank_x = Evaluation._joint_rank(x, valid, n, rank_x)
+		rank_y = Evaluation._joint_rank(y, valid, n, rank_y)
+		result = {
+			'ic': Evaluation._correlation(x, y, valid, n, min_assets),
+			'rank_ic': Evaluation._correlation(rank_x, rank_y, valid, n, min_assets),
+		}
+		if quantiles is not None:
+			rows = x.shape[0]
+			with np.errstate(invalid='ignore'):
+				group = np.floor((rank_x - 1) * quantiles / n[:, None])
+			group = np.clip(np.where(valid, group, 0), 0, quantiles - 1).astype(np.int64)
+			index = (np.arange(rows)[:, None] * quantiles + group)[valid]
+			total = np.bincount(index, weights=y[valid], minlength=rows*quantiles).reshape(rows, quantiles)
+			count = np.bincount(index, minlength=rows*quantiles).reshape(rows, quantiles)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				mean = total / count
+			mean[n < min_assets] = np.nan
+			result['quantile'] = mean
+		return result
+
+	@staticmethod
+	def _joint_rank(arr, valid, n, rank=None):
+		'''
+		return: arr 在每行 valid 位置上的排名, 其他位置为 NaN
+		'''
+		if rank is None:
+			return Factor._rank_average(np.where(valid, arr, np.nan))
+		# 只有 valid 之外还有值且仍需计算的行排名会变化
+		redo = (~np.isnan(arr) & ~valid).any(axis=1) & (n > 0)
+		rank = np.where(valid, rank, np.nan)
+		if redo.any():
+			rank[redo] = Factor._rank_average(np.where(valid[redo], arr[redo], np.nan))
+		return rank
+
+	@staticmethod
+	def _correlation(x, y, valid, n, min_assets):
+		'''
+		按行计算 x 与 y 在 valid 位置上的相关系数
+		'''
+		with np.errstate(divide='ignore', invalid='ignore'):
+			dx = np.where(valid, x, 0.)
+			dy = np.where(valid, y, 0.)
+			dx = np.where(valid, dx - dx.sum(axis=1, keepdims=True) / n[:, None], 0.)
+			dy = np.where(valid, dy - dy.sum(axis=1, keepdims=True) / n[:, None], 0.)
+			r = (dx*dy).sum(axis=1) / np.sqrt((dx*dx).sum(axis=1) * (dy*dy).sum(axis=1))
+		r[(n < min_assets) | ~np.isfinite(r)] = np.nan
+		return r
+
+	def _blocks(self):
+		'''
+		按 chunk 把因子名称分块, 每块堆叠后的元素个数不超过 chunk (至少一个因子)
+		'''
+		names = list(self.factors)
+		size = max(1, self.chunk // max(len(self.dates) * self.underlying.shape[1], 1))
+		return [names[i:i + size] for i in range(0, len(names), size)]
+
+	def _stack(self, names):
+		'''
+		return: ndarray (因子 x 检验日期 x 标的), 因子对齐到检验日期和 underlying 的标的
+		'''
+		return np.stack([self.factors[name].reindex(index=self.dates, columns=self.underlying.columns).to_numpy(dtype=float)
+						 for name in names])
+
+	@staticmethod
+	def _as_frame(df):
+		# Panel 直接引用映射内存
+		if hasattr(df, 'to_frame') and not isinstance(df, (pd.DataFrame, pd.Series)):
+			return df.to_frame()
+		return df
+
+	@staticmethod
+	def _factor_dict(factors):
+		if isinstance(factors, dict):
+			factors = {name: Evaluation._as_frame(df) for name, df in factors.items()}
+		elif isinstance(factors, pd.DataFrame) and isinstance(factors.columns, pd.MultiIndex):
+			factors = {name: factors[name] for name in factors.columns.get_level_values(0).unique()}
+		elif isinstance(factors, pd.DataFrame) or hasattr(factors, 'to_frame'):
+			factors = {'factor': Evaluation._as_frame(factors)}
+		if not isinstance(factors, dict) or len(factors) == 0 or \
+				not all(isinstance(df, pd.DataFrame) for df in factors.values()):
+			raise NameError('input error, please load factors [dict of DataFrame or DataFrame]')
+		return factors
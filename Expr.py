@@ -0,0 +1,168 @@
+import pandas as pd
+import numpy as np
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from Rolling import RollingZScore
+
+
+class ExprCache():
+	'''
+	表达式结果的 LRU 缓存, 键为表达式的内容哈希, 最多保留 maxsize 个结果, 结果的总字节数不超过 max_bytes;
+	单个超过 max_bytes 的结果不缓存. 多个线程(例如 UniverseRunner 中的各个投资范围)共用 Expr.cache, 读写时加锁
+	'''
+	def __init__(self, maxsize=256, max_bytes=1 << 30):
+		self.maxsize = maxsize
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.nbytes = 0 # 缓存中结果的总字节数
+		self._data = OrderedDict() # 键 -> (结果, 字节数)
+		self._lock = threading.Lock()
+
+	def get(self, key, default=None):
+		with self._lock:
+			if key in self._data:
+				self._data.move_to_end(key)
+				self.hits += 1
+				return self._data[key][0]
+			self.misses += 1
+			return default
+
+	def put(self, key, value):
+		size = ExprCache._nbytes(value)
+		with self._lock:
+			if key in self._data:
+				self.nbytes -= self._data.pop(key)[1]
+			if size > self.max_bytes:
+				return
+			self._data[key] = (value, size)
+			self.nbytes += size
+			while len(self._data) > self.maxsize or self.nbytes > self.max_bytes:
+				self.nbytes -= self._data.popitem(last=False)[1][1]
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+			self.nbytes = 0
+			self.hits = 0
+			self.misses = 0
+
+	def __len__(self):
+		return len(self._data)
+
+	def __contains__(self, key):
+		return key in self._data
+
+	@staticmethod
+	def _nbytes(value):
+		'''
+		return: 结果(含索引)占用的字节数, 对象类型的元素按指针计算
+		'''
+		if isinstance(value, (pd.Series, pd.DataFrame)):
+			usage = value.memory_usage(index=True)
+			return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+		return int(getattr(value, 'nbytes', 0))
+
+
+_MISSING = object()
+
+
+class Expr():
+	'''
+	因子序列的惰性表达式. 每个操作返回新的节点而不修改原节点, 节点组成有向无环图, 调用 evaluate 时才计算.
+	节点的键由数据内容(叶子节点)或 操作名称 + 参数 + 输入节点的键 计算哈希, 内容相同的子表达式只计算一次,
+	结果放在 LRU 缓存 Expr.cache 中, 多个因子共用的预处理步骤(例如相同窗口的滚动 Zscore)直接复用.
+	'''
+	cache = ExprCache() # 默认的全局缓存
+
+	def __init__(self, op, inputs=(), params=None, func=None, data=None):
+		self.op = op
+		self.inputs = tuple(inputs)
+		self.params = dict(params or {})
+		self._func = func
+		self._data = data
+		self.key = self._hash()
+
+	@staticmethod
+	def source(series):
+		'''
+		series: pd.Series, 叶子节点直接引用该序列, 按内容计算哈希
+		'''
+		if not isinstance(series, pd.Series):
+			raise NameError('input series error, please load time series')
+		return Expr('source', data=series)
+
+	def apply(self, op, func, **params):
+		'''
+		op: 操作名称, 与 params 一起决定节点的键, 同名操作的 func 必须只依赖 params
+		func: 输入序列 -> 输出序列, 不能修改输入
+		'''
+		return Expr(op, [self], params, func=func)
+
+	def shift(self, window=1):
+		return self.apply('shift', lambda s: s.shift(window), window=window)
+
+	def rolling_z_score(self, window=100, n=5.2):
+		return self.apply('rolling_z_score', lambda s: RollingZScore(window=window, n=n).transform(s), window=window, n=n)
+
+	def align(self, dates):
+		'''
+		dates: 交易日序列, 结果的日期为 dates 与因子日期的并集
+		'''
+		dates = pd.DatetimeIndex(dates)
+		digest = Expr._digest(pd.util.hash_pandas_object(dates.to_series(), index=False).to_numpy())
+		return self.apply('align', lambda s: s.reindex(dates.union(s.index)), dates=digest)
+
+	def ffill(self):
+		return self.apply('ffill', lambda s: s.ffill())
+
+	def bfill(self):
+		return self.apply('bfill', lambda s: s.bfill())
+
+	def rename(self, name):
+		return self.apply('rename', lambda s: s.rename(name), name=name)
+
+	def evaluate(self, cache=None):
+		'''
+		cache: ExprCache, 默认为 Expr.cache
+		return: 计算结果, 可能是缓存中的对象, 不要原地修改
+		'''
+		return self._evaluate(Expr.cache if cache is None else cache, {})
+
+	def _evaluate(self, cache, memo):
+		value = memo.get(self.key, _MISSING)
+		if value is not _MISSING:
+			return value
+		if self.op == 'source':
+			value = self._data
+		else:
+			value = cache.get(self.key, _MISSING)
+			if value is _MISSING:
+				value = self._func(*[node._evaluate(cache, memo) for node in self.inputs])
+				cache.put(self.key, value)
+		memo[self.key] = value
+		return value
+
+	def _hash(self):
+		if self.op == 'source':
+			s = self._data
+			content = pd.util.hash_pandas_object(s, index=True).to_numpy()
+			return Expr._digest(content, repr((s.name, str(s.dtype))).encode('utf-8'))
+		text = repr((self.op, sorted(self.params.items()), [node.key for node in self.inputs]))
+		return Expr._digest(text.encode('utf-8'))
+
+	@staticmethod
+	def _digest(*parts):
+		h = hashlib.sha1()
+		for part in parts:
+			h.update(part.tobytes() if isinstance(part, np.ndarray) else part)
+		return h.hexdigest()
+
+	def __repr__(self):
+		if self.op == 'source':
+			return f'source({self._data.name})'
+		args = ', '.join([repr(node) for node in self.inputs] + [f'{k}={v}' for k, v in self.params.items()])
+		return f'{self.op}({args})'
@@ -1,30 +1,38 @@
 import pandas as pd 
+import numpy as np
+from Expr import Expr
+from Seasonal import SeasonalAdjust
 
-import logging
-import os 
+import warnings
 
-log_file_name = "./log/factor.log"
-if not os.path.exists('log'):
-	os.mkdir('log')
-
-logging.basicConfig(level=logging.INFO, #设置日志输出格式
-                    filename=log_file_name, #log日志输出的文件位置和文件名
-                    filemode="w", #文件的写入格式，w为重新写入文件，默认是追加
-                    format="%(asctime)s - %(name)s - %(levelname)-9s - %(filename)-8s : %(lineno)s line - %(message)s", 
-                    # 日志输出的格式,-8表示占位符，让输出左对齐，输出长度都为8位
-                    datefmt="%Y-%m-%d %H:%M:%S", #时间输出的格式
-                    )
 
 class Factor():
 	_underlying_date = None # 投资标的的日期序列
 
-	def __init__(self, df_series, name=None):
+	def __init__(self, df_series, name=None, copy=True, context=None):
+		'''
+		copy: 为 False 时直接引用输入序列的数据(例如内存映射面板的一列), 不复制
+		context: Context, get_factor 按其中的日期对齐; 为 None 时使用 set_date_format 设置的全局日期
+		因子的各项操作只构建惰性表达式 self.expr (见 Expr), 调用 get_factor 或读取 fac_series 时才计算
+		'''
 		if not isinstance(df_series, pd.Series):
 			raise NameError('input series error, please load time series')
-		df = df_series.copy()
+		if copy:
+			df = df_series.copy()
+		else:
+			df = pd.Series(df_series.to_numpy(), index=df_series.index, name=df_series.name, copy=False)
 		if name != None:
 			df.name = name
-		self.fac_series = df
+		self.expr = Expr.source(df)
+		self.context = context
+
+	@property
+	def fac_series(self):
+		return self.expr.evaluate().copy()
+
+	@fac_series.setter
+	def fac_series(self, df_series):
+		self.expr = Expr.source(df_series)
 
 	@classmethod
 	def set_date_format(cls, li):
@@ -35,62 +43,110 @@ class Factor():
 	def set_factor_name(self, name):
 		if not isinstance(name, str):
 			raise NameError('input name is not str')
-		self.fac_series.name = name
+		self.expr = self.expr.rename(name)
 
 	# 设置日期延迟，避免使用未来数据
 	def set_delay(self, window=1):
-		self.fac_series = self.fac_series.shift(window)
+		self.expr = self.expr.shift(window)
 
-	# 返回因子时间序列
+	# 返回因子时间序列, 可以重复调用, 不改变因子本身
 	def get_factor(self):
-		if self._underlying_date is None:
+		if self.context is not None and self.context.calendar is not None:
+			dates = self.context.calendar
+		elif self._underlying_date is not None:
+			dates = self._underlying_date.index
+		else:
 			raise KeyError('underlying date not defined, set date format first')
-		self.fac_series = pd.concat([self._underlying_date, self.fac_series], axis=1)
-		self.fac_series.fillna(method='ffill', inplace=True)
-		self.fac_series.fillna(method='bfill', inplace=True)
+		return self.expr.align(dates).ffill().bfill().evaluate().to_frame()
 
-		return self.fac_series
+	# 去极值
+	def winsorize(self, n=5.2):
+		self.expr = self.expr.apply('winsorize', lambda s: Factor.extreme_MAD(s, n=n), n=n)
 
 	# 计算Zscore
-	def calculate_rolling_z_score(self, window=100):
-		self.fac_series = self.fac_series.rolling(window=window).apply(lambda df: z_score(df))
+	def calculate_rolling_z_score(self, window=100, n=5.2):
+		self.expr = self.expr.rolling_z_score(window=window, n=n)
 
-	# 季度调整
-	def calculate_seasonal(self, period=365):
-		raise NotImplementedError
+	# 季度调整, 按因子自身的日期计算(不规则的交易日也适用), 之后再由 get_factor 对齐到标的日期, 见 SeasonalAdjust
+	def calculate_seasonal(self, period=365, buckets=4):
+		self.expr = self.expr.apply('seasonal', lambda s: SeasonalAdjust(period=period, buckets=buckets).transform(s),
+									period=period, buckets=buckets)
 
 	@staticmethod
-	def extreme_MAD(dfall, n=5.2): # 去极值，但极端值之间仍保持有序
-	    if not isinstance(dfall, pd.Series):
-	    	raise NameError('input must be times seires object')
-	    def extreme_MAD_series(df, n=5.2):
-	        assert isinstance(df, pd.Series)
-	        median = df.quantile(0.5)
-	        new_median = (abs((df - median)).quantile(0.5))
-	        up = median + n*new_median
-	        down = median - n*new_median
-	        abnormal_up_index = []
-	        abnormal_down_index = []
-	        li = df.values.ravel()
-	        for i in range(len(li)):
-	            di = li[i]
-	            if di <= down:
-	                abnormal_down_index.append(i)
-	            if di >= up:
-	                abnormal_up_index.append(i)
-	        if len(abnormal_down_index)>0:
-	            rank_abnomal = pd.Series([li[i] for i in abnormal_down_index])
-	            rank_abnomal = rank_abnomal.rank(ascending=False) # 降序
-	            for i in range(len(abnormal_down_index)):
-	                li[abnormal_down_index[i]] = down - new_median*(1./rank_abnomal.size)*rank_abnomal[i]
-	        if len(abnormal_up_index)>0:
-	            rank_abnomal = pd.Series([li[i] for i in abnormal_up_index])
-	            rank_abnomal = rank_abnomal.rank(ascending=True) # 降序
-	            for i in range(len(abnormal_up_index)):
-	                li[abnormal_up_index[i]] = up + new_median*(1./rank_abnomal.size)*rank_abnomal[i]
-	        return pd.Series(li).rename(df.name)
-
-	    return extreme_MAD_series(dfall,n=n)
+	def extreme_MAD(dfall, n=5.2, axis=0): # 去极值，但极端值之间仍保持有序
+		'''
+		dfall: Series, 或 DataFrame (日期 x 标的)
+		n: 中位数绝对偏差(MAD)的倍数
+		axis: DataFrame 时, 0 对每一列(时间序列)去极值, 1 对每一行(横截面)去极值
+		超过上下界的极端值按大小顺序重新排布在 [界限, 界限 +/- MAD] 之间
+		'''
+		if isinstance(dfall, pd.Series):
+			values = Factor._extreme_MAD_array(dfall.to_numpy(dtype=float)[None, :], n=n)
+			return pd.Series(values[0], index=dfall.index, name=dfall.name)
+		if isinstance(dfall, pd.DataFrame):
+			if axis not in [0, 1, 'index', 'columns']:
+				raise NameError(f'axis {axis} error, please input 0 or 1')
+			by_column = axis in [0, 'index']
+			arr = dfall.to_numpy(dtype=float)
+			values = Factor._extreme_MAD_array(arr.T if by_column else arr, n=n)
+			return pd.DataFrame(values.T if by_column else values, index=dfall.index, columns=dfall.columns)
+		raise NameError('input must be times seires or DataFrame object')
+
+	@staticmethod
+	def _extreme_MAD_array(arr, n=5.2):
+		'''
+		arr: 2-D ndarray, 对每一行去极值, NaN 不参与计算且原样返回
+		'''
+		arr = np.array(arr, dtype=float, ndmin=2)
+		valid = ~np.isnan(arr)
+		n_valid = valid.sum(axis=1, keepdims=True)
+		out = arr.copy()
+		if arr.size == 0:
+			return out
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore', category=RuntimeWarning) # 全为 NaN 的行
+			median = np.nanmedian(arr, axis=1, keepdims=True)
+			new_median = np.nanmedian(np.abs(arr - median), axis=1, keepdims=True)
+		up = median + n*new_median
+		down = median - n*new_median
+		mask_down = arr <= down
+		mask_up = arr >= up
+		count_down = mask_down.sum(axis=1, keepdims=True)
+		count_up = mask_up.sum(axis=1, keepdims=True)
+
+		# 整行的平均排名(升序, 从1开始). 下侧极端值恰为最小的 count_down 个值, 上侧极端值恰为最大的 count_up 个值
+		rank = Factor._rank_average(arr)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			rank_down = count_down + 1 - rank # 降序
+			rank_up = rank - (n_valid - count_up) # 升序
+			value_down = down - new_median*(1./count_down)*rank_down
+			value_up = up + new_median*(1./count_up)*rank_up
+		out = np.where(mask_down, value_down, out)
+		out = np.where(mask_up, value_up, out)
+		# MAD 为零时上下界重合, 所有值都是极端值, 全部压缩到中位数
+		out = np.where((new_median == 0) & valid, median, out)
+		return out
+
+	@staticmethod
+	def _rank_average(arr):
+		'''
+		arr: 2-D ndarray, 按行升序排名, 相同值取平均排名(同 pd.Series.rank), NaN 的排名为 NaN
+		'''
+		arr = np.asarray(arr, dtype=float)
+		cols = arr.shape[1]
+		order = np.argsort(arr, axis=1, kind='stable')
+		sorted_arr = np.take_along_axis(arr, order, axis=1)
+		position = np.broadcast_to(np.arange(cols), arr.shape)
+		group_start = np.ones(arr.shape, dtype=bool)
+		group_start[:, 1:] = sorted_arr[:, 1:] != sorted_arr[:, :-1]
+		group_end = np.ones(arr.shape, dtype=bool)
+		group_end[:, :-1] = group_start[:, 1:]
+		first = np.maximum.accumulate(np.where(group_start, position, 0), axis=1)
+		last = np.minimum.accumulate(np.where(group_end, position, cols - 1)[:, ::-1], axis=1)[:, ::-1]
+		rank = np.empty(arr.shape, dtype=float)
+		np.put_along_axis(rank, order, (first + last) / 2. + 1, axis=1)
+		rank[np.isnan(arr)] = np.nan
+		return rank
 
 	@staticmethod
 	def standardize_z(df):
@@ -105,6 +161,144 @@ class Factor():
 		if not isinstance(df_in, pd.Series):
 			raise NameError('input must be times seires object')
 		df = df_in.copy()
-		df_temp = standardize_z(extreme_MAD(df, 5.2))
+		df_temp = Factor.standardize_z(Factor.extreme_MAD(df, 5.2))
 		return df_temp.iloc[-1]
 
+
+
+class CrossSectionFactor():
+	'''
+	横截面因子面板(日期 x 标的), 对每个日期做 去极值 -> 标准化 -> 中性化(市值, 行业).
+	所有日期在一次向量化计算中完成, 中性化对每个日期的回归按批量的正规方程求解.
+	'''
+	def __init__(self, df, name=None, copy=True):
+		'''
+		df: DataFrame (日期 x 标的) 或 Panel
+		copy: 为 False 时直接引用输入数据, 处理结果总是新的数组
+		'''
+		if hasattr(df, 'to_frame') and not isinstance(df, (pd.DataFrame, pd.Series)):
+			df = df.to_frame()
+		if not isinstance(df, pd.DataFrame):
+			raise NameError('input error, please load factor panel [DataFrame or Panel]')
+		self.fac_panel = df.copy() if copy else df
+		self.name = name
+
+	def extreme_MAD(self, n=5.2):
+		self.fac_panel = Factor.extreme_MAD(self.fac_panel, n=n, axis=1)
+		return self
+
+	def standardize_z(self):
+		self.fac_panel = CrossSectionFactor._wrap(self.fac_panel, CrossSectionFactor.standardize_array(self.fac_panel.to_numpy(dtype=float)))
+		return self
+
+	def neutralize(self, size=None, industry=None, exposures=None, log_size=True):
+		'''
+		size: DataFrame (日期 x 标的), 市值, 默认取对数后作为暴露
+		industry: DataFrame (日期 x 标的) 或 Series (标的 -> 行业), 行业分类, 转成哑变量
+		exposures: dict, 名称 -> DataFrame (日期 x 标的), 其他数值型暴露
+		每个日期用因子值对暴露做最小二乘回归, 因子替换为残差; 因子或任一暴露缺失的标的不参与回归, 结果为 NaN
+		'''
+		numeric = []
+		if size is not None:
+			size = self._align(size).to_numpy(dtype=float)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				numeric.append(np.log(size) if log_size else size)
+		for value in (exposures or {}).values():
+			numeric.append(self._align(value).to_numpy(dtype=float))
+		codes = None
+		if industry is not None:
+			if isinstance(industry, pd.Series):
+				# 行业不随时间变化, 每个日期共用一行编码
+				codes, _ = pd.factorize(industry.reindex(self.fac_panel.columns).to_numpy())
+				codes = np.broadcast_to(codes, self.fac_panel.shape)
+			else:
+				codes, _ = pd.factorize(self._align(industry).to_numpy().ravel())
+				codes = codes.reshape(self.fac_panel.shape)
+		residual = CrossSectionFactor.neutralize_array(self.fac_panel.to_numpy(dtype=float), numeric, codes)
+		self.fac_panel = CrossSectionFactor._wrap(self.fac_panel, residual)
+		return self
+
+	def process(self, n=5.2, size=None, industry=None, exposures=None):
+		'''
+		去极值 -> 标准化 -> 中性化, 没有给出 size / industry / exposures 时不做中性化
+		'''
+		self.extreme_MAD(n=n).standardize_z()
+		if size is not None or industry is not None or exposures:
+			self.neutralize(size=size, industry=industry, exposures=exposures)
+		return self
+
+	def get_factor(self):
+		return self.fac_panel
+
+	@staticmethod
+	def standardize_array(arr):
+		'''
+		arr: 2-D ndarray, 按行(横截面)标准化, 标准差为 0 的行只去均值
+		'''
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore', category=RuntimeWarning) # 全为 NaN 或只有一个值的行
+			mean = np.nanmean(arr, axis=1, keepdims=True)
+			std = np.nanstd(arr, axis=1, ddof=1, keepdims=True)
+		std = np.where((std == 0) | np.isnan(std), 1., std)
+		return (arr - mean) / std
+
+	@staticmethod
+	def neutralize_array(y, numeric=(), codes=None, chunk=1 << 24):
+		'''
+		y: ndarray (日期 x 标的), 被解释变量
+		numeric: list of ndarray (日期 x 标的), 数值型暴露
+		codes: int ndarray (日期 x 标的), 行业编码, -1 为缺失; 为 None 时回归只加常数项
+		chunk: 每批数值暴露张量的元素个数上限, 控制内存
+		return: 残差, 不参与回归的位置为 NaN
+		对每个日期 t 求解正规方程 (X_t' X_t) b_t = X_t' y_t, 按日期分批堆叠成 (批量 x K x K) 的矩阵一起求伪逆.
+		行业哑变量不展开成稠密矩阵: X'X 中哑变量对应的块是各行业的个数和暴露之和, 用 bincount 直接累加.
+		某个日期缺少行业时矩阵奇异, 伪逆给出最小范数解, 残差不受影响
+		'''
+		y = np.asarray(y, dtype=float)
+		T, N = y.shape
+		valid = ~np.isnan(y)
+		for x in numeric:
+			valid &= np.isfinite(x)
+		if codes is None:
+			codes = np.zeros((T, N), dtype=np.int64) # 常数项相当于只有一个行业
+		else:
+			valid &= codes >= 0
+		G = int(codes.max()) + 1 if codes.size > 0 else 1
+		P = len(numeric)
+		out = np.full((T, N), np.nan)
+		step = max(1, chunk // max(N*(P + 1), 1))
+		for start in range(0, T, step):
+			rows = slice(start, min(start + step, T))
+			mask = valid[rows]
+			t = mask.shape[0]
+			code = np.where(mask, codes[rows], 0)
+			flat = (np.arange(t)[:, None]*G + code).ravel()
+			Z = np.stack([np.where(mask, x[rows], 0.) for x in numeric], axis=2) if P > 0 else np.zeros((t, N, 0))
+			target = np.where(mask, y[rows], 0.)
+
+			def by_group(weights):
+				return np.bincount(flat, weights=weights.ravel(), minlength=t*G).reshape(t, G)
+
+			XtX = np.zeros((t, G + P, G + P))
+			Xty = np.zeros((t, G + P))
+			XtX[:, np.arange(G), np.arange(G)] = by_group(mask.astype(float))
+			for p in range(P):
+				XtX[:, :G, G + p] = XtX[:, G + p, :G] = by_group(Z[:, :, p])
+			XtX[:, G:, G:] = np.einsum('tnp,tnq->tpq', Z, Z)
+			Xty[:, :G] = by_group(target)
+			Xty[:, G:] = np.einsum('tnp,tn->tp', Z, target)
+			beta = (np.linalg.pinv(XtX, hermitian=True) @ Xty[:, :, None])[:, :, 0]
+			fitted = np.take_along_axis(beta[:, :G], code, axis=1) + np.einsum('tnp,tp->tn', Z, beta[:, G:])
+			out[rows] = np.where(mask, target - fitted, np.nan)
+		return out
+
+	def _align(self, df):
+		if hasattr(df, 'to_frame') and not isinstance(df, (pd.DataFrame, pd.Series)):
+			df = df.to_frame()
+		if not isinstance(df, pd.DataFrame):
+			raise NameError('input error, please load exposure panel [DataFrame]')
+		return df.reindex(index=self.fac_panel.index, columns=self.fac_panel.columns)
+
+	@staticmethod
+	def _wrap(df, values):
+		return pd.DataFrame(values, index=df.index, columns=df.columns)
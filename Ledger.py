@@ -0,0 +1,158 @@
+import pandas as pd
+import numpy as np
+
+
+class Ledger():
+	'''
+	列式的交易流水和每日资产快照.
+	成交和快照追加到预分配的 numpy 结构化数组中, 容量不足时成倍扩容;
+	标的和策略名称以整数编码保存, 运行结束后可转成 DataFrame 查询或导出为 Parquet/Feather.
+	'''
+	FILL_DTYPE = np.dtype([('date', 'datetime64[ns]'), ('leg', np.int32), ('asset', np.int32),
+						   ('shares', np.float64), ('price', np.float64), ('money', np.float64), ('cost', np.float64),
+						   ('cash', np.float64)])
+	SNAPSHOT_DTYPE = np.dtype([('date', 'datetime64[ns]'), ('leg', np.int32),
+							   ('cash', np.float64), ('total_asset', np.float64)])
+
+	def __init__(self, capacity=1024):
+		self._fills = np.zeros(capacity, dtype=self.FILL_DTYPE)
+		self._snapshots = np.zeros(capacity, dtype=self.SNAPSHOT_DTYPE)
+		self._n_fills = 0
+		self._n_snapshots = 0
+		self._assets = [] # 标的名称, 下标即编码
+		self._asset_code = {}
+		self._legs = [] # 策略名称, 下标即编码
+		self._leg_code = {}
+		self._date = np.datetime64('NaT', 'ns')
+		self._leg = self.leg_code('')
+
+	def set_date(self, date):
+		self._date = np.datetime64(pd.Timestamp(date), 'ns')
+
+	def set_leg(self, name):
+		self._leg = self.leg_code(name)
+
+	def asset_code(self, name):
+		code = self._asset_code.get(name)
+		if code is None:
+			code = self._asset_code[name] = len(self._assets)
+			self._assets.append(name)
+		return code
+
+	def leg_code(self, name):
+		code = self._leg_code.get(name)
+		if code is None:
+			code = self._leg_code[name] = len(self._legs)
+			self._legs.append(name)
+		return code
+
+	def record_fill(self, stock_name, shares, price, money, cash, cost=0.):
+		'''
+		shares, money: 买入为正, 卖出为负; cost: 交易成本; cash: 成交并支付成本后的现金
+		'''
+		if self._n_fills == len(self._fills):
+			self._fills = self._grow(self._fills, self._n_fills + 1)
+		self._fills[self._n_fills] = (self._date, self._leg, self.asset_code(stock_name), shares, price, money, cost, cash)
+		self._n_fills += 1
+
+	def record_fills(self, stock_names, shares, prices, money, cash, cost=0.):
+		'''
+		批量记录同一时刻的多笔成交, cash 为每笔成交后的现金
+		'''
+		n = len(stock_names)
+		if self._n_fills + n > len(self._fills):
+			self._fills = self._grow(self._fills, self._n_fills + n)
+		block = self._fills[self._n_fills:self._n_fills + n]
+		block['date'] = self._date
+		block['leg'] = self._leg
+		block['asset'] = [self.asset_code(s) for s in stock_names]
+		block['shares'] = shares
+		block['price'] = prices
+		block['money'] = money
+		block['cost'] = cost
+		block['cash'] = cash
+		self._n_fills += n
+
+	def record_snapshot(self, cash, total_asset):
+		if self._n_snapshots == len(self._snapshots):
+			self._snapshots = self._grow(self._snapshots, self._n_snapshots + 1)
+		self._snapshots[self._n_snapshots] = (self._date, self._leg, cash, total_asset)
+		self._n_snapshots += 1
+
+	def record_snapshots(self, dates, leg, cash, total_asset):
+		'''
+		批量记录一个策略多个日期的快照
+		'''
+		n = len(dates)
+		if self._n_snapshots + n > len(self._snapshots):
+			self._snapshots = self._grow(self._snapshots, self._n_snapshots + n)
+		block = self._snapshots[self._n_snapshots:self._n_snapshots + n]
+		block['date'] = pd.DatetimeIndex(dates).to_numpy(dtype='datetime64[ns]')
+		block['leg'] = self.leg_code(leg)
+		block['cash'] = cash
+		block['total_asset'] = total_asset
+		self._n_snapshots += n
+
+	@property
+	def fills(self):
+		return self._fills[:self._n_fills]
+
+	@property
+	def snapshots(self):
+		return self._snapshots[:self._n_snapshots]
+
+	def clear(self):
+		self._n_fills = 0
+		self._n_snapshots = 0
+
+	def to_frame(self, kind='fills'):
+		'''
+		kind: 'fills' 成交流水, 'snapshots' 每日快照
+		return: DataFrame, 标的和策略名称为 category 类型
+		'''
+		return self._to_frame(self._records(kind))
+
+	def query(self, kind='fills', stock_name=None, leg=None, start=None, end=None):
+		'''
+		按标的、策略和日期区间筛选, 先在编码上过滤, 只把选中的记录转成 DataFrame
+		'''
+		data = self._records(kind)
+		mask = np.ones(len(data), dtype=bool)
+		if stock_name is not None:
+			mask &= data['asset'] == self._asset_code.get(stock_name, -1)
+		if leg is not None:
+			mask &= data['leg'] == self._leg_code.get(leg, -1)
+		if start is not None:
+			mask &= data['date'] >= np.datetime64(pd.Timestamp(start), 'ns')
+		if end is not None:
+			mask &= data['date'] <= np.datetime64(pd.Timestamp(end), 'ns')
+		return self._to_frame(data[mask])
+
+	def _records(self, kind):
+		if kind == 'fills':
+			return self.fills
+		if kind == 'snapshots':
+			return self.snapshots
+		raise NameError(f'ledger kind {kind} error, please use fills or snapshots')
+
+	def _to_frame(self, data):
+		df = pd.DataFrame({name: data[name] for name in data.dtype.names})
+		df['leg'] = pd.Categorical.from_codes(df['leg'], categories=pd.Index(self._legs, dtype=object))
+		if 'asset' in df.columns:
+			df['asset'] = pd.Categorical.from_codes(df['asset'], categories=pd.Index(self._assets, dtype=object))
+		return df
+
+	def to_parquet(self, path, kind='fills'):
+		# 需要安装 pyarrow 或 fastparquet
+		self.to_frame(kind).to_parquet(path)
+
+	def to_feather(self, path, kind='fills'):
+		# 需要安装 pyarrow
+		self.to_frame(kind).to_feather(path)
+
+	@staticmethod
+	def _grow(data, need):
+		capacity = max(need, 2*len(data), 1)
+		grown = np.zeros(capacity, dtype=data.dtype)
+		grown[:len(data)] = data
+		return grown
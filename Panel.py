@@ -0,0 +1,95 @@
+import pandas as pd
+import numpy as np
+
+import json
+import os
+
+
+class Panel():
+	'''
+	存放在磁盘上的内存映射面板(日期 x 标的), 用于放不进内存的全市场价格和因子.
+	目录下 values.npy 为 float64 数组, dates.npy 为日期索引, 标的索引按原来的标签和类型存在 meta.json 中.
+	to_frame 返回直接引用映射内存的 DataFrame, 多个进程打开同一个目录时共享同一份页缓存.
+	'''
+	def __init__(self, path, values, dates, assets):
+		self.path = path
+		self.values = values # np.memmap (或共享内存上的 ndarray), 日期 x 标的
+		self.dates = dates # DatetimeIndex
+		self.assets = assets # Index
+
+	@staticmethod
+	def create(path, df=None, dates=None, assets=None, fill=np.nan):
+		'''
+		path: 面板目录
+		df: 用 DataFrame 的数据创建面板; 为 None 时按 dates 和 assets 创建空面板, 之后分块写入
+		'''
+		if df is not None:
+			if not isinstance(df, pd.DataFrame):
+				raise NameError('input error, please load panel [DataFrame]')
+			dates, assets = df.index, df.columns
+		if dates is None or assets is None:
+			raise NameError('input error, please set panel dates and assets')
+		dates = pd.DatetimeIndex(dates)
+		assets = pd.Index(assets)
+		labels = assets.tolist()
+		if not all(isinstance(a, (str, int, float)) for a in labels):
+			raise NameError('input error, panel asset labels must be str or numbers')
+		os.makedirs(path, exist_ok=True)
+		values = np.lib.format.open_memmap(os.path.join(path, 'values.npy'), mode='w+',
+										   dtype=np.float64, shape=(len(dates), len(assets)))
+		if df is not None:
+			# 按块写入, 避免一次性生成整块的临时数组
+			step = max(1, (1 << 24) // max(len(assets), 1))
+			for start in range(0, len(dates), step):
+				values[start:start + step] = df.iloc[start:start + step].to_numpy(dtype=np.float64)
+		else:
+			values[:] = fill
+		values.flush()
+		np.save(os.path.join(path, 'dates.npy'), dates.to_numpy(dtype='datetime64[ns]'))
+		with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+			json.dump({'shape': [len(dates), len(assets)], 'assets': labels, 'assets_dtype': str(assets.dtype)}, f,
+					  ensure_ascii=False)
+		return Panel(path, values, dates, assets)
+
+	@staticmethod
+	def open(path, mode='r'):
+		'''
+		mode: 'r' 只读, 'r+' 可写
+		'''
+		if not os.path.exists(os.path.join(path, 'meta.json')):
+			raise NameError(f'input error, panel {path} not exsist')
+		with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+			meta = json.load(f)
+		values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mode)
+		dates = pd.DatetimeIndex(np.load(os.path.join(path, 'dates.npy')))
+		assets = pd.Index(meta['assets'], dtype=meta['assets_dtype'])
+		return Panel(path, values, dates, assets)
+
+	@property
+	def shape(self):
+		return self.values.shape
+
+	def to_frame(self):
+		'''
+		return: DataFrame, 直接引用映射内存, 不复制数据
+		'''
+		return pd.DataFrame(self.values, index=self.dates, columns=self.assets, copy=False)
+
+	def rows(self, start=None, end=None):
+		'''
+		return: Panel, [start, end] 日期区间的视图(包含两端), 不复制数据
+		'''
+		lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+		hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+		return Panel(self.path, self.values[lo:hi], self.dates[lo:hi], self.assets)
+
+	def write_rows(self, start, block):
+		'''
+		start: 起始行号
+		block: 二维数组, 写入 [start, start + len(block)) 行
+		'''
+		self.values[start:start + len(block)] = block
+
+	def flush(self):
+		if isinstance(self.values, np.memmap):
+			self.values.flush()
@@ -0,0 +1,126 @@
+import pandas as pd
+
+import contextlib
+import logging
+import threading
+import time
+import tracemalloc
+
+
+class Profiler():
+	'''
+	回测的分阶段计时和热点计数器, 默认不启用.
+	BackTest(profile=True) 时创建并交给 Account, 各处只在 profiler 不为 None 时计数, 关闭时几乎没有额外开销.
+	stage 记录每个阶段的调用次数、墙钟时间和 CPU 时间, 阶段名称用 '.' 表示层级;
+	count 记录调用次数, 例如 buy_stock_by_money、get_total_asset、pandas .loc 查找;
+	运行期间另外统计 start 传入的 logger 的日志记录条数, memory 为 True 时用 tracemalloc 记录内存峰值.
+
+	CPU 时间用 time.process_time, 是整个进程所有线程的时间, 多个回测并行时(例如 UniverseRunner)各阶段的 cpu 包含其他线程;
+	tracemalloc 也是整个进程共用的, 峰值包含其他线程的分配, 一个 Profiler 的 stop 和 reset_peak 会影响其他 Profiler,
+	所以同一时间只能有一个 memory 为 True 的 Profiler 在运行, 否则 start 报错.
+	'''
+	_memory_lock = threading.Lock()
+	_memory_owner = None # 正在测内存的 Profiler
+
+	def __init__(self, memory=False):
+		self.memory = memory
+		self.stages = {} # 阶段名称 -> [调用次数, 墙钟时间, CPU 时间]
+		self.counters = {} # 计数器名称 -> 次数
+		self.peak_memory = None # 字节
+		self.wall = 0. # start 到 stop 的总时间
+		self._start = None
+		self._handler = None
+		self._loggers = []
+		self._tracing = False
+
+	def reset(self):
+		self.stages = {}
+		self.counters = {}
+		self.peak_memory = None
+		self.wall = 0.
+
+	def start(self, loggers=()):
+		'''
+		loggers: 统计日志条数的 logger, 例如 BackTest 和 Account 自己的 logger.
+			只加在这些 logger 上, 不加在根 logger 上, 不影响其他回测(例如 UniverseRunner 的其他线程)和没有配置日志时的输出
+		'''
+		if self.memory:
+			with Profiler._memory_lock:
+				if Profiler._memory_owner is not None and Profiler._memory_owner is not self:
+					raise NameError('another Profiler is tracing memory, only one Profiler(memory=True) can run at a time')
+				Profiler._memory_owner = self
+		self.reset()
+		self._start = time.perf_counter()
+		self._handler = _CountHandler(self)
+		self._loggers = list(loggers)
+		for logger in self._loggers:
+			logger.addHandler(self._handler)
+		if self.memory:
+			# 已经在跟踪时(例如外层也在测内存)只重置峰值, 不关闭
+			self._tracing = not tracemalloc.is_tracing()
+			if self._tracing:
+				tracemalloc.start()
+			tracemalloc.reset_peak()
+
+	def stop(self):
+		if self._start is None:
+			return
+		self.wall = time.perf_counter() - self._start
+		self._start = None
+		for logger in self._loggers:
+			logger.removeHandler(self._handler)
+		self._handler = None
+		self._loggers = []
+		if self.memory:
+			self.peak_memory = tracemalloc.get_traced_memory()[1]
+			if self._tracing:
+				tracemalloc.stop()
+			self._tracing = False
+			with Profiler._memory_lock:
+				Profiler._memory_owner = None
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		wall, cpu = time.perf_counter(), time.process_time()
+		try:
+			yield
+		finally:
+			record = self.stages.setdefault(name, [0, 0., 0.])
+			record[0] += 1
+			record[1] += time.perf_counter() - wall
+			record[2] += time.process_time() - cpu
+
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	def report(self):
+		'''
+		return: dict
+			stages: DataFrame, 每个阶段的 calls, wall, cpu (秒) 以及占总时间的比例 share
+			counters: Series, 各计数器的次数
+			wall: 总时间(秒), peak_memory: 内存峰值(字节), 未记录时为 None
+		'''
+		stages = pd.DataFrame.from_dict(self.stages, orient='index', columns=['calls', 'wall', 'cpu'])
+		stages.index.name = 'stage'
+		stages['share'] = stages['wall'] / self.wall if self.wall > 0 else float('nan')
+		return {
+			'stages': stages,
+			'counters': pd.Series(self.counters, dtype='int64').sort_index(),
+			'wall': self.wall,
+			'peak_memory': self.peak_memory,
+		}
+
+
+class _CountHandler(logging.Handler):
+	'''
+	统计运行期间各级别的日志记录条数
+	'''
+	def __init__(self, profiler):
+		super().__init__(level=logging.NOTSET)
+		self.profiler = profiler
+
+	def emit(self, record):
+		self.profiler.count(f'log.{record.levelname.lower()}')
+
+
+NULL_STAGE = contextlib.nullcontext() # 未启用时代替 stage 的空上下文
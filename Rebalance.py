@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class CostModel():
+	'''
+	每笔交易的成本: max(成交金额 x 费率, 最低费用), 买卖可以使用不同的费率(例如卖出另收印花税), 滑点直接计入费率.
+	'''
+	def __init__(self, buy_rate=0., sell_rate=None, min_cost=0.):
+		if buy_rate < 0 or (sell_rate is not None and sell_rate < 0) or min_cost < 0:
+			raise NameError('cost rate and min cost must not be negative')
+		self.buy_rate = buy_rate
+		self.sell_rate = buy_rate if sell_rate is None else sell_rate
+		self.min_cost = min_cost
+
+	def __repr__(self):
+		return f'CostModel(buy_rate={self.buy_rate!r}, sell_rate={self.sell_rate!r}, min_cost={self.min_cost!r})'
+
+	def cost(self, money, sell=False):
+		'''
+		money: ndarray, 成交金额(正数), 为 0 的位置没有交易, 成本为 0
+		'''
+		money = np.asarray(money, dtype=float)
+		rate = self.sell_rate if sell else self.buy_rate
+		return np.where(money > 0, np.maximum(money * rate, self.min_cost), 0.)
+
+	def affordable(self, cash):
+		'''
+		return: ndarray, 现金 cash 在支付买入成本后最多能买入的金额
+		'''
+		cash = np.asarray(cash, dtype=float)
+		money = cash / (1 + self.buy_rate)
+		# 按费率计算的成本低于最低费用时, 成本为最低费用
+		money = np.where(money * self.buy_rate >= self.min_cost, money, cash - self.min_cost)
+		return np.maximum(money, 0.)
+
+
+class Rebalancer():
+	'''
+	差额调仓: 按目标权重和当前持仓的差额一次性算出所有标的的交易, 只交易需要交易的标的.
+		band: 不交易区间, 目标权重与当前权重之差不超过 band 的标的不交易; 目标权重为 0 的持仓总是全部卖出
+		lot_size: 每手的股数, 交易股数向零取整到整手(全部卖出时不取整); None 时不取整
+		cost: CostModel, 每笔交易的成本从现金中扣除; None 时没有成本
+	先卖出再买入, 现金不足时按标的的顺序依次买入, 买不足的标的只买入剩余现金能负担的部分(取整到整手).
+	band=0, lot_size=None, cost=None 时, 在持仓标的的价格不缺失的情况下与按目标权重完全调仓相同.
+	价格缺失(停牌)的持仓不交易, 按 valuation 的价格(BackTest 中为最新的有效价格)计入总资产;
+	完全调仓的 fast / event 引擎对这样的持仓估值为 NaN, 之后的总资产都为 NaN.
+	'''
+	def __init__(self, band=0., lot_size=None, cost=None):
+		if band < 0:
+			raise NameError('no trade band must not be negative')
+		if lot_size is not None and lot_size <= 0:
+			raise NameError('lot size must be positive')
+		self.band = band
+		self.lot_size = lot_size
+		self.cost = cost
+
+	def __repr__(self):
+		return f'Rebalancer(band={self.band!r}, lot_size={self.lot_size!r}, cost={self.cost!r})'
+
+	def orders(self, shares, prices, weights, cash, valuation=None):
+		'''
+		shares: ndarray (策略 x 标的), 当前持有股数
+		prices: ndarray (标的) 或 (策略 x 标的), 成交价格, NaN 的标的不交易
+		weights: ndarray (策略 x 标的), 目标权重, 按交易前的总资产计算
+		cash: ndarray (策略), 当前现金
+		valuation: 形状同 prices, 计算总资产的价格, 默认为 prices; NaN 的持仓不计入总资产
+		return: (交易股数, 交易成本), 形状均为 (策略 x 标的), 股数正数为买入, 负数为卖出
+		'''
+		shares = np.asarray(shares, dtype=float)
+		weights = np.asarray(weights, dtype=float)
+		cash = np.asarray(cash, dtype=float)
+		prices = np.broadcast_to(np.asarray(prices, dtype=float), shares.shape)
+		tradable = ~np.isnan(prices) & (prices > 0)
+		price = np.where(tradable, prices, 1.)
+		if valuation is None:
+			held_value = np.where(tradable, shares * price, 0.)
+		else:
+			valuation = np.broadcast_to(np.asarray(valuation, dtype=float), shares.shape)
+			held_value = np.where(np.isnan(valuation) | (shares == 0), 0., shares * valuation)
+		total = cash + held_value.sum(axis=1)
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			# 总资产为负(例如成本超过资产)时不再持有
+			target = np.where(weights > 0, weights * np.maximum(total, 0.)[:, None] / price, 0.)
+			current_weight = held_value / total[:, None]
+		delta = target - shares
+		leave = (weights <= 0) & (shares != 0)
+		quiet = (weights > 0) & (np.abs(weights - current_weight) <= self.band)
+		delta = np.where(quiet | ~tradable, 0., delta)
+		if self.lot_size is not None:
+			delta = np.trunc(delta / self.lot_size) * self.lot_size
+		delta = np.where(leave & tradable, -shares, delta)
+
+		# ----- 卖出 -----
+		sell_money = np.where(delta < 0, -delta * price, 0.)
+		cost = np.zeros(shares.shape)
+		if self.cost is not None:
+			cost += self.cost.cost(sell_money, sell=True)
+		cash = cash + sell_money.sum(axis=1) - cost.sum(axis=1)
+
+		# ----- 买入, 现金足够时一次完成 -----
+		buy_money = np.where(delta > 0, delta * price, 0.)
+		buy_cost = self.cost.cost(buy_money) if self.cost is not None else np.zeros(shares.shape)
+		short = (buy_money + buy_cost).sum(axis=1) > cash * (1 + 1e-12) + 1e-9
+		for k in np.flatnonzero(short):
+			delta[k], buy_cost[k] = self._buy_in_order(delta[k], price[k], cash[k])
+		return delta, cost + buy_cost
+
+	def _buy_in_order(self, delta, price, cash):
+		'''
+		现金不足时按标的顺序依次买入
+		'''
+		delta = delta.copy()
+		buy_cost = np.zeros(len(delta))
+		for j in np.flatnonzero(delta > 0):
+			money = delta[j] * price[j]
+			cost = self.cost.cost(money) if self.cost is not None else 0.
+			if money + cost > cash:
+				# 卖出的最低费用可能超过成交金额, 现金为负时不再买入
+				money = self.cost.affordable(cash) if self.cost is not None else max(cash, 0.)
+				volume = money / price[j]
+				if self.lot_size is not None:
+					volume = np.floor(volume / self.lot_size) * self.lot_size
+				delta[j] = volume
+				money = volume * price[j]
+				cost = self.cost.cost(money) if self.cost is not None else 0.
+			buy_cost[j] = cost
+			cash -= money + cost
+		return delta, buy_cost
@@ -0,0 +1,206 @@
+import pandas as pd
+import numpy as np
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+class ResultCache():
+	'''
+	按内容寻址的磁盘结果缓存, 用于 BackTest(cache=...) 在输入不变时直接读取上一次 runTest 的结果.
+	键由输入数据的内容哈希和参数决定 (见 key), 每个结果是 cache_dir 下的一个目录;
+	目录总大小超过 max_bytes 时按最近使用时间淘汰(LRU), 读取命中时更新使用时间.
+	每个表存为 values / index / columns 三个数组, 宽表(例如 交易日 x 全部标的 的打分)也只需读写三个文件.
+	数值和日期数组存为 .npy, 字符串等对象数组按元素存为 .json; 读取时不使用 pickle, 缓存目录中的文件不会在读取时执行代码.
+	多个进程可以共用同一个目录: 写入先写临时目录再改名, 淘汰先改名再删除, 读取到不完整或已删除的结果视为未命中.
+	'''
+	VERSION = 2 # 缓存格式版本, 格式变化时使旧缓存失效
+
+	def __init__(self, cache_dir='./cache/backtest', max_bytes=1 << 30):
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+
+	def key(self, *objects, **params):
+		'''
+		objects: DataFrame / Series / Index / ndarray / list, 按内容计算哈希
+		params: 其他参数, 按 repr 计入
+		return: str, 十六进制的键
+		'''
+		source = {'version': self.VERSION, 'objects': [ResultCache.digest(obj) for obj in objects],
+				  'params': {k: repr(v) for k, v in sorted(params.items())}}
+		return hashlib.sha1(json.dumps(source, sort_keys=True).encode('utf-8')).hexdigest()
+
+	def load(self, key):
+		'''
+		return: dict, 名称 -> DataFrame; 未命中时为 None
+		'''
+		directory = os.path.join(self.cache_dir, key)
+		try:
+			with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+				names = json.load(f)['names']
+			result = {name: ResultCache._read(os.path.join(directory, f't{i}')) for i, name in enumerate(names)}
+			os.utime(os.path.join(directory, 'meta.json')) # 更新最近使用时间
+		except (OSError, ValueError, KeyError):
+			# 不存在, 或者正在被其他进程淘汰
+			with self._lock:
+				self.misses += 1
+			return None
+		with self._lock:
+			self.hits += 1
+		return result
+
+	def store(self, key, frames):
+		'''
+		frames: dict, 名称 -> DataFrame
+		'''
+		directory = os.path.join(self.cache_dir, key)
+		if os.path.exists(os.path.join(directory, 'meta.json')):
+			return
+		os.makedirs(self.cache_dir, exist_ok=True)
+		tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+		try:
+			for i, df in enumerate(frames.values()):
+				ResultCache._write(os.path.join(tmp, f't{i}'), df)
+			# meta.json 最后写, 有 meta.json 的目录才是完整的结果
+			with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+				json.dump({'names': list(frames)}, f, ensure_ascii=False)
+			os.rename(tmp, directory)
+		except (OSError, TypeError):
+			# 其他进程已经写好了同一份结果, 或者表中有不能保存的对象
+			shutil.rmtree(tmp, ignore_errors=True)
+			return
+		self.evict()
+
+	def evict(self):
+		'''
+		按 meta.json 的修改时间从旧到新删除结果, 直到总大小不超过 max_bytes
+		'''
+		with self._lock:
+			entries = []
+			for entry in self._entries():
+				try:
+					entries.append((os.stat(os.path.join(entry, 'meta.json')).st_mtime_ns, ResultCache._size(entry), entry))
+				except OSError:
+					continue
+			total = sum(size for _, size, _ in entries)
+			for _, size, entry in sorted(entries):
+				if total <= self.max_bytes:
+					break
+				doomed = os.path.join(self.cache_dir, f'.del-{os.getpid()}-{os.path.basename(entry)}')
+				try:
+					os.rename(entry, doomed)
+				except OSError:
+					continue # 已经被其他进程淘汰
+				shutil.rmtree(doomed, ignore_errors=True)
+				total -= size
+
+	def clear(self):
+		if os.path.exists(self.cache_dir):
+			shutil.rmtree(self.cache_dir)
+		self.hits = 0
+		self.misses = 0
+
+	def _entries(self):
+		if not os.path.exists(self.cache_dir):
+			return []
+		return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if not name.startswith('.')]
+
+	@staticmethod
+	def _write(directory, df):
+		'''
+		列的类型不同时为对象数组
+		'''
+		os.makedirs(directory)
+		for name, values in [('values', df.to_numpy()), ('index', df.index.to_numpy()), ('columns', df.columns.to_numpy())]:
+			values = np.asarray(values)
+			if values.dtype.kind in 'biufcmM':
+				np.save(os.path.join(directory, f'{name}.npy'), values, allow_pickle=False)
+			else:
+				with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+					json.dump({'shape': values.shape, 'values': [ResultCache._encode(v) for v in values.ravel()]}, f,
+							  ensure_ascii=False)
+		# 索引和列名的类型, 例如字符串类型存为对象数组, 读取时还原
+		with open(os.path.join(directory, 'dtypes.json'), 'w', encoding='utf-8') as f:
+			json.dump({'index': str(df.index.dtype), 'columns': str(df.columns.dtype)}, f)
+
+	@staticmethod
+	def _read(directory):
+		arrays = {}
+		for name in ['values', 'index', 'columns']:
+			path = os.path.join(directory, f'{name}.npy')
+			if os.path.exists(path):
+				arrays[name] = np.load(path, allow_pickle=False)
+			else:
+				with open(os.path.join(directory, f'{name}.json'), encoding='utf-8') as f:
+					data = json.load(f)
+				values = np.empty(len(data['values']), dtype=object)
+				values[:] = [ResultCache._decode(v) for v in data['values']]
+				arrays[name] = values.reshape(data['shape'])
+		with open(os.path.join(directory, 'dtypes.json'), encoding='utf-8') as f:
+			dtypes = json.load(f)
+		return pd.DataFrame(arrays['values'], index=pd.Index(arrays['index'], dtype=dtypes['index']),
+							columns=pd.Index(arrays['columns'], dtype=dtypes['columns']))
+
+	@staticmethod
+	def _encode(value):
+		'''
+		对象数组的元素: 字符串、数值、None 原样保存, 日期存为 {"timestamp": ISO 字符串}; 其他对象不能保存
+		'''
+		if isinstance(value, (pd.Timestamp, np.datetime64)) or value is pd.NaT:
+			return {'timestamp': pd.Timestamp(value).isoformat()}
+		if isinstance(value, np.generic):
+			value = value.item()
+		if value is None or isinstance(value, (str, bool, int, float)):
+			return value
+		raise TypeError(f'cannot cache object of type {type(value).__name__}')
+
+	@staticmethod
+	def _decode(value):
+		if isinstance(value, dict):
+			return pd.Timestamp(value['timestamp'])
+		return value
+
+	@staticmethod
+	def _size(directory):
+		total = 0
+		for root, _, files in os.walk(directory):
+			for name in files:
+				try:
+					total += os.path.getsize(os.path.join(root, name))
+				except OSError:
+					pass
+		return total
+
+	@staticmethod
+	def digest(obj):
+		'''
+		return: str, 数据内容(以及索引、列名和类型)的哈希; 数值数组直接对内存计算, 不逐行调用 pandas
+		'''
+		h = hashlib.blake2b(digest_size=20)
+		if isinstance(obj, pd.DataFrame):
+			h.update(b'frame')
+			h.update(ResultCache.digest(obj.index).encode())
+			h.update(ResultCache.digest(obj.columns).encode())
+			h.update(ResultCache.digest(obj.to_numpy()).encode()) # 列的类型不同时为对象数组
+			return h.hexdigest()
+		if isinstance(obj, (pd.Series, pd.Index)):
+			h.update(type(obj).__name__.encode())
+			if isinstance(obj, pd.Series):
+				h.update(ResultCache.digest(obj.index).encode())
+				h.update(repr(obj.name).encode())
+			values = obj.to_numpy()
+		else:
+			values = np.asarray(obj)
+		h.update(f'{values.dtype.str}{values.shape}'.encode())
+		if values.dtype == object:
+			h.update(pd.util.hash_pandas_object(pd.Series(values.ravel()), index=False).to_numpy().tobytes())
+		else:
+			h.update(np.ascontiguousarray(values).view(np.uint8).data) # 按字节, 日期等类型也适用
+		return h.hexdigest()
@@ -0,0 +1,308 @@
+import pandas as pd
+import numpy as np
+
+
+class RollingZScore():
+	'''
+	滚动窗口的稳健 Zscore, 与 Factor.z_score 在每个窗口上的结果一致:
+	窗口内先按 MAD 去极值(极端值之间保持有序), 再标准化, 取窗口最后一个值.
+
+	每个序列的取值先离散化为有序坐标, 窗口用树状数组(Fenwick tree)维护
+	计数、和、平方和以及重复值修正项, 每一步只需 O(log w) 的增删与查询,
+	中位数、MAD、均值和标准差都由这些统计量直接得到. 多个序列按列同时计算.
+	'''
+	def __init__(self, window=100, n=5.2):
+		if window < 1:
+			raise NameError('window must be positive')
+		self.window = int(window)
+		self.n = n
+
+	def transform(self, df):
+		'''
+		df: Series 或 DataFrame(每列一个序列)
+		return: 同样类型的滚动 Zscore, 窗口不满或窗口内有 NaN 时为 NaN
+		'''
+		if isinstance(df, pd.Series):
+			values = self.transform_array(df.to_numpy(dtype=float)[:, None])
+			return pd.Series(values[:, 0], index=df.index, name=df.name)
+		if isinstance(df, pd.DataFrame):
+			values = self.transform_array(df.to_numpy(dtype=float))
+			return pd.DataFrame(values, index=df.index, columns=df.columns)
+		raise NameError('input must be times seires or DataFrame object')
+
+	def transform_array(self, arr):
+		'''
+		arr: 2-D ndarray, 行为日期, 列为序列
+		'''
+		arr = np.asarray(arr, dtype=float)
+		T, S = arr.shape
+		w = self.window
+		out = np.full((T, S), np.nan)
+		if T < w or S == 0 or w == 1:
+			# 单个值的窗口标准差为 NaN
+			return out
+
+		with np.errstate(all='ignore'):
+			state = _FenwickWindow(arr)
+			for t in range(T):
+				if t >= w:
+					state.update(t - w, -1)
+				state.update(t, 1)
+				if t >= w - 1:
+					out[t] = state.z_score(t, w, self.n)
+		return out
+
+
+	def stream(self, history=None):
+		'''
+		history: 2-D ndarray 或 DataFrame, 之前的观测(行为日期), 只保留最后 window 行
+		return: RollingZScoreStream, 之后每来一行数据调用 update 得到这一行的 Zscore
+		'''
+		return RollingZScoreStream(self.window, self.n, history)
+
+
+class RollingZScoreStream():
+	'''
+	RollingZScore 的增量版本, 用于实盘逐日更新.
+	只保存最近 window 行的环形缓冲区, 每次 update 对所有序列的窗口排序后按相同定义计算,
+	不依赖历史长度, 结果与 RollingZScore.transform 对同一窗口的结果一致.
+	'''
+	def __init__(self, window=100, n=5.2, history=None):
+		if window < 1:
+			raise NameError('window must be positive')
+		self.window = int(window)
+		self.n = n
+		self._buffer = None # window x 序列个数
+		self._pos = 0 # 下一次写入的位置
+		self._count = 0 # 已写入的行数
+		if history is not None:
+			history = np.asarray(history, dtype=float)
+			for row in history[-self.window:]:
+				self._push(row)
+
+	def update(self, row):
+		'''
+		row: 1-D ndarray, 新的一行数据
+		return: 1-D ndarray, 这一行的 Zscore, 窗口不满或窗口内有 NaN 时为 NaN
+		'''
+		self._push(np.asarray(row, dtype=float))
+		w = self.window
+		x = self._buffer[(self._pos - 1) % w]
+		if self._count < w or w == 1:
+			return np.full(x.shape, np.nan)
+
+		with np.errstate(all='ignore'):
+			window = np.sort(self._buffer.T, axis=1) # 序列 x window, 升序
+			k_low, k_high = (w - 1)//2, w//2
+			median = _lerp_half(window[:, k_low], window[:, k_high])
+			deviation = np.sort(np.abs(window - median[:, None]), axis=1)
+			mad = _lerp_half(deviation[:, k_low], deviation[:, k_high])
+			up = median + self.n*mad
+			down = median - self.n*mad
+
+			# 有序窗口内的平均排名(从1开始)
+			position = np.broadcast_to(np.arange(w), window.shape)
+			start = np.ones(window.shape, dtype=bool)
+			start[:, 1:] = window[:, 1:] != window[:, :-1]
+			end = np.ones(window.shape, dtype=bool)
+			end[:, :-1] = start[:, 1:]
+			first = np.maximum.accumulate(np.where(start, position, 0), axis=1)
+			last = np.minimum.accumulate(np.where(end, position, w - 1)[:, ::-1], axis=1)[:, ::-1]
+			rank = (first + last) / 2. + 1
+
+			k_down = (window <= down[:, None]).sum(axis=1)
+			k_up = (window >= up[:, None]).sum(axis=1)
+
+			def winsorize(value, rank):
+				value = np.where(value <= down[:, None], down[:, None] - (mad/k_down)[:, None]*(k_down[:, None] + 1 - rank), value)
+				return np.where(value >= up[:, None], up[:, None] + (mad/k_up)[:, None]*(rank - (w - k_up)[:, None]), value)
+
+			clipped = winsorize(window, rank)
+			mean = clipped.mean(axis=1)
+			std = clipped.std(axis=1, ddof=1)
+			std = np.where(std == 0, 1, std)
+			x_rank = (window < x[:, None]).sum(axis=1) + ((window == x[:, None]).sum(axis=1) + 1) / 2.
+			z = (winsorize(x[:, None], x_rank[:, None])[:, 0] - mean) / std
+		z = np.where(mad == 0, 0., z)
+		return np.where(np.isnan(self._buffer).any(axis=0), np.nan, z)
+
+	def _push(self, row):
+		if self._buffer is None:
+			self._buffer = np.full((self.window, row.size), np.nan)
+		self._buffer[self._pos] = row
+		self._pos = (self._pos + 1) % self.window
+		self._count += 1
+
+
+class _FenwickWindow():
+	'''
+	多个序列共用的树状数组, 第 s 行是第 s 个序列.
+	tree[0:4] 依次为 计数, 和, 平方和, 重复值修正项 sum(c^3 - c)
+	'''
+	def __init__(self, arr):
+		T, S = arr.shape
+		values = arr.T
+		self.isnan = np.isnan(values)
+		order = np.argsort(values, axis=1, kind='stable')
+		sorted_values = np.take_along_axis(values, order, axis=1)
+		new_value = np.ones(sorted_values.shape, dtype=bool)
+		new_value[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+		ids = np.cumsum(new_value, axis=1) # 从1开始的坐标, NaN 排在最后
+		self.coord = np.empty(values.shape, dtype=np.int64)
+		np.put_along_axis(self.coord, order, ids, axis=1)
+
+		self.levels = max(1, int(np.ceil(np.log2(ids[:, -1].max() + 1))))
+		self.size = 2**self.levels
+		# 坐标对应的取值, 超出部分为 inf, 使按取值的二分下降保持单调
+		self.coord_values = np.full((S, 2*self.size + 1), np.inf)
+		np.put_along_axis(self.coord_values, ids, sorted_values, axis=1)
+		# 以每个序列的中位数为中心累加, 减少平方和相减时的精度损失
+		center = np.nanmedian(np.where(self.isnan.all(axis=1, keepdims=True), 0, values), axis=1)
+		self.center = np.where(np.isnan(center), 0, center)
+		self.values = values
+		self.centered = values - self.center[:, None]
+
+		self.rows = np.arange(S)
+		# 按行展开的一维数组, 第 s 行第 i 个节点位于 offset[s] + i
+		self.stride = 2*self.size + 1
+		self.offset = self.rows*self.stride
+		self.coord_values = self.coord_values.ravel()
+		self.tree = np.zeros((4, S*self.stride)) # 计数在第一行连续存放, 供 kth 查询
+		self.count = np.zeros(S*self.stride)
+		self.total = np.zeros((4, S))
+		self.nan_count = np.zeros(S)
+
+	def update(self, t, sign):
+		isnan = self.isnan[:, t]
+		valid = ~isnan
+		coord = np.where(isnan, 1, self.coord[:, t])
+		x = np.where(isnan, 0, self.centered[:, t])
+		old = self.count[self.offset + coord]
+		new = old + sign*valid
+		self.count[self.offset + coord] = new
+		delta = np.stack([sign*valid, sign*valid*x, sign*valid*x*x, (new**3 - new) - (old**3 - old)])
+		self.total += delta
+		self.nan_count += sign*isnan
+
+		idx = coord
+		for _ in range(self.levels + 2):
+			self.tree[:, self.offset + idx] += delta
+			idx = np.minimum(idx + (idx & -idx), 2*self.size)
+
+	def kth(self, offset, k):
+		'''
+		offset 对应行的窗口内第 k 小(从0开始)的取值
+		'''
+		pos = np.zeros(offset.shape, dtype=np.int64)
+		remain = k + 1.
+		step = self.size
+		while step >= 1:
+			c = self.tree[0].take(offset + pos + step)
+			go = c < remain
+			pos += step*go
+			remain -= c*go
+			step //= 2
+		return self.coord_values.take(offset + np.minimum(pos + 1, 2*self.size))
+
+	def prefix(self, offset, threshold, strict):
+		'''
+		offset 对应行中取值 <= threshold (strict 时为 <) 的各项统计量之和
+		'''
+		pos = np.zeros(offset.shape, dtype=np.int64)
+		acc = np.zeros((4,) + offset.shape)
+		step = self.size
+		while step >= 1:
+			v = self.coord_values.take(offset + pos + step)
+			go = np.where(strict, v < threshold, v <= threshold)
+			acc += self.tree[:, offset + pos + step]*go
+			pos += step*go
+			step //= 2
+		return acc
+
+	def z_score(self, t, w, n):
+		S = self.rows.size
+		k_low, k_high = (w - 1)//2, w//2
+		both = np.tile(self.offset, 2)
+
+		# ----- 中位数, 与 pd.Series.quantile(0.5) 的线性插值一致 -----
+		a, b = np.split(self.kth(both, np.repeat([k_low, k_high], S)), 2)
+		median = _lerp_half(a, b)
+
+		# ----- MAD: |x - median| 的中位数, 在左右两个有序距离序列中二分选择 -----
+		# 左侧 L[i] = median - a_(p-1-i), 右侧 R[j] = a_(p+j) - median, 均递增
+		p = k_high
+		n_left, n_right = p, w - p
+		lanes = np.tile(self.offset, 4)
+		med4 = np.tile(median, 4)
+		m = np.repeat([k_low + 1, k_high + 1], S)
+		lo = np.maximum(0, m - n_right)
+		hi = np.minimum(m, n_left)
+		while (lo < hi).any():
+			active = lo < hi
+			i = (lo + hi)//2
+			j = m - i
+			idx = np.concatenate([np.clip(p - 1 - i, 0, w - 1), np.clip(p + j - 1, 0, w - 1)])
+			left, right = np.split(self.kth(lanes, idx), 2)
+			left, right = med4[:2*S] - left, right - med4[:2*S]
+			more = active & (left < right)
+			lo = np.where(more, i + 1, lo)
+			hi = np.where(active & ~more, i, hi)
+		i = lo
+		j = m - i
+		idx = np.concatenate([np.clip(p - i, 0, w - 1), np.clip(p + j - 1, 0, w - 1)])
+		left, right = np.split(self.kth(lanes, idx), 2)
+		left = np.where(i > 0, med4[:2*S] - left, -np.inf)
+		right = np.where(j > 0, right - med4[:2*S], -np.inf)
+		d_low, d_high = np.split(np.maximum(left, right), 2)
+		mad = _lerp_half(d_low, d_high)
+
+		# ----- 去极值后窗口的均值和标准差 -----
+		up = median + n*mad
+		down = median - n*mad
+		x = self.values[:, t]
+		three = np.tile(self.offset, 3)
+		threshold = np.concatenate([down, up, x])
+		strict = np.repeat([False, True, True], S)
+		agg_down, agg_below_up, agg_below_x = np.split(self.prefix(three, threshold, strict), 3, axis=1)
+
+		k_down = agg_down[0]
+		k_up = w - agg_below_up[0]
+		tie_down = agg_down[3]
+		tie_up = self.total[3] - agg_below_up[3]
+		down_c = down - self.center
+		up_c = up - self.center
+		sum_mid = agg_below_up[1] - agg_down[1]
+		sumsq_mid = agg_below_up[2] - agg_down[2]
+
+		# 平均排名 1..k 的平方和, 每组 c 个重复值减少 (c^3 - c)/12
+		def sum_rank_square(k, tie):
+			return k*(k + 1)*(2*k + 1)/6. - tie/12.
+
+		has_down = k_down > 0
+		has_up = k_up > 0
+		s1 = sum_mid \
+			+ np.where(has_down, k_down*down_c - mad*(k_down + 1)/2., 0) \
+			+ np.where(has_up, k_up*up_c + mad*(k_up + 1)/2., 0)
+		s2 = sumsq_mid \
+			+ np.where(has_down, k_down*down_c**2 - down_c*mad*(k_down + 1) + (mad/k_down)**2*sum_rank_square(k_down, tie_down), 0) \
+			+ np.where(has_up, k_up*up_c**2 + up_c*mad*(k_up + 1) + (mad/k_up)**2*sum_rank_square(k_up, tie_up), 0)
+		mean = s1 / w
+		std = np.sqrt(np.maximum((s2 - s1*mean) / (w - 1), 0))
+		std = np.where(std == 0, 1, std)
+
+		# ----- 窗口最后一个值去极值后的取值 -----
+		coord = np.where(self.isnan[:, t], 1, self.coord[:, t])
+		rank = agg_below_x[0] + (self.count[self.offset + coord] + 1)/2.
+		x_c = self.centered[:, t]
+		x_c = np.where(x <= down, down_c - mad/k_down*(k_down + 1 - rank), x_c)
+		x_c = np.where(x >= up, up_c + mad/k_up*(rank - (w - k_up)), x_c)
+
+		z = (x_c - mean) / std
+		# MAD 为零时窗口全部压缩到中位数, Zscore 为零
+		z = np.where(mad == 0, 0., z)
+		return np.where(self.nan_count > 0, np.nan, z)
+
+
+def _lerp_half(a, b):
+	# numpy 线性插值在 t=0.5 时的写法, 保证与 quantile(0.5) 逐位一致
+	return b - (b - a)*0.5
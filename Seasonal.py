@@ -0,0 +1,131 @@
+import pandas as pd
+import numpy as np
+
+from collections import deque
+
+
+class SeasonalAdjust():
+	'''
+	加法模型的季节调整, 多个序列按列同时计算, 只使用当天及之前的数据, 没有未来数据:
+		趋势 = 过去 period 个自然日(不含 period 天前当天)的滑动平均, 按实际日期计算, 适用于不规则的交易日
+		季节项 = 同一季节分组内 (因子 - 趋势) 的扩张均值, 减去当时各分组均值的平均, 使各分组的季节项之和为零;
+		分组内观测少于 min_periods 个时该分组没有估计, 季节项为 0
+		调整后 = 因子 - 季节项
+	period 为 365 时按一年中的日期分组, buckets=4 即四个季度; 否则按距 1970-01-01 的天数对 period 取余分组.
+	'''
+	def __init__(self, period=365, buckets=4, min_periods=1):
+		if period < 1 or buckets < 1:
+			raise NameError('period and buckets must be positive')
+		self.period = int(period)
+		self.buckets = int(buckets)
+		self.min_periods = int(min_periods)
+
+	def phase(self, dates):
+		'''
+		return: ndarray, 每个日期所在的季节分组 0 .. buckets-1
+		'''
+		dates = pd.DatetimeIndex(dates)
+		if self.period == 365:
+			return ((dates.dayofyear.to_numpy() - 1) * self.buckets // 366).astype(np.int64)
+		days = (dates - pd.Timestamp('1970-01-01')).days.to_numpy()
+		return ((days % self.period) * self.buckets // self.period).astype(np.int64)
+
+	def transform(self, df):
+		'''
+		df: Series 或 DataFrame (日期 x 序列), 日期升序
+		return: 同样类型的季节调整后的序列
+		'''
+		if isinstance(df, pd.Series):
+			return self.transform(df.to_frame()).iloc[:, 0].rename(df.name)
+		if not isinstance(df, pd.DataFrame):
+			raise NameError('input must be times seires or DataFrame object')
+		if not df.index.is_monotonic_increasing:
+			raise NameError('input dates must be ascending')
+		values = df.astype(float)
+		trend = values.rolling(f'{self.period}D').mean()
+		detrended = (values - trend).to_numpy()
+		has = ~np.isnan(detrended)
+		phase = self.phase(df.index)
+		# 逐个分组计算截至各日期的扩张均值(没有估计时为 NaN), 累加出各分组均值的平均, 内存只需 日期 x 序列
+		own = np.full(detrended.shape, np.nan)
+		center_sum = np.zeros(detrended.shape)
+		center_count = np.zeros(detrended.shape)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			for b in range(self.buckets):
+				member = (phase == b)[:, None] & has
+				total = np.cumsum(np.where(member, detrended, 0.), axis=0)
+				count = np.cumsum(member, axis=0)
+				mean = np.where(count >= self.min_periods, total / count, np.nan)
+				own = np.where((phase == b)[:, None], mean, own)
+				center_sum += np.where(np.isnan(mean), 0., mean)
+				center_count += ~np.isnan(mean)
+			seasonal = np.where(np.isnan(own), 0., own - center_sum / center_count)
+		return values - seasonal
+
+	def stream(self, history=None):
+		'''
+		history: DataFrame, 之前的观测
+		return: SeasonalStream, 之后每来一行数据调用 update 得到调整后的值
+		'''
+		return SeasonalStream(self, history)
+
+
+class SeasonalStream():
+	'''
+	SeasonalAdjust 的增量版本: 保存趋势窗口内的观测及其和, 以及各季节分组的和与计数,
+	每次 update 的计算量与 分组数 x 序列个数 成正比, 与 SeasonalAdjust.transform 在最后一行的结果一致.
+	'''
+	def __init__(self, adjust, history=None):
+		self.adjust = adjust
+		self._window = deque() # (日期, 行) 趋势窗口内的观测
+		self._sum = None # 趋势窗口内的和
+		self._count = None # 趋势窗口内的有效个数
+		self._season_sum = None # 季节分组 x 序列
+		self._season_count = None
+		self._date = None
+		if history is not None:
+			for date, row in zip(history.index, history.to_numpy(dtype=float)):
+				self.update(date, row)
+
+	def update(self, date, row):
+		'''
+		date: 新观测的日期, 晚于之前的观测
+		row: 1-D ndarray, 各序列的新观测
+		return: 1-D ndarray, 调整后的值
+		'''
+		date = pd.Timestamp(date)
+		row = np.asarray(row, dtype=float)
+		if self._date is not None and date <= self._date:
+			raise NameError('new observation date must be later than the last one')
+		if self._sum is None:
+			self._sum = np.zeros(row.shape)
+			self._count = np.zeros(row.shape)
+			self._season_sum = np.zeros((self.adjust.buckets,) + row.shape)
+			self._season_count = np.zeros((self.adjust.buckets,) + row.shape)
+		self._date = date
+
+		# ----- 趋势: 移出 period 天之前的观测, 加入新观测 -----
+		valid = ~np.isnan(row)
+		start = date - pd.Timedelta(days=self.adjust.period)
+		while len(self._window) > 0 and self._window[0][0] <= start:
+			_, old = self._window.popleft()
+			old_valid = ~np.isnan(old)
+			self._sum -= np.where(old_valid, old, 0.)
+			self._count -= old_valid
+		self._window.append((date, row))
+		self._sum += np.where(valid, row, 0.)
+		self._count += valid
+		with np.errstate(divide='ignore', invalid='ignore'):
+			trend = np.where(self._count > 0, self._sum / self._count, np.nan)
+
+		# ----- 季节项 -----
+		phase = self.adjust.phase([date])
+		detrended = row - trend
+		has = ~np.isnan(detrended)
+		self._season_sum[phase[0]] += np.where(has, detrended, 0.)
+		self._season_count[phase[0]] += has
+		with np.errstate(divide='ignore', invalid='ignore'):
+			means = np.where(self._season_count >= self.adjust.min_periods, self._season_sum / self._season_count, np.nan)
+			center = np.where(np.isnan(means), 0., means).sum(axis=0) / (~np.isnan(means)).sum(axis=0)
+		own = means[phase[0]]
+		return row - np.where(np.isnan(own), 0., own - center)
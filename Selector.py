@@ -0,0 +1,90 @@
+import pandas as pd
+import numpy as np
+
+
+class Selector():
+	'''
+	根据打分表(日期 x 标的)批量选出每个日期的标的, 打分越低越优秀.
+	所有日期在一次 numpy 调用中完成, 返回标的的列位置; 打分相同的标的按列的先后
+	顺序处理, 与稳定排序后取 head / tail 的结果一致. NaN 打分视为缺失, 最后才会被选中.
+	'''
+	@staticmethod
+	def top_n(scores, n):
+		'''
+		scores: 2-D ndarray 或 DataFrame
+		n: 每个日期选出的标的个数
+		return: ndarray(日期 x n), 打分最低的 n 个标的的列位置, 按打分升序
+		'''
+		key = Selector._as_array(scores)
+		key = np.where(np.isnan(key), np.inf, key)
+		dates, assets = key.shape
+		Selector._check_n(n, assets)
+		threshold = np.partition(key, n - 1, axis=1)[:, n - 1:n]
+		less = key < threshold
+		equal = key == threshold
+		need = n - less.sum(axis=1, keepdims=True)
+		# 与阈值相同的标的, 取列位置靠前的
+		chosen = less | (equal & (np.cumsum(equal, axis=1) <= need))
+		return Selector._sorted_index(key, chosen, n)
+
+	@staticmethod
+	def bottom_n(scores, n):
+		'''
+		return: ndarray(日期 x n), 打分最高的 n 个标的的列位置, 按打分升序
+		'''
+		key = Selector._as_array(scores)
+		key = np.where(np.isnan(key), -np.inf, key)
+		dates, assets = key.shape
+		Selector._check_n(n, assets)
+		threshold = np.partition(key, assets - n, axis=1)[:, assets - n:assets - n + 1]
+		greater = key > threshold
+		equal = key == threshold
+		need = n - greater.sum(axis=1, keepdims=True)
+		# 与阈值相同的标的, 取列位置靠后的
+		chosen = greater | (equal & (np.cumsum(equal[:, ::-1], axis=1)[:, ::-1] <= need))
+		return Selector._sorted_index(key, chosen, n)
+
+	@staticmethod
+	def quantile_groups(scores, groups=10):
+		'''
+		groups: 分组个数, 例如 10 为十分位
+		return: ndarray(日期 x 标的), 每个标的所在的组, 0 为打分最低(最优秀)的一组,
+				groups-1 为打分最高的一组, NaN 打分为 -1
+		'''
+		key = Selector._as_array(scores)
+		if groups < 1:
+			raise NameError('groups must be positive')
+		valid = ~np.isnan(key)
+		order = np.argsort(key, axis=1, kind='stable') # NaN 排在最后
+		rank = np.empty(key.shape, dtype=np.int64)
+		np.put_along_axis(rank, order, np.broadcast_to(np.arange(key.shape[1]), key.shape), axis=1)
+		n_valid = valid.sum(axis=1, keepdims=True)
+		group = rank * groups // np.maximum(n_valid, 1)
+		return np.where(valid, group, -1)
+
+	@staticmethod
+	def to_labels(index, columns, dates=None):
+		'''
+		index: top_n / bottom_n 的结果
+		columns: 标的名称
+		return: DataFrame(日期 x n), 对应的标的名称
+		'''
+		return pd.DataFrame(np.asarray(columns, dtype=object)[index], index=dates)
+
+	@staticmethod
+	def _as_array(scores):
+		if isinstance(scores, pd.DataFrame):
+			scores = scores.to_numpy(dtype=float)
+		return np.array(scores, dtype=float, ndmin=2)
+
+	@staticmethod
+	def _check_n(n, assets):
+		if n < 1 or n > assets:
+			raise NameError(f'number of selected stocks {n} out of range, total {assets}')
+
+	@staticmethod
+	def _sorted_index(key, chosen, n):
+		dates = key.shape[0]
+		index = np.nonzero(chosen)[1].reshape(dates, n) # 列位置升序
+		order = np.argsort(np.take_along_axis(key, index, axis=1), axis=1, kind='stable')
+		return np.take_along_axis(index, order, axis=1)
@@ -0,0 +1,154 @@
+import pandas as pd
+import numpy as np
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from Analytics import Analytics
+from BackTest import BackTest
+from Panel import Panel
+from Rolling import RollingZScore
+
+
+class ParameterSweep():
+	'''
+	在进程池中批量运行 BackTest 的参数组合.
+	标的价格和因子放入共享内存, 只写入一次, 各进程直接映射同一块内存, 不会逐个进程序列化.
+	传入 Panel 时各进程直接打开同一个内存映射文件.
+
+	可扫描的参数:
+		number_of_longs, number_of_groups, engine: BackTest 的同名参数
+		window, n: 因子先做滚动 Zscore (RollingZScore(window, n)), 不设置 window 时使用原始因子
+		calendar: calendars 中交易日序列的名称, 例如 'weekly', 'monthly'
+	'''
+	def __init__(self, underlying, df_factors, calendars, init_cash=1e8):
+		for df in [underlying, df_factors]:
+			if not isinstance(df, (pd.DataFrame, Panel)):
+				raise NameError('input error, please load underlying price and factors [DataFrame or Panel]')
+		if not isinstance(calendars, dict) or len(calendars) == 0:
+			raise NameError('input error, please load trade date calendars [dict]')
+		self.underlying = underlying
+		self.df_factors = df_factors
+		self.calendars = {name: list(li) for name, li in calendars.items()}
+		self.init_cash = init_cash
+		self.asset_values = None # 各参数组合的总资产, 列为 (组合编号, 策略名称)
+
+	@staticmethod
+	def expand_grid(grid):
+		'''
+		grid: dict, 参数名称 -> 取值列表
+		return: list, 所有参数组合
+		'''
+		keys = list(grid.keys())
+		return [dict(zip(keys, values)) for values in itertools.product(*[grid[k] for k in keys])]
+
+	def run(self, grid, processes=None):
+		'''
+		grid: dict (参数名称 -> 取值列表) 或 list (参数组合)
+		processes: 进程数, 默认为 CPU 个数
+		return: DataFrame, 每行一个参数组合, 包含参数和汇总指标
+		'''
+		configs = self.expand_grid(grid) if isinstance(grid, dict) else list(grid)
+		if len(configs) == 0:
+			raise NameError('input error, parameter grid is empty')
+		for config in configs:
+			name = config.get('calendar', next(iter(self.calendars)))
+			if name not in self.calendars:
+				raise NameError(f'calendar {name} not defined')
+
+		blocks = []
+		try:
+			panels = {}
+			for key, df in [('underlying', self.underlying), ('df_factors', self.df_factors)]:
+				block, meta = _SharedFrame.create(df)
+				if block is not None:
+					blocks.append(block)
+				panels[key] = meta
+			processes = processes or os.cpu_count()
+			with ProcessPoolExecutor(max_workers=min(processes, len(configs)), initializer=_attach,
+									 initargs=(panels, self.calendars, self.init_cash)) as pool:
+				results = list(pool.map(_run_config, configs, chunksize=max(1, len(configs) // (4*processes))))
+		finally:
+			for block in blocks:
+				block.close()
+				block.unlink()
+
+		self.asset_values = pd.concat({i: values for i, (values, _) in enumerate(results)}, axis=1)
+		summary = pd.DataFrame([dict(config, **metrics) for config, (_, metrics) in zip(configs, results)])
+		return summary
+
+
+class _SharedFrame():
+	'''
+	float64 的 DataFrame 放入共享内存, meta 只包含内存名称、形状和索引
+	'''
+	@staticmethod
+	def create(df):
+		if isinstance(df, Panel):
+			# 内存映射面板本身就可以在进程间共享, 只传递目录
+			return None, {'panel': df.path}
+		values = df.to_numpy(dtype=np.float64)
+		block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+		np.ndarray(values.shape, dtype=np.float64, buffer=block.buf)[:] = values
+		meta = {'name': block.name, 'shape': values.shape, 'index': df.index, 'columns': df.columns}
+		return block, meta
+
+	@staticmethod
+	def attach(meta):
+		if 'panel' in meta:
+			return None, Panel.open(meta['panel'])
+		block = shared_memory.SharedMemory(name=meta['name'])
+		values = np.ndarray(meta['shape'], dtype=np.float64, buffer=block.buf)
+		# 包装成 Panel, 交给 BackTest 时不会复制
+		return block, Panel(None, values, pd.DatetimeIndex(meta['index']), meta['columns'])
+
+
+_worker = {} # 子进程中映射的共享数据, 价格和因子为 Panel
+
+
+def _attach(panels, calendars, init_cash):
+	for key, meta in panels.items():
+		block, df = _SharedFrame.attach(meta)
+		_worker[key + '_block'] = block # 保持映射
+		_worker[key] = df
+	_worker['calendars'] = calendars
+	_worker['init_cash'] = init_cash
+
+
+def _run_config(config):
+	calendars = _worker['calendars']
+	df_factors = _worker['df_factors']
+	if config.get('window') is not None:
+		# 同一进程内相同窗口的 Zscore 只计算一次
+		key = (config['window'], config.get('n', 5.2))
+		cache = _worker.setdefault('z_score', {})
+		if key not in cache:
+			z = RollingZScore(window=key[0], n=key[1]).transform(df_factors.to_frame())
+			cache[key] = Panel(None, z.to_numpy(), z.index, z.columns)
+		df_factors = cache[key]
+
+	tester = BackTest(init_cash=_worker['init_cash'],
+					  number_of_longs=config.get('number_of_longs', 1),
+					  number_of_groups=config.get('number_of_groups'),
+					  engine=config.get('engine', 'fast'))
+	tester.underlying = _worker['underlying']
+	tester.trade_date = calendars[config.get('calendar', next(iter(calendars)))]
+	tester.df_factors = df_factors
+	tester.runTest()
+	values = tester.asset_values.astype(float)
+	return values, _summary(values)
+
+
+def _summary(values):
+	'''
+	values: 各策略的总资产
+	return: dict, 各策略的绩效指标, 见 Analytics.summary
+	'''
+	info = Analytics.summary(values)
+	metrics = {}
+	for leg in info.index:
+		for name in ['total_return', 'annual_return', 'cagr', 'volatility', 'sharpe', 'calmar', 'max_drawdown']:
+			metrics[f'{leg}_{name}'] = info.at[leg, name]
+	return metrics
@@ -0,0 +1,88 @@
+import pandas as pd
+import numpy as np
+
+
+class SyntheticMarket():
+	'''
+	按随机种子生成的模拟市场数据, 用于性能测试和不依赖 Wind 数据的示例.
+	价格为带一个共同因子的几何布朗运动; 收益率曲线为两条均值回复的到期收益率(与 test.py 中的 y10Y / y3Y3A 对应);
+	横截面因子对下一期收益有微弱的预测能力(打分越低越好, 与 BackTest 的约定一致).
+	'''
+	FREQ = {'daily': None, 'weekly': 'W', 'monthly': 'M'} # 交易频率 -> 分组的周期
+
+	def __init__(self, n_assets=100, years=5, seed=0, start='2010-01-01'):
+		if n_assets < 1 or years <= 0:
+			raise NameError('input error, n_assets and years must be positive')
+		self.n_assets = int(n_assets)
+		self.years = years
+		self.seed = seed
+		self.dates = pd.bdate_range(start, periods=max(2, int(round(252*years))))
+		self.assets = pd.Index([f'A{i:05d}' for i in range(self.n_assets)], dtype=object)
+		self._returns = None
+
+	def returns(self):
+		'''
+		return: ndarray(日期 x 标的), 日收益率, 同一个对象多次调用结果相同
+		'''
+		if self._returns is None:
+			T, N = len(self.dates), self.n_assets
+			rng = np.random.default_rng([self.seed, 1])
+			beta = rng.uniform(0.5, 1.5, N)
+			market = rng.normal(0.0002, 0.01, T)
+			self._returns = market[:, None]*beta + rng.normal(0, 0.015, (T, N))
+			self._returns[0] = 0.
+		return self._returns
+
+	def prices(self):
+		'''
+		return: DataFrame(日期 x 标的), 从 100 开始的收盘价
+		'''
+		return pd.DataFrame(100*np.cumprod(1 + self.returns(), axis=0), index=self.dates, columns=self.assets)
+
+	def yield_curve(self):
+		'''
+		return: DataFrame, 列为 y10Y (10年国开) 和 y3Y3A (3年AAA中票) 的到期收益率, 单位为百分比
+		'''
+		T = len(self.dates)
+		rng = np.random.default_rng([self.seed, 2])
+		shock = rng.normal(0, 0.03, (T, 2))
+		level = np.empty((T, 2))
+		mean = np.array([3.5, 4.2])
+		level[0] = mean
+		for t in range(1, T):
+			level[t] = level[t - 1] + 0.01*(mean - level[t - 1]) + shock[t]
+		return pd.DataFrame(level, index=self.dates, columns=['y10Y', 'y3Y3A'])
+
+	def rate_sub(self):
+		'''
+		return: DataFrame, 一列 rate_sub, 10年国开与3年AAA的利差, 与 test.py 的因子相同
+		'''
+		curve = self.yield_curve()
+		return pd.DataFrame({'rate_sub': curve['y10Y'] - curve['y3Y3A']})
+
+	def cross_factor(self, ic=0.05):
+		'''
+		ic: 因子与下一日收益的相关程度
+		return: DataFrame(日期 x 标的), 横截面因子, 值越低下一日收益越高
+		'''
+		returns = self.returns()
+		rng = np.random.default_rng([self.seed, 3])
+		noise = rng.normal(size=returns.shape)
+		forward = np.zeros(returns.shape)
+		forward[:-1] = returns[1:] / returns.std()
+		return pd.DataFrame(noise - ic*forward, index=self.dates, columns=self.assets)
+
+	def calendar(self, freq='weekly'):
+		'''
+		freq: 'daily', 'weekly' 或 'monthly'
+		return: list, 交易日, 每周(月)最后一个交易日, 去掉第一个月以便因子覆盖交易日
+		'''
+		if freq not in self.FREQ:
+			raise NameError(f'freq {freq} error, please use {list(self.FREQ)}')
+		dates = pd.Series(self.dates, index=self.dates)
+		if freq == 'daily':
+			days = dates
+		else:
+			days = dates.groupby(dates.index.to_period(self.FREQ[freq])).max()
+		days = pd.DatetimeIndex(days.to_numpy())
+		return list(days[days > self.dates[0] + pd.Timedelta(days=30)])
@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from Analytics import Analytics
+from BackTest import BackTest
+
+
+class WalkForward():
+	'''
+	滚动的样本内 / 样本外回测.
+	交易日按 train 个样本内交易日 + test 个样本外交易日切成多段, 每段向后移动 test 个交易日, 样本外首尾相接.
+	因子对齐和打分只在完整区间上计算一次(每个因子窗口一次), 各段通过 BackTest.subset 取切片视图, 在线程池中并行计算收益.
+	设置多个候选参数时, 每段在样本内选出 metric 最高的参数用于样本外, 样本外的净值首尾相接成一条曲线.
+
+	候选参数:
+		number_of_longs, number_of_groups: BackTest 的同名参数
+		window, n: 打分前对因子做滚动 Zscore (BackTest.set_factor_z_score), 不设置 window 时使用原始因子
+	'''
+	def __init__(self, underlying, df_factors, trade_date, train=52, test=13, init_cash=1e8, engine='fast'):
+		if not isinstance(trade_date, list):
+			raise NameError('input error, please load trade date [list]')
+		if train < 1 or test < 1:
+			raise NameError('train and test window must be positive')
+		self.underlying = underlying
+		self.df_factors = df_factors
+		self.trade_date = list(trade_date)
+		self.train = int(train)
+		self.test = int(test)
+		self.init_cash = init_cash
+		self.engine = engine
+		self.oos_values = None # 样本外拼接的净值, 列为策略名称
+		self._bases = {} # 因子窗口 -> 完整区间上打过分的 BackTest
+
+	def folds(self):
+		'''
+		return: list of (train_start, test_start, test_stop), 交易日的位置
+		'''
+		result = []
+		start = 0
+		while start + self.train < len(self.trade_date):
+			test_start = start + self.train
+			result.append((start, test_start, min(test_start + self.test, len(self.trade_date))))
+			start += self.test
+		if len(result) == 0:
+			raise NameError('trade date too short for one train and test window')
+		return result
+
+	def run(self, candidates=None, metric='sharpe', leg='LONG', threads=None):
+		'''
+		candidates: list of dict, 候选参数, 默认只有 BackTest 的默认参数
+		metric, leg: 样本内按 Analytics.summary 中 leg 策略的 metric 选择参数, 越大越好
+		threads: 线程数, 默认为 CPU 个数
+		return: DataFrame, 每段一行, 包含区间、选中的参数、样本内指标和样本外指标
+		'''
+		candidates = [{}] if candidates is None else list(candidates)
+		if len(candidates) == 0:
+			raise NameError('input error, candidates is empty')
+		for config in candidates:
+			self._base(config) # 在主线程中先完成所有打分
+		folds = self.folds()
+		with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+			results = list(pool.map(lambda fold: self._run_fold(fold, candidates, metric, leg), folds))
+
+		legs = [c for c in results[0]['values'].columns if all(c in r['values'].columns for r in results)]
+		self.oos_values = self._stitch([r['values'][legs] for r in results], self.init_cash)
+		rows = []
+		for (start, test_start, test_stop), r in zip(folds, results):
+			info = Analytics.summary(r['values'][legs].iloc[:test_stop - test_start]).loc[leg]
+			rows.append(dict({'train_start': self.trade_date[start], 'test_start': self.trade_date[test_start],
+							  'test_end': self.trade_date[test_stop - 1], 'config': r['config'],
+							  f'train_{metric}': r['score']},
+							 **{f'test_{k}': info[k] for k in ['total_return', 'annual_return', 'sharpe', 'max_drawdown']}))
+		return pd.DataFrame(rows)
+
+	def _base(self, config):
+		key = (config.get('window'), config.get('n', 5.2))
+		if key not in self._bases:
+			tester = BackTest(init_cash=self.init_cash, engine=self.engine)
+			if key[0] is not None:
+				tester.set_factor_z_score(window=key[0], n=key[1])
+			tester.underlying = self.underlying
+			tester.trade_date = self.trade_date
+			tester.df_factors = self.df_factors
+			# 完整区间的打分只计算一次, 各段由 subset 取切片
+			tester._calculate_score()
+			self._bases[key] = tester
+		return self._bases[key]
+
+	def _backtest(self, config, start, stop):
+		fold = self._base(config).subset(start, stop, number_of_longs=config.get('number_of_longs', 1),
+										 number_of_groups=config.get('number_of_groups'))
+		fold.runTest()
+		return fold.asset_values.astype(float)
+
+	def _run_fold(self, fold, candidates, metric, leg):
+		start, test_start, test_stop = fold
+		best, score = candidates[0], np.nan
+		if len(candidates) > 1:
+			scores = [Analytics.summary(self._backtest(config, start, test_start)).at[leg, metric] for config in candidates]
+			scores = np.where(np.isnan(scores), -np.inf, scores)
+			best, score = candidates[int(np.argmax(scores))], scores.max()
+		# 样本外多取下一段的第一个交易日, 使相邻两段之间的收益也计入拼接的净值
+		values = self._backtest(best, test_start, min(test_stop + 1, len(self.trade_date)))
+		return {'config': best, 'score': score, 'values': values}
+
+	@staticmethod
+	def _stitch(segments, init_cash):
+		'''
+		segments: 各段样本外的总资产, 相邻两段首尾日期重合
+		return: DataFrame, 从 init_cash 开始连续复利的净值
+		'''
+		curve = [segments[0] / segments[0].iloc[0]]
+		for values in segments[1:]:
+			curve.append(values.iloc[1:] / values.iloc[0] * curve[-1].iloc[-1])
+		return pd.concat(curve) * init_cash
@@ -0,0 +1,175 @@
+import pandas as pd
+import numpy as np
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from Account import Account, ArrayAccount
+from BackTest import BackTest
+from Factor import Factor
+from Rolling import RollingZScore
+from SyntheticMarket import SyntheticMarket
+
+# 性能测试, 使用 SyntheticMarket 生成的数据, 不需要 Wind 数据.
+#
+#	python benchmark.py --assets 10 100 1000 --years 1 5 --freq weekly daily --output benchmark.json
+#	python benchmark.py --baseline benchmark.json --output benchmark_new.json --tolerance 0.2
+#
+# 结果写成 json, 每个 (测试项, 标的个数, 年数, 频率) 一条记录;
+# 给出 --baseline 时与之前的结果比较, 耗时超过基准 (1 + tolerance) 倍的测试项视为退化, 返回码为 1.
+
+EVENT_LIMIT = 20000 # event 引擎逐笔交易, 交易日 x 持仓个数超过该值时跳过
+
+
+def timeit(func, repeat=3):
+	'''
+	return: (最短耗时, 中位数耗时), 单位秒
+	'''
+	seconds = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		seconds.append(time.perf_counter() - start)
+	return min(seconds), float(np.median(seconds))
+
+
+def cases(market, freq, number_of_longs=10, window=100):
+	'''
+	return: list of (测试项名称, 无参数的函数)
+	'''
+	prices = market.prices()
+	factor = market.cross_factor()
+	calendar = market.calendar(freq)
+	rate_sub = market.rate_sub()['rate_sub']
+	number_of_longs = min(number_of_longs, market.n_assets)
+	result = [
+		('Factor.extreme_MAD[cross-section]', lambda: Factor.extreme_MAD(factor, axis=1)),
+		('Factor.extreme_MAD[series]', lambda: Factor.extreme_MAD(rate_sub)),
+		('RollingZScore.transform', lambda: RollingZScore(window=window).transform(factor)),
+	]
+
+	def tester(engine):
+		t = BackTest(number_of_longs=number_of_longs, engine=engine)
+		t.underlying = prices
+		t.trade_date = calendar
+		t.df_factors = factor
+		return t
+
+	scored = tester('fast')
+	scored._calculate_score()
+	result.append(('BackTest._calculate_score', lambda: tester('fast')._calculate_score()))
+	result.append(('BackTest._calculate_profit[fast]', scored._calculate_profit))
+	if len(calendar) * number_of_longs <= EVENT_LIMIT:
+		event = tester('event')
+		event._calculate_score()
+		result.append(('BackTest._calculate_profit[event]', event._calculate_profit))
+
+	row = prices.iloc[-1]
+	names = list(prices.columns[:min(market.n_assets, 1000)])
+
+	def account_orders():
+		account = Account(cash=1e8)
+		account.set_price_table(row)
+		for name in names:
+			account.buy_stock_by_money(stock_name=name, money=1e8 / len(names) / 2)
+		for name in names:
+			account.order_stock_by_percent(stock_name=name, percent=0)
+
+	rng = np.random.default_rng(market.seed)
+	weights = rng.dirichlet(np.ones(market.n_assets), size=100) * 0.99
+
+	def array_rebalance():
+		account = ArrayAccount(prices.columns, cash=1e8)
+		account.set_price_table(row.to_numpy())
+		for w in weights:
+			account.rebalance_to_weights(w)
+
+	result.append(('Account.buy_stock_by_money+order_stock_by_percent', account_orders))
+	result.append(('ArrayAccount.rebalance_to_weights', array_rebalance))
+	return result
+
+
+def run(assets, years, freqs, repeat=3, seed=0, only=None):
+	records = []
+	for n_assets in assets:
+		for n_years in years:
+			market = SyntheticMarket(n_assets=n_assets, years=n_years, seed=seed)
+			for freq in freqs:
+				for name, func in cases(market, freq):
+					if only is not None and only not in name:
+						continue
+					best, median = timeit(func, repeat)
+					record = {'name': name, 'assets': n_assets, 'years': n_years, 'freq': freq,
+							  'seconds': best, 'median': median, 'repeat': repeat}
+					records.append(record)
+					print(f'{name:<52} {n_assets:>6} assets {n_years:>3}y {freq:<7} {best:10.4f}s')
+	return records
+
+
+def compare(records, baseline, tolerance=0.2, floor=1e-2):
+	'''
+	floor: 两次耗时都小于该值(秒)时视为噪声, 不比较
+	return: DataFrame, 每个测试项的耗时比值和是否退化
+	'''
+	def key(r):
+		return (r['name'], r['assets'], r['years'], r['freq'])
+	base = {key(r): r['seconds'] for r in baseline['results']}
+	rows = []
+	for r in records:
+		if key(r) not in base:
+			continue
+		old = base[key(r)]
+		ratio = r['seconds'] / old if old > 0 else np.inf
+		rows.append(dict(zip(['name', 'assets', 'years', 'freq'], key(r)), baseline=old, seconds=r['seconds'], ratio=ratio,
+						 regression=bool(ratio > 1 + tolerance and max(old, r['seconds']) >= floor)))
+	return pd.DataFrame(rows, columns=['name', 'assets', 'years', 'freq', 'baseline', 'seconds', 'ratio', 'regression'])
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Factor / Account / BackTest benchmarks on synthetic data')
+	parser.add_argument('--assets', type=int, nargs='+', default=[10, 100, 1000])
+	parser.add_argument('--years', type=float, nargs='+', default=[1, 5])
+	parser.add_argument('--freq', nargs='+', default=['weekly', 'daily'], choices=list(SyntheticMarket.FREQ))
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--only', default=None, help='only run cases whose name contains this text')
+	parser.add_argument('--output', default='benchmark.json')
+	parser.add_argument('--baseline', default=None, help='previous output to compare against')
+	parser.add_argument('--tolerance', type=float, default=0.2)
+	parser.add_argument('--floor', type=float, default=1e-2, help='ignore cases faster than this many seconds')
+	args = parser.parse_args(argv)
+
+	# 先读入基准, 输出文件不能覆盖基准
+	baseline = None
+	if args.baseline is not None:
+		if os.path.abspath(args.output) == os.path.abspath(args.baseline):
+			raise NameError('output file is the baseline, please set another --output')
+		with open(args.baseline, encoding='utf-8') as f:
+			baseline = json.load(f)
+
+	records = run(args.assets, [int(y) if float(y).is_integer() else y for y in args.years], args.freq,
+				  repeat=args.repeat, seed=args.seed, only=args.only)
+	result = {
+		'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+				 'numpy': np.__version__, 'pandas': pd.__version__, 'platform': platform.platform(), 'seed': args.seed},
+		'results': records,
+	}
+	with open(args.output, 'w', encoding='utf-8') as f:
+		json.dump(result, f, indent=1, ensure_ascii=False)
+
+	if baseline is not None:
+		report = compare(records, baseline, tolerance=args.tolerance, floor=args.floor)
+		with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+			print(report)
+		if report['regression'].any():
+			print(f"{int(report['regression'].sum())} regression(s) beyond {args.tolerance:.0%}")
+			return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
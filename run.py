@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# 按配置文件运行回测, 不需要修改 test.py.
+#
+#	python run.py configs/rate_sub.toml configs/credit.yaml --output results --threads 2
+#	python run.py --check-imports
+#
+# 一次运行多个配置, 每个配置是一个投资范围, 在同一进程中用 UniverseRunner 计算, 源文件经 DataStore 缓存;
+# 每个配置的结果写到 <output>/<name>/ 下的 asset_values.csv 和 performance.csv, --plot 时另存净值图.
+#
+# 本模块导入时只加载标准库, pandas / BackTest / DataStore 在读取配置之后才导入, matplotlib 和 PyYAML 只在用到时导入;
+# --check-imports 在新的解释器中测量 import BackTest 等模块的耗时, 超过 IMPORT_BUDGET 或导入时有副作用(创建文件、配置日志)时返回码为 1.
+#
+# 配置文件(TOML 或 YAML, 键相同), 相对路径相对于运行目录:
+#
+#	name = "rate_sub"                       # 默认为文件名
+#	number_of_longs = 1                     # 以及 init_cash, number_of_groups, engine, ledger
+#	z_score = [100, 5.2]                    # 见 BackTest.set_factor_z_score
+#	rebalance = {band = 0.02, lot_size = 100, cost = {buy_rate = 0.0003}}  # 见 Rebalancer, CostModel
+#	cache = "./cache/backtest"              # ResultCache 的目录, 默认不缓存
+#
+#	[underlying]                            # 标的价格, 表格的键见 _read_table
+#	path = "wind_data/指数数据/close.csv"
+#	index_col = "DateTime"
+#	dropna = true
+#	rename = {"CBA02551.CS" = "国开7-10年", "CBA04221.CS" = "信用3A1-3年"}
+#	columns = ["国开7-10年", "信用3A1-3年"]
+#
+#	[calendar]                              # 因子对齐的标的日期: underlying 的日期在 start..end 之间的部分, 默认全部
+#	start = "2014-12-15"
+#	end = "2022-08-14"
+#
+#	[trade_date]                            # 交易日, 取 column 列(默认为索引)
+#	path = "wind_data/日期序列/weekly.csv"
+#	index_col = 0
+#	column = "DateTime"
+#
+#	[sources.y10Y]                          # 因子用到的数据, 每个取一列
+#	path = "wind_data/到期收益率/中债国开债收益率曲线-全.xlsx"
+#	index_col = 0
+#	column = "中债国开债到期收益率10年"
+#	query = "中债国开债到期收益率10年 != 0"
+#
+#	[factors.rate_sub]                      # expr 为 sources 之间的表达式(DataFrame.eval), 默认为与因子同名的 source
+#	expr = "y10Y - y3Y3A"
+#	steps = [{op = "delay", window = 1}, {op = "rolling_z_score", window = 100}]  # 见 STEPS
+
+IMPORT_BUDGET = {'BackTest': 0.1, 'Factor': 0.1, 'run': 0.05} # 模块自身的导入耗时上限(秒), 不含 numpy / pandas
+BACKTEST_OPTIONS = ['init_cash', 'number_of_longs', 'number_of_groups', 'engine', 'ledger']
+# 因子处理步骤: 名称 -> Factor 的方法
+STEPS = {'delay': 'set_delay', 'winsorize': 'winsorize', 'rolling_z_score': 'calculate_rolling_z_score',
+		 'seasonal': 'calculate_seasonal'}
+
+
+def load_config(path):
+	'''
+	return: dict, 配置文件的内容, name 默认为文件名
+	'''
+	extension = os.path.splitext(path)[1].lower()
+	if extension == '.toml':
+		import tomllib
+		with open(path, 'rb') as f:
+			config = tomllib.load(f)
+	elif extension in ('.yaml', '.yml'):
+		try:
+			import yaml
+		except ImportError as e:
+			raise NameError('reading yaml config requires PyYAML, please use a toml config instead') from e
+		with open(path, encoding='utf-8') as f:
+			config = yaml.safe_load(f)
+	else:
+		raise NameError(f'input error, config {path} is not toml or yaml')
+	if not isinstance(config, dict):
+		raise NameError(f'input error, config {path} is not a mapping')
+	config.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+	unknown = set(config) - set(BACKTEST_OPTIONS) - {'name', 'z_score', 'rebalance', 'cache', 'underlying', 'calendar',
+													  'trade_date', 'sources', 'factors'}
+	if len(unknown) > 0:
+		raise NameError(f'input error, unknown settings {sorted(unknown)} in {path}')
+	for key in ['underlying', 'trade_date', 'factors']:
+		if key not in config:
+			raise NameError(f'input error, {key} not set in {path}')
+	return config
+
+
+def build_universe(config, store):
+	'''
+	读取一个配置的数据, 返回 UniverseRunner 的设置; 因子在各自线程中按 Context 的日期对齐
+	'''
+	import pandas as pd
+	from Rebalance import Rebalancer, CostModel
+	from ResultCache import ResultCache
+
+	underlying = _read_table(store, config['underlying'])
+	calendar = underlying.index
+	if 'calendar' in config:
+		calendar = calendar[(calendar >= pd.Timestamp(config['calendar'].get('start', calendar[0])))
+							& (calendar <= pd.Timestamp(config['calendar'].get('end', calendar[-1])))]
+	trade_date = _read_table(store, config['trade_date'], date_index=False)
+	trade_date = trade_date.index if 'column' not in config['trade_date'] else trade_date.iloc[:, 0]
+	trade_date = pd.DatetimeIndex(trade_date).astype('datetime64[ns]')
+	sources = {name: _read_table(store, spec).iloc[:, 0].rename(name) for name, spec in config.get('sources', {}).items()}
+
+	spec = {k: config[k] for k in BACKTEST_OPTIONS if k in config}
+	spec.update(underlying=underlying, trade_date=list(trade_date), calendar=calendar,
+				df_factors=lambda context: build_factors(config['factors'], sources, context))
+	if 'z_score' in config:
+		spec['z_score'] = tuple(config['z_score'])
+	if 'rebalance' in config:
+		rebalance = dict(config['rebalance'])
+		cost = rebalance.pop('cost', None)
+		spec['rebalance'] = Rebalancer(cost=None if cost is None else CostModel(**cost), **rebalance)
+	if config.get('cache'):
+		spec['cache'] = ResultCache(config['cache']) if isinstance(config['cache'], str) else ResultCache()
+	return spec
+
+
+def build_factors(factors, sources, context):
+	'''
+	factors: dict, 因子名称 -> {expr, steps}
+	sources: dict, 名称 -> Series
+	return: DataFrame, 按 context 的日期对齐的因子
+	'''
+	import pandas as pd
+	from Factor import Factor
+
+	frame = pd.concat(list(sources.values()), axis=1, join='inner') if len(sources) > 0 else pd.DataFrame()
+	columns = []
+	for name, spec in factors.items():
+		expr = spec.get('expr', name)
+		if expr not in frame.columns:
+			expr = frame.eval(expr)
+		series = frame[expr] if isinstance(expr, str) else expr
+		factor = Factor(df_series=series, name=name, copy=False, context=context)
+		for step in spec.get('steps', []):
+			step = dict(step)
+			op = step.pop('op', None)
+			if op not in STEPS:
+				raise NameError(f'input error, unknown factor step {op}, please use one of {list(STEPS)}')
+			getattr(factor, STEPS[op])(**step)
+		columns.append(factor.get_factor())
+	return pd.concat(columns, axis=1)
+
+
+def _read_table(store, spec, date_index=True):
+	'''
+	spec: dict
+		path: csv / xlsx 文件, 经 DataStore 缓存
+		index_col, sheet_name, parse_dates: 传给读取函数
+		column / columns: 需要的列; rename: 列名映射, 之后 columns 使用新的列名
+		query: DataFrame.query 的筛选条件, 例如去掉为 0 的行
+		dropna: 是否去掉有缺失的行
+	'''
+	spec = dict(spec)
+	path = spec.pop('path')
+	rename = spec.pop('rename', None)
+	columns = spec.pop('columns', None)
+	column = spec.pop('column', None)
+	query = spec.pop('query', None)
+	dropna = spec.pop('dropna', False)
+	if path.lower().endswith(('.xlsx', '.xls')):
+		df = store.read_excel(path, date_index=date_index, **spec)
+	else:
+		df = store.read_csv(path, date_index=date_index, **spec)
+	if rename is not None:
+		df = df.rename(rename, axis='columns')
+	if column is not None:
+		columns = [column]
+	if columns is not None:
+		df = df[columns]
+	if query is not None:
+		df = df.query(query)
+	if dropna:
+		df = df.dropna(axis=0)
+	return df
+
+
+def save_results(tester, directory, plot=False):
+	os.makedirs(directory, exist_ok=True)
+	tester.asset_values.to_csv(os.path.join(directory, 'asset_values.csv'))
+	performance = tester.performance()
+	performance.to_csv(os.path.join(directory, 'performance.csv'))
+	if plot:
+		import matplotlib
+		matplotlib.use('Agg') # 批量运行时不弹出窗口, 直接保存
+		import matplotlib.pyplot as plt
+		ax = tester.asset_values.plot()
+		ax.figure.savefig(os.path.join(directory, 'asset_values.png'))
+		plt.close(ax.figure)
+	return performance
+
+
+def check_imports(budget=None, repeat=3):
+	'''
+	在新的解释器中导入各模块, 先导入 numpy 和 pandas, 只计算模块自身的耗时, 取 repeat 次中的最短时间.
+	同时检查导入时没有副作用: 不在运行目录创建文件, 不配置 logging; 导入 run 时不加载 pandas.
+	return: dict, 模块 -> {seconds, budget, files, handlers, pandas, ok}
+	'''
+	import subprocess
+	import tempfile
+
+	budget = IMPORT_BUDGET if budget is None else budget
+	root = os.path.dirname(os.path.abspath(__file__))
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]).rstrip(os.pathsep))
+	result = {}
+	for module, limit in budget.items():
+		preload = '' if module == 'run' else 'import numpy, pandas'
+		code = (f'import json, logging, os, sys, time\n{preload}\n'
+				f'start = time.perf_counter()\nimport {module}\nseconds = time.perf_counter() - start\n'
+				'print(json.dumps({"seconds": seconds, "files": sorted(os.listdir(".")),'
+				' "handlers": len(logging.root.handlers), "pandas": "pandas" in sys.modules}))')
+		runs = []
+		for _ in range(repeat):
+			with tempfile.TemporaryDirectory() as cwd:
+				out = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True)
+			if out.returncode != 0:
+				raise NameError(f'import {module} failed:\n{out.stderr}')
+			runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+		record = min(runs, key=lambda r: r['seconds'])
+		record['budget'] = limit
+		record['ok'] = (record['seconds'] <= limit and len(record['files']) == 0 and record['handlers'] == 0
+						and (module != 'run' or not record['pandas']))
+		result[module] = record
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Run backtests from toml / yaml strategy configs')
+	parser.add_argument('configs', nargs='*', help='strategy config files, each is one universe')
+	parser.add_argument('--output', default='results')
+	parser.add_argument('--threads', type=int, default=None, help='universes computed at the same time, default cpu count')
+	parser.add_argument('--cache-dir', default='./cache', help='DataStore cache of the csv / xlsx sources')
+	parser.add_argument('--log-dir', default='./log', help='each universe logs to <log-dir>/<name>.log')
+	parser.add_argument('--plot', action='store_true', help='also save asset_values.png (needs matplotlib)')
+	parser.add_argument('--check-imports', action='store_true', help='check import time budget and side effects, then exit')
+	args = parser.parse_args(argv)
+
+	if args.check_imports:
+		failed = 0
+		for module, record in check_imports().items():
+			print(f"import {module:<10} {record['seconds'] * 1e3:8.1f} ms  budget {record['budget'] * 1e3:6.1f} ms  "
+				  f"files {record['files']}  handlers {record['handlers']}  {'ok' if record['ok'] else 'FAILED'}")
+			failed += not record['ok']
+		return 1 if failed else 0
+	if len(args.configs) == 0:
+		parser.error('no config given')
+
+	if args.plot:
+		import matplotlib # 缺少 matplotlib 时在计算之前报错
+	start = time.perf_counter()
+	configs = [load_config(path) for path in args.configs]
+	names = [config['name'] for config in configs]
+	if len(set(names)) < len(names):
+		raise NameError(f'input error, duplicated config names {names}')
+	from Context import UniverseRunner
+	from DataStore import DataStore
+
+	store = DataStore(cache_dir=args.cache_dir)
+	universes = {config['name']: build_universe(config, store) for config in configs}
+	runner = UniverseRunner(threads=args.threads, log_dir=args.log_dir)
+	testers = runner.run(universes)
+	for name in names:
+		if name in runner.errors:
+			print(f'{name}: failed, {runner.errors[name]!r}')
+			continue
+		performance = save_results(testers[name], os.path.join(args.output, name), plot=args.plot)
+		print(f'{name}:')
+		print(performance.to_string())
+	print(f'{len(testers)} / {len(names)} configs finished in {time.perf_counter() - start:.2f}s')
+	return 1 if len(runner.errors) > 0 else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
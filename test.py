@@ -2,26 +2,32 @@ import pandas as pd
 
 import os
 
+from Context import configure_logging
+from DataStore import DataStore
+
+configure_logging('./log', 'backtest.log')
+
 code_to_name = {'CBA02521.CS':'国开1-3年',
                 'CBA02551.CS':'国开7-10年',
                 'CBA04221.CS':'信用3A1-3年',
                 'CBA04251.CS':'信用3A7-10年'}
 
-df_index = pd.read_csv('./wind_data/指数数据/close.csv')
-df_index['DateTime'] = df_index['DateTime'].astype('datetime64[ns]')
-df_index = df_index.set_index('DateTime')
+# 第一次运行时转换成列式缓存, 之后直接读取缓存
+store = DataStore(cache_dir='./cache')
+
+df_index = store.read_csv('./wind_data/指数数据/close.csv', index_col='DateTime', date_index=True)
 df_index = df_index[sorted(df_index.columns.to_list())]
 df_index = df_index.dropna(axis=0)
 df_index = df_index.rename(code_to_name, axis='columns')
 
 
-ytm_3y3A = pd.read_excel('./wind_data/到期收益率/中债中短期票据收益率曲线-全.xlsx', index_col=0)
+ytm_3y3A = store.read_excel('./wind_data/到期收益率/中债中短期票据收益率曲线-全.xlsx', index_col=0, date_index=True,
+                            columns=['中债中短期票据到期收益率3年AAA'])
 ytm_3y3A = ytm_3y3A.query('中债中短期票据到期收益率3年AAA!=0')
-ytm_3y3A.index = ytm_3y3A.index.astype('datetime64[ns]')
 
-ytm_10y = pd.read_excel('./wind_data/到期收益率/中债国开债收益率曲线-全.xlsx', index_col=0)
+ytm_10y = store.read_excel('./wind_data/到期收益率/中债国开债收益率曲线-全.xlsx', index_col=0, date_index=True,
+                           columns=['中债国开债到期收益率10年'])
 ytm_10y = ytm_10y.query('中债国开债到期收益率10年!=0')
-ytm_10y.index = ytm_10y.index.astype('datetime64[ns]')
 ytm_10y = ytm_10y.loc[ytm_3y3A.index]
 
 df_increase_rate = pd.DataFrame(index=ytm_3y3A.index)
@@ -44,7 +50,7 @@ import matplotlib.pyplot as plt
 
 tester = BackTest()
 
-df_date_weekly = pd.read_csv('./wind_data/日期序列/weekly.csv', index_col=0)
+df_date_weekly = store.read_csv('./wind_data/日期序列/weekly.csv', index_col=0, parse_dates=['DateTime'])
 df_date_weekly['DateTime'] = df_date_weekly['DateTime'].astype('datetime64[ns]')
 
 tester.underlying = df_index[['国开7-10年','信用3A1-3年']]
@@ -0,0 +1,49 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Account import ArrayAccount
+
+
+def sequential(account, weights, order):
+	'''
+	向量化之前的调仓: 先逐个卖出不在目标中的标的, 再按顺序对目标标的调用 buy_stock_by_money
+	'''
+	total_asset = account.get_total_asset()
+	for i in np.flatnonzero((account.positions != 0) & (weights == 0)):
+		account.sell_stock_by_money(account.assets[i], account.positions[i] * account.prices[i])
+	for i in order:
+		account.buy_stock_by_money(account.assets[i], weights[i] * total_asset)
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_rebalance_to_weights_matches_per_stock(reverse):
+	rng = np.random.default_rng(1)
+	assets = [f'S{i}' for i in range(6)]
+	days = 12
+	prices = 10 * np.exp(np.cumsum(rng.normal(0, 0.05, (days, len(assets))), axis=0))
+	fast, slow = ArrayAccount(assets, cash=1e6), ArrayAccount(assets, cash=1e6)
+	clamped = False
+	for t in range(days):
+		weights = np.where(rng.random(len(assets)) < 0.5, rng.random(len(assets)), 0.)
+		weights = weights / max(weights.sum(), 1e-12) * rng.uniform(0.8, 1.)
+		price = prices[t].copy()
+		# 停牌: 既不持有也不在目标中的标的价格缺失
+		idle = np.flatnonzero((fast.positions == 0) & (weights == 0))
+		if len(idle) > 0:
+			price[idle[0]] = np.nan
+		order = np.flatnonzero(weights > 0)
+		if reverse:
+			order = order[::-1]
+		for account in (fast, slow):
+			account.set_price_table(pd.Series(price, index=assets))
+		total_asset = fast.get_total_asset()
+		trade = fast.rebalance_to_weights(weights, order=order)
+		sequential(slow, weights, order)
+		# 排在前面的买入先于后面标的的卖出, 现金不足时买入被截断, 持仓低于目标
+		clamped |= (weights[order] * total_asset - fast.positions[order] * price[order] > 1e-6).any()
+		np.testing.assert_allclose(fast.positions, slow.positions, rtol=1e-9, atol=1e-9)
+		assert fast.cash == pytest.approx(slow.cash, rel=1e-9, abs=1e-6)
+		assert fast.cash >= -1e-6
+	assert clamped
@@ -0,0 +1,63 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Analytics import Analytics
+
+
+def values():
+	# 自然日, 4 天, 每年 365 期
+	index = pd.date_range('2020-01-01', periods=5).astype('datetime64[ns]')
+	return pd.DataFrame({'A': [100., 110., 99., 105., 120.], 'B': [100., 90., 80., 85., 95.]}, index=index)
+
+
+WEIGHTS = {'A': np.array([[1., 0.], [0., 1.], [0.5, 0.5], [0.5, 0.5], [0., 1.]])}
+
+
+def test_max_drawdown():
+	dd = Analytics.max_drawdown(values())
+	assert dd.at['A', 'max_drawdown'] == pytest.approx(0.1)
+	assert dd.at['A', 'drawdown_start'] == pd.Timestamp('2020-01-02')
+	assert dd.at['A', 'drawdown_trough'] == pd.Timestamp('2020-01-03')
+	assert dd.at['A', 'drawdown_recovery'] == pd.Timestamp('2020-01-05')
+	assert dd.at['B', 'max_drawdown'] == pytest.approx(0.2)
+	assert dd.at['B', 'drawdown_start'] == pd.Timestamp('2020-01-01')
+	assert dd.at['B', 'drawdown_trough'] == pd.Timestamp('2020-01-03')
+	assert pd.isna(dd.at['B', 'drawdown_recovery'])
+
+
+def test_turnover():
+	# 0.5 * (|−1| + |1|) = 1, 0.5, 0, 0.5
+	assert Analytics.turnover(WEIGHTS)['A'] == pytest.approx(0.5)
+	assert np.isnan(Analytics.turnover({'A': np.ones((1, 2))})['A'])
+
+
+def test_summary():
+	info = Analytics.summary(values(), weights=WEIGHTS)
+	assert info.attrs['periods_per_year'] == pytest.approx(365)
+	a = info.loc['A']
+	assert a['total_return'] == pytest.approx(0.2)
+	assert a['annual_return'] == pytest.approx(0.2 * 365 / 4)
+	assert a['cagr'] == pytest.approx(1.2 ** (365 / 4) - 1)
+	ret = np.array([0.1, -0.1, 105 / 99 - 1, 120 / 105 - 1])
+	assert a['volatility'] == pytest.approx(ret.std(ddof=1) * np.sqrt(365))
+	assert a['sharpe'] == pytest.approx(0.2 * 365 / 4 / a['volatility'])
+	assert a['max_value'] == 120
+	assert a['calmar'] == pytest.approx(0.2 * 365 / 4 / 0.1)
+	assert a['turnover'] == pytest.approx(0.5)
+	assert a['annual_turnover'] == pytest.approx(0.5 * 365)
+	assert info.at['B', 'total_return'] == pytest.approx(-0.05)
+	assert np.isnan(info.at['B', 'turnover'])
+
+
+def test_rolling():
+	out = Analytics.rolling(values(), 3, weights=WEIGHTS)
+	assert out['return'].iloc[:2].isna().all().all()
+	# 2020-01-03 的窗口: 100, 110, 99
+	assert out.at[pd.Timestamp('2020-01-03'), ('return', 'A')] == pytest.approx(-0.01)
+	assert out.at[pd.Timestamp('2020-01-03'), ('max_drawdown', 'A')] == pytest.approx(0.1)
+	assert out.at[pd.Timestamp('2020-01-03'), ('calmar', 'A')] == pytest.approx(-0.01 * 365 / 2 / 0.1)
+	np.testing.assert_allclose(out[('turnover', 'A')].to_numpy(), [np.nan, np.nan, 0.75, 0.25, 0.25])
+	assert out[('turnover', 'B')].isna().all()
+	assert 'turnover' not in Analytics.rolling(values(), 3).columns.get_level_values(0)
@@ -0,0 +1,46 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from test_backtest import market, run
+
+
+@pytest.mark.parametrize('kwargs', [dict(number_of_longs=2, number_of_groups=3), dict(number_of_longs=1, z_score=(50, 5.2))])
+def test_append_bar_matches_full_run(kwargs):
+	prices, factors, trade_date = market()
+	head, tail = trade_date[:-6], trade_date[-6:]
+	full = run('fast', prices, factors, trade_date, **kwargs)
+
+	cut = head[-1]
+	tester = run('fast', prices.loc[:cut], factors.loc[:cut], head, **kwargs)
+	last = cut
+	for date in tail:
+		# 上一个交易日之后到当日(含)的因子, 当日的因子只用于下一个交易日
+		rows = factors.loc[(factors.index > last) & (factors.index <= date)]
+		orders, value = tester.append_bar(date, prices.loc[date], rows)
+		pd.testing.assert_series_equal(value, full.asset_values.loc[date].astype(float), check_names=False, rtol=1e-9)
+		last = date
+	assert list(orders.index) == list(full.asset_values.columns)
+	pd.testing.assert_frame_equal(tester.asset_values.astype(float), full.asset_values.astype(float), rtol=1e-9)
+
+	# 历史表格不扩展, 再次 runTest 与增量之前的结果相同
+	assert tester.trade_date == head
+	before = run('fast', prices.loc[:cut], factors.loc[:cut], head, **kwargs)
+	tester.runTest()
+	pd.testing.assert_frame_equal(tester.asset_values.astype(float), before.asset_values.astype(float))
+
+
+def test_append_bar_rejects_event_engine():
+	prices, factors, trade_date = market(n_days=120)
+	tester = run('event', prices, factors, trade_date[:-1])
+	with pytest.raises(NameError):
+		tester.append_bar(trade_date[-1], prices.loc[trade_date[-1]])
+
+
+def test_append_bar_rejects_old_date():
+	prices, factors, trade_date = market(n_days=120)
+	tester = run('fast', prices, factors, trade_date[:-1])
+	tester.append_bar(trade_date[-1], prices.loc[trade_date[-1]])
+	with pytest.raises(NameError):
+		tester.append_bar(trade_date[-1], prices.loc[trade_date[-1]])
@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from BackTest import BackTest
+
+
+def market(n_assets=6, n_days=400, seed=0):
+	'''
+	return: (价格, 横截面因子, 每周的交易日)
+	'''
+	rng = np.random.default_rng(seed)
+	days = pd.bdate_range('2018-01-01', periods=n_days)
+	columns = [f'S{i}' for i in range(n_assets)]
+	prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_days, n_assets)), axis=0)), index=days, columns=columns)
+	factors = pd.DataFrame(rng.normal(size=(n_days, n_assets)), index=days, columns=columns).rolling(10, min_periods=1).mean()
+	trade_date = list(days[30::5])
+	return prices, factors, trade_date
+
+
+def with_missing_prices(prices, factors, trade_date, seed=0):
+	'''
+	停牌: 交易日之间随机缺失的价格, 以及一个从不进入 LONG / SHORT 的标的在交易日缺失价格.
+	该标的的因子为其他标的的横截面中位数, 打分总在中间. event 引擎的 Account 无法对缺少价格的持仓估值和交易
+	(卖出后残留的极小持仓也需要价格), 持有过的标的在交易日的价格不能缺失
+	'''
+	rng = np.random.default_rng(seed)
+	prices, factors = prices.copy(), factors.copy()
+	prices['IDLE'] = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(prices))))
+	factors['IDLE'] = factors.median(axis=1)
+	trading = prices.index.isin(trade_date)
+	prices = prices.mask((rng.random(prices.shape) < 0.1) & ~trading[:, None])
+	prices.loc[trade_date[5::3], 'IDLE'] = np.nan
+	return prices, factors
+
+
+def run(engine, prices, factors, trade_date, **kwargs):
+	z_score = kwargs.pop('z_score', None)
+	tester = BackTest(engine=engine, **kwargs)
+	if z_score is not None:
+		tester.set_factor_z_score(*z_score)
+	tester.underlying = prices
+	tester.trade_date = trade_date
+	tester.df_factors = factors
+	tester.runTest()
+	return tester
+
+
+CASES = {
+	'long_only': dict(number_of_longs=1),
+	'long_short': dict(number_of_longs=2),
+	'groups': dict(number_of_longs=2, number_of_groups=3),
+	'z_score': dict(number_of_longs=2, z_score=(50, 5.2)),
+	'nan_prices': dict(number_of_longs=3, nan=True),
+	'nan_prices_groups': dict(number_of_longs=2, number_of_groups=2, nan=True),
+}
+
+
+@pytest.mark.parametrize('case', list(CASES))
+def test_fast_matches_event(case):
+	kwargs = dict(CASES[case])
+	nan = kwargs.pop('nan', False)
+	prices, factors, trade_date = market()
+	if nan:
+		prices, factors = with_missing_prices(prices, factors, trade_date)
+		assert prices.loc[trade_date, 'IDLE'].isna().any()
+	fast = run('fast', prices, factors, trade_date, **kwargs)
+	event = run('event', prices, factors, trade_date, **kwargs)
+
+	# event 引擎只有 LONG / SHORT
+	legs = ['LONG', 'SHORT']
+	pd.testing.assert_frame_equal(fast.asset_values[legs].astype(float), event.asset_values[legs].astype(float),
+								  rtol=1e-9, atol=0)
+	fast_weights, event_weights = fast._target_weights(), event._target_weights()
+	assert list(fast_weights) == list(event_weights)
+	for leg in fast_weights:
+		np.testing.assert_array_equal(fast_weights[leg], event_weights[leg])
+	if nan:
+		idle = prices.columns.get_loc('IDLE')
+		assert not (fast_weights['LONG'][:, idle] > 0).any() and not (fast_weights['SHORT'][:, idle] > 0).any()
+	assert fast._df_position.keys() == event._df_position.keys()
+	for day in fast._df_position:
+		assert fast._df_position[day].keys() == event._df_position[day].keys()
+		np.testing.assert_allclose(list(fast._df_position[day].values()), list(event._df_position[day].values()), rtol=1e-9)
+	pd.testing.assert_frame_equal(fast.performance().loc[legs], event.performance().loc[legs], rtol=1e-9, atol=1e-12)
+
+
+def fills(tester):
+	df = tester.ledger.to_frame()
+	df = df[df['leg'].isin(['LONG', 'SHORT']) & (df['shares'].abs() > 1e-6)] # 忽略 event 引擎卖出后的浮点残留
+	df = df.astype({'leg': str, 'asset': str})
+	return df.sort_values(['date', 'leg', 'asset']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('rebalance', [False, True])
+def test_ledger_fast_matches_event(rebalance):
+	from Rebalance import Rebalancer, CostModel
+	prices, factors, trade_date = market()
+	kwargs = dict(number_of_longs=2, ledger=True)
+	if rebalance:
+		kwargs['rebalance'] = Rebalancer(band=0.02, lot_size=100, cost=CostModel(0.001, 0.002, min_cost=5.))
+	fast = fills(run('fast', prices, factors, trade_date, **kwargs))
+	event = fills(run('event', prices, factors, trade_date, **kwargs))
+	assert len(fast) > 0
+	pd.testing.assert_frame_equal(fast.drop(columns='cash'), event.drop(columns='cash'), rtol=1e-9)
+	assert (fast['cost'] > 0).any() == rebalance
+
+
+def test_asof_index_matches_scan():
+	rng = np.random.default_rng(5)
+	factor_date = pd.DatetimeIndex(np.sort(rng.choice(pd.date_range('2020-01-01', periods=200), 80, replace=False)))
+	trade_date = pd.date_range('2019-12-25', periods=60, freq='3D')
+	got = BackTest.asof_index(factor_date, trade_date)
+	# 逐个交易日向前查找严格早于交易日的最后一个因子日期
+	expected = [max([j for j, d in enumerate(factor_date) if d < day], default=-1) for day in trade_date]
+	np.testing.assert_array_equal(got, expected)
+
+
+def test_align_factors_uses_previous_factor_date():
+	prices, factors, trade_date = market(n_days=120)
+	factors = factors.iloc[::3]
+	tester = BackTest()
+	tester.underlying = prices
+	tester.trade_date = trade_date
+	tester.df_factors = factors
+	aligned = tester._align_factors()
+	for day in trade_date:
+		previous = factors.index[factors.index < day][-1]
+		pd.testing.assert_series_equal(aligned.loc[day], factors.loc[previous], check_names=False)
+	tester.trade_date = [factors.index[0]] + trade_date
+	with pytest.raises(NameError):
+		tester._align_factors()
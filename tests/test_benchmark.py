@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+import pytest
+
+import benchmark
+from SyntheticMarket import SyntheticMarket
+
+
+def test_synthetic_market_is_reproducible():
+	a, b = SyntheticMarket(n_assets=20, years=1, seed=3), SyntheticMarket(n_assets=20, years=1, seed=3)
+	assert a.prices().equals(b.prices())
+	assert a.cross_factor().equals(b.cross_factor())
+	assert not a.prices().equals(SyntheticMarket(n_assets=20, years=1, seed=4).prices())
+	# 因子越低下一日收益越高
+	factor, returns = a.cross_factor().to_numpy(), a.returns()
+	assert np.corrcoef(factor[:-1].ravel(), returns[1:].ravel())[0, 1] < 0
+	calendar = a.calendar('monthly')
+	assert calendar[0] > a.dates[0] and len(calendar) in (11, 12)
+
+
+def test_compare_flags_regressions():
+	baseline = {'results': [{'name': 'x', 'assets': 10, 'years': 1, 'freq': 'weekly', 'seconds': 1.},
+							{'name': 'y', 'assets': 10, 'years': 1, 'freq': 'weekly', 'seconds': 1e-4}]}
+	records = [dict(r, seconds=s) for r, s in zip(baseline['results'], [1.5, 1e-3])]
+	report = benchmark.compare(records, baseline, tolerance=0.2, floor=1e-2)
+	assert report['regression'].tolist() == [True, False] # 两次都低于 floor 的视为噪声
+
+
+def test_main_keeps_baseline(tmp_path, capsys):
+	args = ['--assets', '5', '--years', '0.3', '--freq', 'weekly', '--repeat', '1', '--only', 'RollingZScore']
+	baseline = tmp_path / 'baseline.json'
+	assert benchmark.main(args + ['--output', str(baseline)]) == 0
+	content = baseline.read_text(encoding='utf-8')
+	assert [r['name'] for r in json.loads(content)['results']] == ['RollingZScore.transform']
+	with pytest.raises(NameError):
+		benchmark.main(args + ['--output', str(baseline), '--baseline', str(baseline)])
+	assert baseline.read_text(encoding='utf-8') == content
+	assert benchmark.main(args + ['--output', str(tmp_path / 'new.json'), '--baseline', str(baseline),
+								  '--tolerance', '1e9']) == 0
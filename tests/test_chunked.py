@@ -0,0 +1,58 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Chunked import ChunkedPipeline
+from Factor import Factor, CrossSectionFactor
+
+
+WINDOW = 10
+
+
+@pytest.fixture
+def dates():
+	'''
+	Factor.get_factor 按 set_date_format 设置的全局日期对齐, 测试之后还原
+	'''
+	saved = Factor._underlying_date
+	days = list(pd.bdate_range('2020-01-01', periods=150).astype('datetime64[ns]'))
+	Factor.set_date_format(days)
+	yield pd.DatetimeIndex(days)
+	Factor._underlying_date = saved
+
+
+def source():
+	rng = np.random.default_rng(0)
+	# 因子日期不规则, 部分早于第一个交易日
+	days = pd.bdate_range('2019-12-01', periods=200)
+	days = days[rng.random(len(days)) < 0.7].astype('datetime64[ns]')
+	values = rng.standard_t(3, size=(len(days), 4))
+	values[rng.random(values.shape) < 0.02] = np.nan
+	return pd.DataFrame(values, index=days, columns=['a', 'b', 'c', 'd'])
+
+
+@pytest.mark.parametrize('rows', [4, WINDOW, 40])
+def test_matches_get_factor(dates, rows):
+	df = source()
+	columns = []
+	for c in df.columns:
+		factor = Factor(df[c])
+		factor.calculate_rolling_z_score(window=WINDOW)
+		factor.set_delay(1)
+		columns.append(factor.get_factor())
+	expected = pd.concat(columns, axis=1)
+
+	pipe = ChunkedPipeline(df, chunk=rows * len(df.columns)).rolling_z_score(WINDOW).shift(1).align(dates)
+	assert pipe.rows == rows
+	got = pipe.run()
+	pd.testing.assert_frame_equal(got.loc[dates], expected.loc[dates], rtol=1e-9, check_freq=False)
+
+
+@pytest.mark.parametrize('rows', [4, WINDOW, 40])
+def test_cross_section_after_align(dates, rows):
+	df = source()
+	aligned = df.reindex(df.index.union(dates)).ffill().bfill()
+	expected = CrossSectionFactor(aligned).extreme_MAD(n=3.).standardize_z().get_factor()
+	got = ChunkedPipeline(df, chunk=rows * len(df.columns)).align(dates).extreme_MAD(n=3.).standardize_z().run()
+	pd.testing.assert_frame_equal(got, expected, rtol=1e-9, check_freq=False)
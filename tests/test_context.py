@@ -0,0 +1,44 @@
+import logging
+import os
+
+import pandas as pd
+
+from Context import UniverseRunner
+from Factor import Factor
+
+from test_backtest import market, run
+
+
+def test_universes_are_isolated(tmp_path):
+	prices, factors, trade_date = market(n_days=300)
+	factors = factors.iloc[::5]
+	# 两个投资范围的标的日期不同, 因子按各自的日期(与因子日期的并集)对齐
+	calendars = {'rates': prices.index, 'credit': prices.index[::2]}
+	seen = {}
+
+	def build(context):
+		context.get_logger('Factor').info('building factors of %s', context.name)
+		frame = pd.concat([Factor(factors[c], context=context).get_factor() for c in factors.columns], axis=1)
+		seen[context.name] = frame.index
+		return frame
+
+	universes = {name: {'underlying': prices, 'trade_date': trade_date, 'calendar': calendar, 'df_factors': build,
+						'number_of_longs': 2} for name, calendar in calendars.items()}
+	runner = UniverseRunner(threads=2, log_dir=str(tmp_path))
+	root = list(logging.getLogger().handlers)
+	tests = runner.run(universes)
+	assert runner.errors == {}
+	assert logging.getLogger().handlers == root
+
+	for name, calendar in calendars.items():
+		dates = pd.DatetimeIndex(calendar).union(factors.index)
+		assert seen[name].equals(dates)
+		expected = run('event', prices, factors.reindex(dates).ffill().bfill(), trade_date, number_of_longs=2)
+		pd.testing.assert_frame_equal(tests[name].asset_values.astype(float), expected.asset_values.astype(float), rtol=1e-12)
+
+		with open(os.path.join(tmp_path, f'{name}.log'), encoding='utf-8') as f:
+			lines = f.read().splitlines()
+		other = next(n for n in calendars if n != name)
+		assert any(f'building factors of {name}' in line for line in lines)
+		assert any(f'context.{name}.Account' in line for line in lines) # event 引擎现金不足时的警告
+		assert not any(f'context.{other}' in line or f'of {other}' in line for line in lines)
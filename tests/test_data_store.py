@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from DataStore import DataStore
+
+
+def frame():
+	days = pd.bdate_range('2020-01-01', periods=8)
+	return pd.DataFrame({'close': np.linspace(10, 11, 8),
+						 'name': ['平安银行', 'A', None, 'B', 'C', 'D', 'E', 'F'],
+						 'listed': pd.date_range('2001-01-01', periods=8).astype('datetime64[ns]'),
+						 'volume': np.arange(8)}, index=pd.Index(days.strftime('%Y-%m-%d'), name='date'))
+
+
+def no_pickle(directory):
+	for root, _, files in os.walk(directory):
+		for name in files:
+			if name.endswith('.npy'):
+				# allow_pickle=False 时对象数组会报错
+				np.load(os.path.join(root, name), allow_pickle=False)
+
+
+def test_csv_round_trip(tmp_path):
+	df = frame()
+	path = tmp_path / 'data.csv'
+	df.to_csv(path)
+	store = DataStore(cache_dir=str(tmp_path / 'cache'))
+	expected = pd.read_csv(path, index_col=0, parse_dates=['listed'])
+	for _ in range(2):
+		# 第一次写缓存, 第二次读缓存
+		got = store.read_csv(path, index_col=0, parse_dates=['listed'])
+		pd.testing.assert_frame_equal(got, expected)
+	assert got.index.dtype == expected.index.dtype
+	assert got['listed'].dtype == expected['listed'].dtype
+	assert pd.isna(got.loc['2020-01-03', 'name'])
+	no_pickle(store.cache_dir)
+
+
+def test_csv_date_index_range(tmp_path):
+	df = frame()
+	path = tmp_path / 'data.csv'
+	df.to_csv(path)
+	store = DataStore(cache_dir=str(tmp_path / 'cache'))
+	got = store.read_csv(path, index_col=0, date_index=True, columns=['name', 'close'], start='2020-01-03', end='2020-01-07')
+	expected = pd.read_csv(path, index_col=0)[['name', 'close']]
+	expected.index = pd.to_datetime(expected.index).astype('datetime64[ns]')
+	pd.testing.assert_frame_equal(got, expected.loc['2020-01-03':'2020-01-07'])
+
+
+def test_xlsx_round_trip(tmp_path):
+	pytest.importorskip('openpyxl')
+	df = frame()
+	path = tmp_path / 'data.xlsx'
+	df.to_excel(path)
+	store = DataStore(cache_dir=str(tmp_path / 'cache'))
+	expected = pd.read_excel(path, index_col=0)
+	for _ in range(2):
+		pd.testing.assert_frame_equal(store.read_excel(path, index_col=0), expected)
+	no_pickle(store.cache_dir)
+
+
+def test_stale_source_rebuilds(tmp_path):
+	df = frame()
+	path = tmp_path / 'data.csv'
+	df.to_csv(path)
+	store = DataStore(cache_dir=str(tmp_path / 'cache'))
+	store.read_csv(path, index_col=0)
+	df['close'] = -df['close']
+	df.to_csv(path)
+	# 修改时间变化, 旧缓存不再使用
+	stat = os.stat(path)
+	os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+	got = store.read_csv(path, index_col=0)
+	np.testing.assert_array_equal(got['close'].to_numpy(), df['close'].to_numpy())
+	assert len(os.listdir(store.cache_dir)) == 2
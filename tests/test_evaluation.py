@@ -0,0 +1,61 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Evaluation import Evaluation
+
+
+def data(seed=0, dates=80, assets=9):
+	rng = np.random.default_rng(seed)
+	index = pd.bdate_range('2020-01-01', periods=dates)
+	columns = [f'S{i}' for i in range(assets)]
+	prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (dates, assets)), axis=0)), index=index, columns=columns)
+	prices[rng.random(prices.shape) < 0.05] = np.nan
+	factors = {}
+	for k in range(3):
+		values = np.round(rng.normal(size=(dates, assets)), 1) # 有相同的因子值
+		values[rng.random(values.shape) < 0.1] = np.nan
+		factors[f'f{k}'] = pd.DataFrame(values, index=index, columns=columns)
+	factors['f0'].iloc[7, 2:] = np.nan # 有效标的少于 min_assets
+	return prices, factors
+
+
+def forward(prices, h):
+	return prices.shift(-h) / prices - 1
+
+
+@pytest.mark.parametrize('chunk', [1, 1 << 24])
+def test_ic_matches_corrwith(chunk):
+	prices, factors = data()
+	ev = Evaluation(prices, factors, horizons=(1, 5), min_assets=3, chunk=chunk).run()
+	for name, df in factors.items():
+		for h in (1, 5):
+			y = forward(prices, h)
+			both = df.notna() & y.notna()
+			count = both.sum(axis=1)
+			ic = df.corrwith(y, axis=1).where(count >= 3)
+			# Rank IC: 共同有效的标的上按日期排名后的 Pearson 相关系数(即 Spearman)
+			rank_ic = df.where(both).rank(axis=1).corrwith(y.where(both).rank(axis=1), axis=1).where(count >= 3)
+			np.testing.assert_allclose(ev.ic[(name, h)].to_numpy(), ic.to_numpy(), atol=1e-10)
+			np.testing.assert_allclose(ev.rank_ic[(name, h)].to_numpy(), rank_ic.to_numpy(), atol=1e-10)
+
+
+def test_quantile_returns_match_groupby():
+	prices, factors = data()
+	quantiles = 4
+	ev = Evaluation(prices, factors, horizons=(5,), quantiles=quantiles).run()
+	for name, df in factors.items():
+		y = forward(prices, 5)
+		per_date = []
+		for day in df.index:
+			pair = pd.DataFrame({'x': df.loc[day], 'y': y.loc[day]}).dropna()
+			if len(pair) < 3:
+				continue
+			# 因子升序分组, 相同的因子值取平均排名
+			group = np.floor((pair['x'].rank() - 1) * quantiles / len(pair)).astype(int) + 1
+			per_date.append(pair['y'].groupby(group).mean().reindex(range(1, quantiles + 1)))
+		expected = pd.concat(per_date, axis=1).mean(axis=1)
+		got = ev.quantile_returns.loc[(name, 5)]
+		np.testing.assert_allclose(got[list(range(1, quantiles + 1))].to_numpy(dtype=float), expected.to_numpy(), atol=1e-12)
+		assert got['long_short'] == pytest.approx(expected[1] - expected[quantiles])
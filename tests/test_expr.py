@@ -0,0 +1,41 @@
+import pandas as pd
+import numpy as np
+
+from Expr import Expr, ExprCache
+
+
+def series(n, seed=0):
+	return pd.Series(np.random.default_rng(seed).normal(size=n), index=pd.date_range('2020-01-01', periods=n))
+
+
+def test_max_bytes_evicts_least_recently_used():
+	size = ExprCache._nbytes(series(1000))
+	cache = ExprCache(maxsize=100, max_bytes=int(2.5 * size))
+	for i in range(3):
+		cache.put(f'k{i}', series(1000, seed=i))
+	assert 'k0' not in cache and 'k1' in cache and 'k2' in cache
+	assert cache.nbytes == 2 * size <= cache.max_bytes
+	cache.get('k1')
+	cache.put('k3', series(1000, seed=3))
+	assert 'k2' not in cache and 'k1' in cache
+
+
+def test_oversized_result_is_not_cached():
+	cache = ExprCache(max_bytes=1000)
+	cache.put('big', series(1000))
+	assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_evaluate_with_byte_limit_matches_direct():
+	s = series(500)
+	cache = ExprCache(max_bytes=3 * ExprCache._nbytes(s))
+	expr = Expr.source(s).shift(1).rolling_z_score(window=20).ffill()
+	first = expr.evaluate(cache)
+	second = expr.evaluate(cache)
+	pd.testing.assert_series_equal(first, second)
+	assert cache.nbytes <= cache.max_bytes
+	cache.put('k', s)
+	cache.put('k', s) # 同一个键重复写入不重复计数
+	assert cache.nbytes == sum(ExprCache._nbytes(v) for v, _ in cache._data.values())
+	cache.clear()
+	assert cache.nbytes == 0
@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Factor import Factor, CrossSectionFactor
+
+
+def extreme_MAD_loop(df, n=5.2):
+	'''
+	向量化之前逐个元素处理的 Factor.extreme_MAD, 作为参考实现
+	'''
+	median = df.quantile(0.5)
+	new_median = (abs((df - median)).quantile(0.5))
+	up = median + n*new_median
+	down = median - n*new_median
+	abnormal_up_index = []
+	abnormal_down_index = []
+	li = df.to_numpy(dtype=float).copy()
+	for i in range(len(li)):
+		di = li[i]
+		if di <= down:
+			abnormal_down_index.append(i)
+		if di >= up:
+			abnormal_up_index.append(i)
+	if len(abnormal_down_index)>0:
+		rank_abnomal = pd.Series([li[i] for i in abnormal_down_index])
+		rank_abnomal = rank_abnomal.rank(ascending=False) # 降序
+		for i in range(len(abnormal_down_index)):
+			li[abnormal_down_index[i]] = down - new_median*(1./rank_abnomal.size)*rank_abnomal[i]
+	if len(abnormal_up_index)>0:
+		rank_abnomal = pd.Series([li[i] for i in abnormal_up_index])
+		rank_abnomal = rank_abnomal.rank(ascending=True)
+		for i in range(len(abnormal_up_index)):
+			li[abnormal_up_index[i]] = up + new_median*(1./rank_abnomal.size)*rank_abnomal[i]
+	return pd.Series(li, index=df.index, name=df.name)
+
+
+def random_series(rng, size, ties=False, nan=0.):
+	values = rng.standard_t(2, size=size) # 厚尾, 两侧都有极端值
+	if ties:
+		values = np.round(values)
+	values[rng.random(size) < nan] = np.nan
+	return pd.Series(values, index=pd.date_range('2020-01-01', periods=size), name='f')
+
+
+@pytest.mark.parametrize('ties', [False, True])
+@pytest.mark.parametrize('nan', [0., 0.2])
+@pytest.mark.parametrize('n', [1., 3., 5.2])
+def test_series_matches_loop(ties, nan, n):
+	rng = np.random.default_rng(int(ties) * 100 + int(nan * 10) * 10 + int(n))
+	for size in [1, 2, 5, 50, 300]:
+		s = random_series(rng, size, ties=ties, nan=nan)
+		pd.testing.assert_series_equal(Factor.extreme_MAD(s, n=n), extreme_MAD_loop(s, n=n), rtol=1e-12)
+
+
+@pytest.mark.parametrize('values', [
+	[1., 1., 1., 1.], # MAD 为 0
+	[1., 1., 1., 5., -3.], # 超过一半的值相同, MAD 为 0
+	[2., 2., np.nan, 2., 7.],
+	[np.nan, np.nan, np.nan],
+	[3., np.nan, 3., 3., 3., -1., 10., 10.],
+])
+def test_degenerate_series_matches_loop(values):
+	s = pd.Series(values, name='f')
+	pd.testing.assert_series_equal(Factor.extreme_MAD(s), extreme_MAD_loop(s), rtol=1e-12)
+
+
+def test_rank_average_matches_pandas():
+	rng = np.random.default_rng(0)
+	arr = np.round(rng.normal(size=(20, 30)))
+	arr[rng.random(arr.shape) < 0.1] = np.nan
+	expected = pd.DataFrame(arr).rank(axis=1).to_numpy()
+	np.testing.assert_array_equal(Factor._rank_average(arr), expected)
+
+
+@pytest.mark.parametrize('axis', [0, 1, 'index', 'columns'])
+def test_frame_axis_matches_loop(axis):
+	rng = np.random.default_rng(1)
+	df = pd.DataFrame(np.round(rng.standard_t(2, size=(60, 8)), 1),
+					  index=pd.date_range('2020-01-01', periods=60), columns=[f'S{i}' for i in range(8)])
+	df = df.mask(rng.random(df.shape) < 0.1)
+	df['S3'] = 1. # MAD 为 0 的列
+	df.iloc[5] = 2. # MAD 为 0 的行
+	result = Factor.extreme_MAD(df, n=3., axis=axis)
+	if axis in [0, 'index']:
+		expected = df.apply(lambda s: extreme_MAD_loop(s, n=3.), axis=0)
+	else:
+		expected = df.apply(lambda s: extreme_MAD_loop(s, n=3.), axis=1)
+	pd.testing.assert_frame_equal(result, expected, rtol=1e-12)
+
+
+def test_frame_axis_error():
+	with pytest.raises(NameError):
+		Factor.extreme_MAD(pd.DataFrame([[1., 2.]]), axis=2)
+
+
+def neutralize_lstsq(factor, size, industry, beta):
+	'''
+	逐个日期用 lstsq 回归: 行业哑变量 + 对数市值 + 其他暴露, 缺失的标的不参与回归
+	'''
+	out = pd.DataFrame(np.nan, index=factor.index, columns=factor.columns)
+	for day in factor.index:
+		with np.errstate(divide='ignore'):
+			y, s, g, b = factor.loc[day], np.log(size.loc[day]), industry.loc[day], beta.loc[day]
+		valid = y.notna() & np.isfinite(s) & g.notna() & b.notna()
+		dummies = pd.get_dummies(g[valid]).to_numpy(dtype=float)
+		X = np.column_stack([dummies, s[valid], b[valid]])
+		coef = np.linalg.lstsq(X, y[valid].to_numpy(), rcond=None)[0]
+		out.loc[day, valid] = y[valid].to_numpy() - X @ coef
+	return out
+
+
+def test_neutralize_matches_lstsq():
+	rng = np.random.default_rng(3)
+	index = pd.date_range('2020-01-01', periods=12)
+	columns = [f'S{i}' for i in range(15)]
+	factor = pd.DataFrame(rng.normal(size=(12, 15)), index=index, columns=columns)
+	size = pd.DataFrame(np.exp(rng.normal(3, 1, (12, 15))), index=index, columns=columns)
+	industry = pd.DataFrame(rng.choice(['银行', '地产', '电力'], (12, 15)), index=index, columns=columns).astype(object)
+	beta = pd.DataFrame(rng.normal(1, 0.2, (12, 15)), index=index, columns=columns)
+	factor[rng.random(factor.shape) < 0.1] = np.nan
+	size[rng.random(size.shape) < 0.1] = np.nan
+	industry[rng.random(industry.shape) < 0.1] = None
+	size.iloc[2, 0] = 0. # 对数为 -inf, 不参与回归
+	industry.iloc[4] = industry.iloc[4].replace('电力', None) # 某个日期缺少一个行业
+
+	got = CrossSectionFactor(factor).neutralize(size=size, industry=industry, exposures={'beta': beta}).get_factor()
+	expected = neutralize_lstsq(factor, size, industry, beta)
+	assert got.isna().equals(expected.isna())
+	np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(dtype=float), atol=1e-9, equal_nan=True)
+
+
+def test_neutralize_static_industry():
+	rng = np.random.default_rng(4)
+	index = pd.date_range('2020-01-01', periods=5)
+	columns = [f'S{i}' for i in range(10)]
+	factor = pd.DataFrame(rng.normal(size=(5, 10)), index=index, columns=columns)
+	size = pd.DataFrame(np.exp(rng.normal(3, 1, (5, 10))), index=index, columns=columns)
+	industry = pd.Series(['银行', '地产'] * 4 + [None, '银行'], index=columns[::-1])
+	got = CrossSectionFactor(factor).neutralize(size=size, industry=industry).get_factor()
+	panel = pd.DataFrame([industry.reindex(columns)] * 5, index=index)
+	expected = CrossSectionFactor(factor).neutralize(size=size, industry=panel).get_factor()
+	pd.testing.assert_frame_equal(got, expected, atol=1e-12)
+	assert got['S1'].isna().all() # 行业缺失
@@ -0,0 +1,48 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from BackTest import BackTest
+from Panel import Panel
+
+from test_backtest import market, run
+
+
+@pytest.mark.parametrize('columns', [
+	['A', 'B', 'C'],
+	[600000, 600001, 1],
+	pd.Index(['A', 'B', 'C'], dtype=object),
+	[1.5, 2.5, 3.5],
+	['A', 1, 2.5],
+])
+def test_labels_round_trip(tmp_path, columns):
+	df = pd.DataFrame(np.arange(12.).reshape(4, 3), index=pd.date_range('2020-01-01', periods=4).astype('datetime64[ns]'), columns=columns)
+	created = Panel.create(str(tmp_path / 'p'), df)
+	opened = Panel.open(str(tmp_path / 'p'))
+	for panel in [created, opened]:
+		pd.testing.assert_index_equal(panel.assets, df.columns)
+		pd.testing.assert_frame_equal(panel.to_frame(), df, check_freq=False)
+
+
+def test_unsupported_labels(tmp_path):
+	df = pd.DataFrame([[1., 2.]], index=pd.date_range('2020-01-01', periods=1), columns=[('A', 1), ('B', 2)])
+	with pytest.raises(NameError):
+		Panel.create(str(tmp_path / 'p'), df)
+
+
+def test_integer_columns_match_factors(tmp_path):
+	# 整数代码的标的, 面板的列仍与横截面因子的列匹配, 按因子打分而不是退回到利差规则
+	prices, factors, trade_date = market()
+	codes = list(range(600000, 600000 + prices.shape[1]))
+	prices.columns = codes
+	factors.columns = codes
+	panel = Panel.open(Panel.create(str(tmp_path / 'prices'), prices).path)
+	expected = run('fast', prices, factors, trade_date, number_of_longs=2)
+	tester = BackTest(number_of_longs=2)
+	tester.underlying = panel
+	tester.trade_date = trade_date
+	tester.df_factors = factors
+	tester.runTest()
+	pd.testing.assert_frame_equal(tester.df_score, expected.df_score)
+	pd.testing.assert_frame_equal(tester.asset_values, expected.asset_values)
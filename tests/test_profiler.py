@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+
+from BackTest import BackTest
+from Profiler import Profiler
+
+from test_backtest import market
+
+
+def test_log_counter_does_not_touch_root_logger():
+	prices, factors, trade_date = market()
+	tester = BackTest(engine='event', number_of_longs=2, profile=True)
+	tester.underlying = prices
+	tester.trade_date = trade_date
+	tester.df_factors = factors
+	root = logging.getLogger()
+	handlers = list(root.handlers)
+	tester.runTest()
+	assert tester.profile['counters'].get('log.warning', 0) > 0 # event 引擎现金不足时的 Account 警告
+	assert root.handlers == handlers
+	assert not any(type(h).__name__ == '_CountHandler' for h in logging.getLogger('Account').handlers)
+
+
+def test_log_counter_is_per_logger():
+	a, b = logging.getLogger('test_profiler.a.Account'), logging.getLogger('test_profiler.b.Account')
+	profiler = Profiler()
+	profiler.start(loggers=[logging.getLogger('test_profiler.a.BackTest'), a])
+	a.warning('counted')
+	b.warning('other universe') # 另一个线程中的回测
+	logging.getLogger('other').warning('not a backtest logger')
+	profiler.stop()
+	assert profiler.counters == {'log.warning': 1}
+	assert a.handlers == []
+
+
+def test_single_memory_profiler():
+	first, second = Profiler(memory=True), Profiler(memory=True)
+	first.start()
+	try:
+		with pytest.raises(NameError):
+			second.start()
+		Profiler().start() # 不测内存的 Profiler 不受限制
+	finally:
+		first.stop()
+	assert first.peak_memory is not None
+	second.start()
+	second.stop()
+
+
+def test_event_engine_counts_price_lookups():
+	prices, factors, trade_date = market()
+	tester = BackTest(engine='event', number_of_longs=2, profile=True)
+	tester.underlying = prices
+	tester.trade_date = trade_date
+	tester.df_factors = factors
+	tester.runTest()
+	counters = tester.profile['counters']
+	# 每个交易日 _handle_bar 对 LONG 目标中的每个标的查一次价格, 另外 Account 的查找
+	assert counters['loc'] > 2 * 2 * len(trade_date)
+	assert tester.profile['peak_memory'] is None
@@ -0,0 +1,68 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from BackTest import BackTest
+from Rebalance import Rebalancer, CostModel
+
+from test_backtest import market, run
+
+
+@pytest.mark.parametrize('engine', ['fast', 'event'])
+def test_default_matches_full_rebalance(engine):
+	prices, factors, trade_date = market()
+	full = run(engine, prices, factors, trade_date, number_of_longs=2)
+	diff = run(engine, prices, factors, trade_date, number_of_longs=2, rebalance=Rebalancer())
+	pd.testing.assert_frame_equal(diff.asset_values.astype(float), full.asset_values.astype(float), rtol=1e-9)
+
+
+def test_fast_matches_event_with_band_lots_and_cost():
+	prices, factors, trade_date = market()
+	rebalancer = Rebalancer(band=0.02, lot_size=100, cost=CostModel(0.001, 0.002, min_cost=5.))
+	fast = run('fast', prices, factors, trade_date, number_of_longs=2, rebalance=rebalancer)
+	event = run('event', prices, factors, trade_date, number_of_longs=2, rebalance=rebalancer)
+	legs = ['LONG', 'SHORT']
+	pd.testing.assert_frame_equal(fast.asset_values[legs].astype(float), event.asset_values[legs].astype(float), rtol=1e-9)
+
+
+def test_missing_price_is_valued_at_last_price():
+	prices, factors, trade_date = market()
+	full = run('fast', prices, factors, trade_date, number_of_longs=2, rebalance=Rebalancer())
+	# 第 10 个交易日, 前一日持有的一个标的停牌
+	i = 10
+	held = np.flatnonzero(full._target_weights()['LONG'][i - 1] > 0)[0]
+	gap = prices.copy()
+	gap.loc[trade_date[i], gap.columns[held]] = np.nan
+	plain = run('fast', gap, factors, trade_date, number_of_longs=2)
+	diff = run('fast', gap, factors, trade_date, number_of_longs=2, rebalance=Rebalancer())
+
+	# 完全调仓的引擎在停牌之后估值为 NaN, 差额调仓按最新价格估值
+	assert plain.asset_values['LONG'].iloc[i:].isna().all()
+	values = diff.asset_values['LONG']
+	assert values.notna().all()
+	pd.testing.assert_series_equal(values.iloc[:i], full.asset_values['LONG'].iloc[:i])
+	shares = full._target_weights()['LONG'][i - 1] * values.iloc[i - 1] / prices.loc[trade_date[i - 1]].to_numpy()
+	last = prices.loc[trade_date[i]].to_numpy().copy()
+	last[held] = prices.loc[trade_date[i - 1]].iloc[held]
+	assert values.iloc[i] == pytest.approx((shares * last).sum(), rel=1e-12)
+
+
+def test_orders_value_untradable_holding():
+	rebalancer = Rebalancer()
+	delta, cost = rebalancer.orders(np.array([[100., 100.]]), np.array([np.nan, 10.]), np.array([[0.5, 0.5]]),
+									np.array([1000.]), valuation=np.array([20., 10.]))
+	# 总资产 2000 + 1000 + 1000, 停牌的标的不交易
+	np.testing.assert_allclose(delta, [[0., 100.]])
+	np.testing.assert_allclose(cost, 0.)
+
+
+def test_negative_cash_never_buys_or_shorts():
+	# 最低费用超过卖出的成交金额, 卖出后现金为负
+	rebalancer = Rebalancer(cost=CostModel(min_cost=50.))
+	delta, _ = rebalancer.orders(np.array([[1., 0.]]), np.array([10., 10.]), np.array([[0., 0.5]]), np.array([0.]))
+	np.testing.assert_allclose(delta, [[-1., 0.]])
+	delta, _ = Rebalancer()._buy_in_order(np.array([100., 50.]), np.array([10., 10.]), -5.)
+	np.testing.assert_allclose(delta, [0., 0.])
+	delta, _ = Rebalancer(lot_size=10).orders(np.array([[0., 0.]]), np.array([10., 10.]), np.array([[0.5, 0.5]]), np.array([-100.]))
+	assert (delta >= 0).all()
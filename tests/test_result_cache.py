@@ -0,0 +1,51 @@
+import pandas as pd
+import numpy as np
+
+import os
+
+from BackTest import BackTest
+from ResultCache import ResultCache
+
+from test_backtest import market
+
+
+def run(cache, **kwargs):
+	prices, factors, trade_date = market()
+	tester = BackTest(cache=cache, **kwargs)
+	tester.underlying = prices
+	tester.trade_date = trade_date
+	tester.df_factors = factors
+	tester.runTest()
+	return tester
+
+
+def test_hit_equals_fresh_run(tmp_path):
+	cache = ResultCache(str(tmp_path))
+	fresh = run(cache, number_of_longs=2, number_of_groups=3, engine='event')
+	cached = run(cache, number_of_longs=2, number_of_groups=3, engine='event')
+	assert cache.hits == 1
+	pd.testing.assert_frame_equal(cached.asset_values, fresh.asset_values.astype(float))
+	pd.testing.assert_frame_equal(cached.df_score, fresh.df_score)
+	pd.testing.assert_frame_equal(cached.df_long, fresh.df_long)
+	pd.testing.assert_frame_equal(cached.df_group, fresh.df_group)
+	assert cached._df_position == fresh._df_position
+
+
+def test_no_pickle_on_disk(tmp_path):
+	cache = ResultCache(str(tmp_path))
+	run(cache, number_of_longs=2)
+	files = [os.path.join(root, name) for root, _, names in os.walk(str(tmp_path)) for name in names]
+	assert any(f.endswith('.json') and 'meta' not in f and 'dtypes' not in f for f in files) # 字符串表
+	for f in files:
+		if f.endswith('.npy'):
+			np.load(f, allow_pickle=False)
+
+
+def test_pickled_entry_is_a_miss(tmp_path):
+	cache = ResultCache(str(tmp_path))
+	key = cache.key(np.arange(3))
+	cache.store(key, {'t': pd.DataFrame({'a': [1., 2.]})})
+	entry = os.path.join(str(tmp_path), key, 't0')
+	# 写入目录的人放进 pickle 的对象数组, 读取时不加载
+	np.save(os.path.join(entry, 'values.npy'), np.array([[object()]], dtype=object), allow_pickle=True)
+	assert cache.load(key) is None
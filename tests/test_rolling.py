@@ -0,0 +1,67 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Factor import Factor
+from Rolling import RollingZScore
+
+from test_factor import extreme_MAD_loop, random_series
+
+
+def reference(s, window, n):
+	'''
+	向量化之前的计算: rolling().apply 对每个窗口去极值后标准化, 取最后一个值
+	'''
+	z = s.rolling(window).apply(lambda x: Factor.standardize_z(extreme_MAD_loop(x, n)).iloc[-1], raw=False)
+	mad = s.rolling(window).apply(lambda x: np.median(np.abs(x - np.median(x))), raw=True)
+	return z, mad
+
+
+def frame(seed, size, ties, nan):
+	rng = np.random.default_rng(seed)
+	return pd.DataFrame({f'f{i}': random_series(rng, size, ties=ties, nan=nan).to_numpy() for i in range(3)},
+						index=pd.date_range('2020-01-01', periods=size))
+
+
+@pytest.mark.parametrize('ties', [False, True])
+@pytest.mark.parametrize('nan', [0., 0.02])
+@pytest.mark.parametrize('window, n', [(20, 5.2), (7, 1.), (2, 3.)])
+def test_matches_rolling_apply(ties, nan, window, n):
+	df = frame(int(ties) + 10 * window, 120, ties, nan)
+	got = RollingZScore(window=window, n=n).transform(df)
+	for c in df.columns:
+		expected, mad = reference(df[c], window, n)
+		# MAD 为 0 的窗口定义为 0, 旧的计算是浮点误差, 单独检查
+		zero = (mad == 0).to_numpy()
+		np.testing.assert_allclose(got[c].to_numpy()[~zero], expected.to_numpy()[~zero], rtol=1e-9, atol=1e-9)
+		assert (got[c].to_numpy()[zero] == 0).all()
+		assert got[c].isna().equals(expected.isna())
+
+
+def test_series_shorter_than_window():
+	s = random_series(np.random.default_rng(0), 5)
+	got = RollingZScore(window=10).transform(s)
+	assert isinstance(got, pd.Series) and got.index.equals(s.index)
+	assert got.isna().all()
+
+
+def test_zero_mad_is_zero():
+	s = pd.Series([1., 1., 1., 1., 5., 1., -3., 1.])
+	got = RollingZScore(window=5, n=5.2).transform(s)
+	assert got.iloc[:4].isna().all()
+	# 每个窗口超过一半的值相同, MAD 为 0
+	assert (got.iloc[4:] == 0).all()
+	stream = RollingZScore(window=5).stream(s.to_numpy()[:5, None])
+	assert stream.update([-3.])[0] == 0
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_stream_matches_batch(ties):
+	df = frame(3, 150, ties, 0.02)
+	window = 15
+	batch = RollingZScore(window=window, n=3.).transform(df).to_numpy()
+	split = 40
+	stream = RollingZScore(window=window, n=3.).stream(df.iloc[:split])
+	rows = np.array([stream.update(row) for row in df.to_numpy()[split:]])
+	np.testing.assert_allclose(rows, batch[split:], rtol=1e-9, atol=1e-12)
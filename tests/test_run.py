@@ -0,0 +1,8 @@
+import run
+
+
+def test_imports_within_budget_and_without_side_effects():
+	result = run.check_imports()
+	assert set(result) == set(run.IMPORT_BUDGET)
+	failed = {module: record for module, record in result.items() if not record['ok']}
+	assert failed == {}
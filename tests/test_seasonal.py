@@ -0,0 +1,43 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Seasonal import SeasonalAdjust
+
+
+def series(seed=0, size=600):
+	rng = np.random.default_rng(seed)
+	# 不规则的交易日, 带季节项和缺失值
+	days = pd.bdate_range('2016-01-01', periods=int(size * 1.3))
+	days = days[np.sort(rng.choice(len(days), size, replace=False))].astype('datetime64[ns]')
+	season = np.sin(2 * np.pi * days.dayofyear.to_numpy() / 365.)[:, None]
+	values = season * [1., 3.] + rng.normal(0, 0.5, (size, 2))
+	values[rng.random(values.shape) < 0.05] = np.nan
+	return pd.DataFrame(values, index=days, columns=['a', 'b'])
+
+
+@pytest.mark.parametrize('period, buckets, min_periods', [(365, 4, 1), (365, 12, 5), (30, 3, 2)])
+def test_stream_matches_transform(period, buckets, min_periods):
+	df = series()
+	adjust = SeasonalAdjust(period=period, buckets=buckets, min_periods=min_periods)
+	batch = adjust.transform(df).to_numpy()
+	split = 100
+	stream = adjust.stream(df.iloc[:split])
+	rows = np.array([stream.update(day, row) for day, row in zip(df.index[split:], df.to_numpy()[split:])])
+	np.testing.assert_allclose(rows, batch[split:], rtol=1e-9, atol=1e-9)
+
+
+def test_transform_uses_only_past():
+	df = series()
+	adjust = SeasonalAdjust()
+	full = adjust.transform(df)
+	head = adjust.transform(df.iloc[:300])
+	pd.testing.assert_frame_equal(full.iloc[:300], head)
+
+
+def test_stream_rejects_old_date():
+	df = series(size=50)
+	stream = SeasonalAdjust().stream(df)
+	with pytest.raises(NameError):
+		stream.update(df.index[-1], df.to_numpy()[-1])
@@ -0,0 +1,58 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Selector import Selector
+
+
+def scores(seed=0, dates=40, assets=7):
+	'''
+	整数打分(大量相同), 随机缺失, 以及整行缺失和只有少数有效值的日期
+	'''
+	rng = np.random.default_rng(seed)
+	values = rng.integers(0, 4, (dates, assets)).astype(float)
+	values[rng.random(values.shape) < 0.15] = np.nan
+	values[3] = np.nan
+	values[5, 2:] = np.nan
+	return pd.DataFrame(values, columns=[f'S{i}' for i in range(assets)])
+
+
+@pytest.mark.parametrize('n', [1, 2, 7])
+def test_top_bottom_match_sort_values(n):
+	df = scores()
+	top, bottom = Selector.top_n(df, n), Selector.bottom_n(df, n)
+	for i in range(len(df)):
+		row = df.iloc[i]
+		# 稳定排序后取 head / tail, 与原来逐日 sort_values 的选择相同; NaN 最后才会被选中
+		expected_top = row.sort_values(kind='stable').head(n).index
+		expected_bottom = row.sort_values(kind='stable', na_position='first').tail(n).index
+		assert list(df.columns[top[i]]) == list(expected_top)
+		assert list(df.columns[bottom[i]]) == list(expected_bottom)
+	labels = Selector.to_labels(top, df.columns, df.index)
+	assert labels.shape == (len(df), n)
+
+
+@pytest.mark.parametrize('groups', [1, 3, 10])
+def test_quantile_groups_match_rank(groups):
+	df = scores()
+	got = Selector.quantile_groups(df, groups)
+	for i in range(len(df)):
+		row = df.iloc[i]
+		valid = row.dropna()
+		# 稳定排序的名次, 按有效个数等分
+		rank = valid.rank(method='first').astype(int) - 1
+		expected = pd.Series(-1, index=row.index)
+		expected[valid.index] = rank * groups // len(valid)
+		np.testing.assert_array_equal(got[i], expected.to_numpy())
+	# 有效值少于分组个数时每个标的单独一组, 组号不超过 groups - 1
+	assert (got[5][:2] >= 0).all() and (got[5][2:] == -1).all()
+	assert (got[3] == -1).all()
+	assert got.max() <= groups - 1
+
+
+def test_n_out_of_range():
+	with pytest.raises(NameError):
+		Selector.top_n(scores(), 8)
+	with pytest.raises(NameError):
+		Selector.bottom_n(scores(), 0)
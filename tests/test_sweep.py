@@ -0,0 +1,45 @@
+from multiprocessing import shared_memory
+
+import pandas as pd
+
+import pytest
+
+import Sweep
+from Rolling import RollingZScore
+from Sweep import ParameterSweep
+
+from test_backtest import market, run
+
+
+def test_parallel_matches_sequential(monkeypatch):
+	prices, factors, trade_date = market(n_days=300)
+	calendars = {'weekly': trade_date, 'monthly': trade_date[::4]}
+	grid = {'number_of_longs': [1, 2], 'window': [None, 40], 'calendar': ['weekly', 'monthly']}
+
+	names = []
+	create = Sweep._SharedFrame.create
+
+	def record(df):
+		block, meta = create(df)
+		names.append(block.name)
+		return block, meta
+	monkeypatch.setattr(Sweep._SharedFrame, 'create', staticmethod(record))
+
+	sweep = ParameterSweep(prices, factors, calendars)
+	summary = sweep.run(grid, processes=2)
+	configs = ParameterSweep.expand_grid(grid)
+	assert len(summary) == len(configs)
+	for i, config in enumerate(configs):
+		df = factors if config['window'] is None else RollingZScore(window=config['window']).transform(factors)
+		tester = run('fast', prices, df, calendars[config['calendar']], number_of_longs=config['number_of_longs'])
+		expected = tester.asset_values.astype(float)
+		# 不同交易日序列的结果按日期并集合并, 其他日期为 NaN
+		got = sweep.asset_values[i].dropna(how='all')
+		pd.testing.assert_frame_equal(got, expected, rtol=1e-12, check_freq=False)
+		assert summary.at[i, 'LONG_total_return'] == pytest.approx(expected['LONG'].iloc[-1] / expected['LONG'].iloc[0] - 1)
+
+	# 运行结束后共享内存已经释放
+	assert len(names) == 2
+	for name in names:
+		with pytest.raises(FileNotFoundError):
+			shared_memory.SharedMemory(name=name)
@@ -0,0 +1,38 @@
+import pandas as pd
+import numpy as np
+
+import pytest
+
+from Analytics import Analytics
+from WalkForward import WalkForward
+
+from test_backtest import market, run
+
+
+@pytest.mark.parametrize('candidates', [None, [{'number_of_longs': 1}, {'number_of_longs': 2, 'window': 30}]])
+def test_stitched_matches_separate_runs(candidates):
+	prices, factors, trade_date = market(n_days=400)
+	walk = WalkForward(prices, factors, trade_date, train=20, test=9)
+	table = walk.run(candidates=candidates, threads=2)
+	folds = walk.folds()
+	assert len(table) == len(folds) > 2
+
+	def separate(config, start, stop):
+		z_score = None if config.get('window') is None else (config['window'], config.get('n', 5.2))
+		tester = run('fast', prices, factors, trade_date[start:stop], number_of_longs=config.get('number_of_longs', 1),
+					 z_score=z_score)
+		return tester.asset_values.astype(float)
+
+	curve = []
+	for (start, test_start, test_stop), config in zip(folds, table['config']):
+		if candidates is not None:
+			# 样本内分别回测各候选参数, 选出 sharpe 最高的
+			scores = [Analytics.summary(separate(c, start, test_start)).at['LONG', 'sharpe'] for c in candidates]
+			assert config == candidates[int(np.argmax(scores))]
+		values = separate(config, test_start, min(test_stop + 1, len(trade_date)))[['LONG', 'SHORT']]
+		if len(curve) == 0:
+			curve.append(values / values.iloc[0])
+		else:
+			curve.append(values.iloc[1:] / values.iloc[0] * curve[-1].iloc[-1])
+	expected = pd.concat(curve) * walk.init_cash
+	pd.testing.assert_frame_equal(walk.oos_values[['LONG', 'SHORT']], expected, rtol=1e-10, check_freq=False)